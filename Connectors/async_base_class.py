@@ -0,0 +1,238 @@
+import asyncio
+import json
+from abc import abstractmethod
+from functools import partial
+from threading import Thread, get_ident
+from typing import TYPE_CHECKING, Callable, Coroutine, Dict, Set, Union
+
+import aiohttp
+
+from Connectors.crypto_base_class import CryptoExchange
+from Connectors.ws_manager import WsConnection
+
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+
+class RestResponse:
+    """The part of requests.Response used by the connectors."""
+
+    __slots__ = ("status_code", "text")
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        # Error responses are logged and never returned
+        return
+
+
+class AsyncWsConnection(WsConnection):
+    """WsConnection running on the client event loop (aiohttp)."""
+
+    client: "AsyncCryptoExchange"
+
+    def __init__(self, manager, index: int):
+        super().__init__(manager, index)
+        self._connection: Union[aiohttp.ClientWebSocketResponse, None] = None
+
+    def _start(self):
+        self.client._submit(self._run())
+        return
+
+    def _close(self):
+        if self._connection is not None:
+            self.client._submit(self._connection.close())
+        return
+
+    def _send(self, msg: str):
+        # Called from the sender thread
+        self.client._submit(self._send_str(msg))
+        return
+
+    async def _send_str(self, msg: str):
+        if self._connection is not None:
+            await self._connection.send_str(msg)
+        return
+
+    def _on_message(self, connection, msg: str):
+        self.messages += 1
+        # Only the messages without a route can be replies
+        if not self.client._handle_message(connection, msg) and self._inflight:
+            self._on_reply(msg)
+        return
+
+    async def _run(self):
+        client = self.client
+        # Reopen the websocket connection unless it is stopped
+        while self._running:
+            try:
+                url = await client._ws_endpoint()
+                async with client._session.ws_connect(url, heartbeat=20) as connection:
+                    self._connection = connection
+                    self._on_open(connection)
+                    async for msg in connection:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._on_message(connection, msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            client._on_error(connection, connection.exception())
+                            break
+            except Exception as e:
+                msg = f"{client.exchange} websocket {self.index} error: {e!r}"
+                client.add_log(msg, "warning")
+            self._connected.clear()
+            self._connection = None
+            if self._running:
+                client.add_log(f"Websocket {self.index} disconnect", "info")
+                await asyncio.sleep(3)
+        return
+
+
+class AsyncCryptoExchange(CryptoExchange):
+    """
+    asyncio variant of CryptoExchange. One event loop, running on its own
+    thread, serves the websocket and all the REST requests of the client.
+
+    Websocket messages are decoded on the loop. The strategy decisions run
+    on the feed worker (they are CPU only), while the order logic of a
+    strategy runs as a task on the loop, so a slow order only delays its own
+    strategy instead of every feed.
+
+    The public methods keep the blocking signatures of CryptoExchange, they
+    submit the request to the loop and wait for it. This way the dashboard
+    and the strategies can use either implementation. They must not be
+    called from the loop itself, the order logic uses the coroutines.
+    """
+
+    _ws_connection = AsyncWsConnection
+
+    def _start_loop(self):
+        if getattr(self, "_loop", None) is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+        # key: strategy_key, value: the running order task of the strategy
+        self._hooks: Dict[str, asyncio.Task] = dict()
+        # The loop only keeps weak references to the tasks
+        self._tasks: Set[asyncio.Task] = set()
+        return
+
+    def _submit(self, coroutine: Coroutine) -> asyncio.Future:
+        """Schedule a coroutine on the loop, from any thread."""
+        if get_ident() == self._loop_thread.ident:
+            task = self._loop.create_task(coroutine)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return task
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _call(self, coroutine: Coroutine):
+        """Run a coroutine on the loop and wait for its result."""
+        if get_ident() == self._loop_thread.ident:
+            coroutine.close()
+            raise RuntimeError("Blocking call from inside the event loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    # ########################### REST Arguments ##########################
+    def _create_session(self, pool_size: int) -> aiohttp.ClientSession:
+        async def create():
+            connector = aiohttp.TCPConnector(limit=pool_size)
+            return aiohttp.ClientSession(connector=connector)
+
+        return self._call(create())
+
+    def _execute_request(self, *args, **kwargs) -> Union[RestResponse, None]:
+        return self._call(self._request(*args, **kwargs))
+
+    @abstractmethod
+    async def _request(self, *args, **kwargs) -> Union[RestResponse, None]:
+        """Exchange specific: sign and send the request with _send_request"""
+        pass
+
+    async def _send_request(
+        self, http_method: str, url: str, **kwargs
+    ) -> Union[RestResponse, None]:
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self._timeout[0], sock_read=self._timeout[1]
+        )
+        try:
+            async with self._session.request(
+                http_method, url, timeout=timeout, **kwargs
+            ) as response:
+                text = await response.text()
+                self._on_response(response.status, response.headers)
+                if response.status >= 400:
+                    msg = f"Request Error msg: {text} {response.status}"
+                    self.add_log(msg, "error")
+                    return None
+                return RestResponse(response.status, text)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.add_log(f"Request error {e!r}", "warning")
+        return None
+
+    # ########################### Websocket Arguments ########################
+    async def _ws_endpoint(self) -> str:
+        return self._ws_url
+
+    def _handle_message(self, connection, msg: str) -> bool:
+        # Like WebSocketApp, a failing message is reported and the feed goes on
+        try:
+            return self._on_message(connection, msg)
+        except Exception as e:
+            self._on_error(connection, e)
+        return True
+
+    def close(self):
+        async def close():
+            await self._session.close()
+
+        self._ws_connect = False
+        # The last checkpoint is taken on the feed worker, before it stops
+        self.checkpoint.stop()
+        self.ws_manager.stop()
+        self.feed.stop()
+        self.user_stream.stop()
+        self.order_tracker.stop()
+        self._call(close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        return
+
+    # ########################### Strategy Arguments ##########################
+    def _run_hook(self, strategy: "Strategy", hook: Callable, *args):
+        """
+        Run the order logic of a strategy as a task. Only one task runs per
+        strategy, the signals received meanwhile are dropped.
+        """
+        if get_ident() != self._loop_thread.ident:
+            # The strategies run on the feed worker
+            self._loop.call_soon_threadsafe(self._run_hook, strategy, hook, *args)
+            return
+        key = strategy.strategy_key
+        if key in self._hooks:
+            return
+        task = self._loop.create_task(hook(strategy, *args))
+        self._hooks[key] = task
+        task.add_done_callback(partial(self._hook_done, key))
+        return
+
+    def _hook_done(self, key: str, task: asyncio.Task):
+        self._hooks.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.add_log(f"{key} order task failed: {task.exception()!r}", "error")
+        return
+
+    def _tp_sl_reached(self, strategy: "Strategy") -> bool:
+        buying_price = strategy.order.price
+        strategy.unpnl = self.prices[strategy.symbol].ask / buying_price - 1
+        return strategy.unpnl >= strategy.tp or strategy.unpnl <= -1 * strategy.sl
+
+    def _check_tp_sl(self, strategy: "Strategy"):
+        # Take Profit or Stop Loss check
+        if self._tp_sl_reached(strategy):
+            self._run_hook(strategy, self._sell_with_strategy)
+        return
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Tuple
+from urllib.parse import urlencode
+
+from Connectors.async_base_class import AsyncCryptoExchange
+from Connectors.binance_connector import BinanceClient
+from Moduls.data_modul import Balance, Contract, Order
+
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+
+class AsyncBinanceClient(AsyncCryptoExchange, BinanceClient):
+    """
+    BinanceClient running on asyncio (see AsyncCryptoExchange). The market
+    data requests and the subscriptions are inherited, the order logic is
+    rewritten with coroutines.
+    """
+
+    def __init__(
+        self, is_test: bool, pool_size: int = 10, timeout: Tuple = (3.05, 10)
+    ):
+        self._start_loop()
+        BinanceClient.__init__(self, is_test, pool_size, timeout)
+
+    async def _request(
+        self, endpoint: str, http_method: str, params=None, need_sign=True
+    ):
+        cost = self._request_cost(endpoint, http_method)
+        await self.rate_limiter.acquire_async(*cost)
+        params = dict(params or {})
+        if need_sign:
+            params["timestamp"] = int(time.time() * 1000)
+            params["signature"] = self._generate_signature(urlencode(params))
+        url = self._base_url + endpoint
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        return await self._send_request(http_method, url)
+
+    # ######################### TRADE Arguments ##########################
+    async def _make_order(
+        self, contract: Contract, *, side: str, order_type: str, **kwargs
+    ):
+        endpoint = self._endpoints["order"]
+        params = {"symbol": contract.symbol, "side": side, "type": order_type}
+        params.update(kwargs)
+        response = await self._request(endpoint, "POST", params)
+        if response:
+            order = Order(response.json(), self.exchange)
+            return await self._order_status(order)
+        return
+
+    async def _order_status(self, order: Order):
+        endpoint = self._endpoints["order"]
+        params = {"symbol": order.symbol, "orderId": order.orderId}
+        response = await self._request(endpoint, "GET", params)
+        if response:
+            return Order(response.json(), self.exchange, price=order.price)
+        return
+
+    async def _get_balance(self):
+        response = await self._request(self._endpoints["account"], "GET")
+        if response:
+            self.balance = {
+                asset["asset"]: Balance(asset, self.exchange)
+                for asset in response.json()["balances"]
+            }
+            self.state.publish(balance=self.balance)
+            return self.balance
+        return
+
+    # ########################### Strategy Arguments ##########################
+    def _process_dicision(self, strategy: "Strategy", decision: str):
+        if decision == "buy or hodl" and not hasattr(strategy, "order"):
+            self._run_hook(strategy, self._buy_with_strategy)
+        elif decision == "sell or don't enter" and hasattr(strategy, "order"):
+            self._run_hook(strategy, self._sell_with_strategy)
+        return
+
+    async def _buy_with_strategy(self, strategy: "Strategy"):
+        latest_price = strategy.candles["close"][-1]
+        base_asset = strategy.contract.quoteAsset
+        balance = self.balance[base_asset].availableBalance
+        buy_margin = balance * strategy.buy_pct
+        quantity_margin = (buy_margin / latest_price) * 0.95
+        stepSize = strategy.contract.stepSize
+        quantity_margin = round(quantity_margin / stepSize) * stepSize
+        if quantity_margin < strategy.contract.minQuantity:
+            msg = (
+                f"could not buy {strategy.contract.symbol} "
+                "because the ordered quantity is less than the "
+                "minimum margin. Strategy is removed"
+            )
+            self.add_log(msg, "info")
+            # The strategies and channels are changed on the feed worker only
+            key = ("unsubscribe", strategy.strategy_key)
+            self.feed.call(key, self._kline_unsubscribe, strategy)
+            return
+        order = await self._make_order(
+            strategy.contract,
+            side="BUY",
+            order_type="MARKET",
+            quantity=quantity_margin,
+        )
+        if order:
+            order.price = latest_price
+            self._track_buy(strategy, order)
+            msg = (
+                f"{strategy.order.symbol} buying order was made. "
+                f"Quantity: {strategy.order.quantity}. "
+                f"Price: {strategy.order.price}"
+            )
+            self.add_log(msg, "info")
+        await self._get_balance()
+        return
+
+    async def _sell_with_strategy(self, strategy: "Strategy"):
+        # The sell order of the strategy is still being filled
+        if strategy.sell_order is not None:
+            return
+        sell_order = await self._make_order(
+            contract=strategy.contract,
+            side="SELL",
+            order_type="MARKET",
+            quantity=strategy.order.quantity,
+        )
+        if sell_order:
+            sell_order.price = strategy.candles["close"][-1]
+            await asyncio.wrap_future(self._track_sell(strategy, sell_order))
+        await self._get_balance()
+        return
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Tuple, Union
+from urllib.parse import urlencode
+
+from Connectors.async_base_class import AsyncCryptoExchange
+from Connectors.kucoin_connector import KucoinClient
+from Moduls.data_modul import Balance, Contract, Order
+
+if TYPE_CHECKING:
+    from strategies import Strategy
+
+
+class AsyncKucoinClient(AsyncCryptoExchange, KucoinClient):
+    """
+    KucoinClient running on asyncio (see AsyncCryptoExchange). The market
+    data requests and the subscriptions are inherited, the order logic is
+    rewritten with coroutines.
+    """
+
+    _loaded = dict()
+
+    def __init__(
+        self,
+        is_spot: bool,
+        is_test: bool,
+        pool_size: int = 10,
+        timeout: Tuple = (3.05, 10),
+    ):
+        self._start_loop()
+        KucoinClient.__init__(self, is_spot, is_test, pool_size, timeout)
+
+    async def _request(self, endpoint: str, http_method: str, params=None):
+        params = params or dict()
+        now = str(int(time.time() * 1000))
+        data_json = json.dumps(params) if params else ""
+        signature = now + http_method + endpoint + data_json
+        headers = {
+            "KC-API-KEY": self._api_key,
+            "KC-API-SIGN": self._generate_signature(signature).decode(),
+            "KC-API-TIMESTAMP": now,
+            "KC-API-PASSPHRASE": self._passphrase.decode(),
+            "KC-API-KEY-VERSION": "2",
+            "Content-Type": "application/json",
+        }
+        url = self._base_url + endpoint
+        if http_method in ["GET", "DELETE"]:
+            if params:
+                url = f"{url}?{urlencode(params)}"
+            return await self._send_request(http_method, url, headers=headers)
+        return await self._send_request(
+            http_method, url, data=data_json, headers=headers
+        )
+
+    async def _ws_endpoint(self) -> str:
+        # Every connection needs a new token
+        ws_init = None
+        while ws_init is None:
+            ws_init = await self._request("/api/v1/bullet-public", "POST")
+            if ws_init is None:
+                await asyncio.sleep(3)
+        token = ws_init.json()["data"]["token"]
+        ws_url = ws_init.json()["data"]["instanceServers"][0]["endpoint"]
+        self._ws_url = f"{ws_url}?token={token}&connectId={int(time.time())}"
+        return self._ws_url
+
+    # ######################### TRADE Arguments ##########################
+    async def _make_order(
+        self, contract: Contract, *, side: str, order_type: str, **kwargs
+    ):
+        params = {
+            "clientOid": self._generate_client_order_id(),
+            "symbol": contract.symbol,
+            "side": side.lower(),
+            "type": order_type.lower(),
+        }
+        params.update(kwargs)
+        response = await self._request("/api/v1/orders", "POST", params)
+        if response:
+            return await self._order_status(response.json()["data"]["orderId"])
+        return None
+
+    async def _order_status(self, order: Union[Order, str]):
+        order_id = order.orderId if isinstance(order, Order) else order
+        response = await self._request(f"/api/v1/orders/{order_id}", "GET")
+        if response:
+            return Order(response.json()["data"], self.exchange)
+        return None
+
+    async def _get_balance(self):
+        response = await self._request("/api/v1/accounts", "GET")
+        if response:
+            balance = {
+                asset["currency"]: Balance(asset, self.exchange)
+                for asset in response.json()["data"]
+                if asset["type"] == "trade"
+            }
+            self.state.publish(balance=balance)
+            return balance
+        return None
+
+    # ########################### Strategy Arguments ##########################
+    def _process_dicision(self, strategy: "Strategy", decision: str):
+        if decision == "buy or hodl" and hasattr(strategy, "order"):
+            self._run_hook(strategy, self._buy_with_strategy)
+        elif decision == "sell or don't enter" and hasattr(strategy, "order"):
+            self._run_hook(strategy, self._sell_with_strategy)
+        return
+
+    async def _buy_with_strategy(self, strategy: "Strategy"):
+        latest_price = strategy.candles["close"][-1]
+        min_qty = 10 / latest_price
+        base_asset = strategy.contract.quoteAsset
+        balance = (await self._get_balance())[base_asset].availableBalance
+        buy_margin = balance * strategy.buy_pct
+        quantity_margin = (buy_margin / latest_price) * 0.95
+        quantity_margin = round(quantity_margin, strategy.contract.quantityPrecision)
+        if quantity_margin > min_qty:
+            order = await self._make_order(
+                strategy.contract,
+                side="buy",
+                order_type="market",
+                size=quantity_margin,
+            )
+            if order:
+                self._track_buy(strategy, order)
+                msg = (
+                    f"{strategy.order.symbol} buying order was made. "
+                    f"Quantity: {strategy.order.quantity}. "
+                    f"Price: {strategy.order.price}"
+                )
+                self.add_log(msg, "info")
+        else:
+            msg = (
+                f"could not buy {strategy.contract.symbol} "
+                "because the ordered quantity is less than the "
+                "minimum margin"
+            )
+            self.add_log(msg, "info")
+        return
+
+    async def _sell_with_strategy(self, strategy: "Strategy"):
+        # The sell order of the strategy is still being filled
+        if strategy.sell_order is not None:
+            return
+        sell_order = await self._make_order(
+            contract=strategy.contract,
+            side="sell",
+            order_type="market",
+            size=strategy.order.quantity,
+        )
+        if sell_order:
+            await asyncio.wrap_future(self._track_sell(strategy, sell_order))
+        return
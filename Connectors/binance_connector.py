@@ -5,16 +5,26 @@ import logging
 import logging.config
 import os
 import time
-from typing import TYPE_CHECKING, Dict, Literal, Union
+from typing import TYPE_CHECKING, Dict, Literal, Tuple, Union
 from urllib.parse import urlencode
 
-import requests
 import websocket
 from dotenv import load_dotenv
 from requests.exceptions import RequestException
 
 from Connectors.crypto_base_class import CryptoExchange
-from Moduls.data_modul import Balance, CandleStick, Contract, Order, Price
+from Connectors.rate_limiter import BACKGROUND, MARKET, ORDER, STATUS, RateLimiter
+from Connectors.user_stream import BinanceUserStream
+from Connectors.ws_decoder import MessageRouter
+from Connectors.ws_manager import WsManager
+from Moduls.data_modul import (
+    Balance,
+    CandleStick,
+    Contract,
+    Order,
+    Price,
+    candles_to_array,
+)
 
 if TYPE_CHECKING:
     from strategies import Strategy
@@ -24,9 +34,25 @@ logging.config.fileConfig("logger.config")
 
 
 class BinanceClient(CryptoExchange):
-    def __init__(self, is_test: bool):
+    def __init__(
+        self, is_test: bool, pool_size: int = 10, timeout: Tuple = (3.05, 10)
+    ):
         self.logger = logging.getLogger(__name__)
         super().__init__()
+        # REST session, the credentials are read once and the HMAC is keyed
+        # once, each signature starts from a copy of it.
+        self._session = self._create_session(pool_size)
+        self._session.headers.update(
+            {
+                "X-MBX-APIKEY": os.getenv("BinanceSpotAPIKey"),
+                "Content-Type": "application/json",
+            }
+        )
+        self._timeout = timeout
+        self._hmac = hmac.new(
+            key=os.getenv("BinanceSpotAPISecret", "").encode("utf-8"),
+            digestmod=hashlib.sha256,
+        )
         self._endpoints = {
             "ping": "/v3/ping",
             "exchangeInfo": "/v3/exchangeInfo",
@@ -37,13 +63,34 @@ class BinanceClient(CryptoExchange):
         }
         if is_test:
             self._base_url = "https://testnet.binance.vision/api"
-            self._ws_url = "wss://testnet.binance.vision/ws"
+            self._ws_url = "wss://testnet.binance.vision/stream"
+            self._user_ws_url = "wss://testnet.binance.vision/ws"
         else:
             self._base_url = "https://api.binance.com/api"
-            self._ws_url = "wss://stream.binance.com:9443/ws"
+            self._ws_url = "wss://stream.binance.com:9443/stream"
+            self._user_ws_url = "wss://stream.binance.com:9443/ws"
+        # The combined streams endpoint wraps every message with its stream
+        # name: {"stream": "btcusdt@bookTicker", "data": {...}}
+        self._router = MessageRouter("stream", "data")
+        # A connection can listen to 1024 streams at most and receive 5
+        # messages per second
+        self.ws_manager = WsManager(
+            self,
+            max_streams=1024,
+            send_interval=0.25,
+            connection_class=self._ws_connection,
+        )
+        # Request weight budgets, the limits are updated from exchangeInfo
+        self.rate_limiter = RateLimiter(
+            weight_limits={"1M": (6000, 60)},
+            order_limits={"10S": (100, 10), "1D": (200000, 86400)},
+            weight_header="X-MBX-USED-WEIGHT-",
+            order_header="X-MBX-ORDER-COUNT-",
+        )
+        self.user_stream = BinanceUserStream(self)
         # self._check_internet_connection()
         self.prices: Dict[str, Price] = dict()
-        self.contracts = self._get_contracts()
+        self.contracts = self.metadata.load()
         self.getBalance()
 
     @property
@@ -74,56 +121,123 @@ class BinanceClient(CryptoExchange):
     def exchange(self):
         return "Binance"
 
+    # Kline timestamps are in milliseconds, at most 1000 klines per request
+    _kline_time_unit = 1
+    _klines_limit = 1000
+    # key: (http_method, endpoint), value: (request weight, priority)
+    _request_weights = {
+        ("GET", "/v3/ping"): (1, MARKET),
+        ("GET", "/v3/exchangeInfo"): (20, BACKGROUND),
+        ("GET", "/v3/klines"): (2, BACKGROUND),
+        ("GET", "/v3/ticker/bookTicker"): (2, MARKET),
+        ("POST", "/v3/order"): (1, ORDER),
+        ("DELETE", "/v3/order"): (1, ORDER),
+        ("GET", "/v3/order"): (4, STATUS),
+        ("GET", "/v3/account"): (20, BACKGROUND),
+        ("POST", "/v3/userDataStream"): (2, STATUS),
+        ("PUT", "/v3/userDataStream"): (2, STATUS),
+    }
+    # Status of the orders still waiting to be filled
+    _open_order_statuses = ["NEW", "PARTIALLY_FILLED"]
+    _filled_order_status = "FILLED"
+
+    def _request_cost(self, endpoint: str, http_method: str):
+        """Weight and priority of the request, and if it places an order"""
+        cost = self._request_weights.get((http_method, endpoint), (1, MARKET))
+        weight, priority = cost
+        is_order = http_method == "POST" and endpoint == self._endpoints["order"]
+        return weight, priority, is_order
+
+    def _on_response(self, status_code: int, headers):
+        self.rate_limiter.update(headers)
+        # 429: too many requests, 418: the IP is banned
+        if status_code in [418, 429]:
+            retry_after = float(headers.get("Retry-After", 60))
+            self.rate_limiter.ban(retry_after)
+            msg = f"Rate limit reached, requests paused for {retry_after}s"
+            self.add_log(msg, "warning")
+        return
+
     def _execute_request(
         self, endpoint: str, http_method: str, params=dict(), need_sign=True
     ):
         """This argument is used to send all types of requests to the server"""
-        headers = {
-            "X-MBX-APIKEY": os.getenv("BinanceSpotAPIKey"),
-            "Content-Type": "application/json",
-        }
+        self.rate_limiter.acquire(*self._request_cost(endpoint, http_method))
         try:
             if need_sign:
                 params["timestamp"] = int(time.time() * 1000)
                 params["signature"] = self._generate_signature(urlencode(params))
-            response = requests.request(
-                http_method, self._base_url + endpoint, params=params, headers=headers
+            response = self._session.request(
+                http_method,
+                self._base_url + endpoint,
+                params=params,
+                timeout=self._timeout,
             )
+            self._on_response(response.status_code, response.headers)
             response.raise_for_status()
             return response
         except RequestException as e:
-            self.add_log(f"Request Error msg: {response.text} {e}", "error")
+            # Timeouts and connection errors come without a response
+            text = e.response.text if e.response is not None else ""
+            self.add_log(f"Request Error msg: {text} {e}", "error")
         except Exception as e:
             self.add_log(f"Error {e}", "error")
         return
 
     def _generate_signature(self, query_string: str):
-        return hmac.new(
-            key=os.getenv("BinanceSpotAPISecret").encode("utf-8"),
-            msg=query_string.encode("utf-8"),
-            digestmod=hashlib.sha256,
-        ).hexdigest()
+        signature = self._hmac.copy()
+        signature.update(query_string.encode("utf-8"))
+        return signature.hexdigest()
 
     # ###################### MARKET DATA FUNCTION #######################
-    def _get_contracts(self):
+    def _get_metadata(self):
         endpoint = self._endpoints["exchangeInfo"]
         response = self._execute_request(endpoint, "GET", need_sign=False)
         if response:
-            contracts = {
-                symbol["symbol"]: Contract(symbol, self.exchange)
-                for symbol in response.json()["symbols"]
+            info = response.json()
+            # Only the fields read by Contract are cached
+            symbols = {
+                symbol["symbol"]: {
+                    "symbol": symbol["symbol"],
+                    "baseAsset": symbol["baseAsset"],
+                    "quoteAsset": symbol["quoteAsset"],
+                    "quotePrecision": symbol["quotePrecision"],
+                    "baseAssetPrecision": symbol["baseAssetPrecision"],
+                    "filters": [
+                        filter_
+                        for filter_ in symbol["filters"]
+                        if filter_["filterType"] == "LOT_SIZE"
+                    ],
+                }
+                for symbol in info["symbols"]
             }
-            return contracts
+            return {"symbols": symbols, "rateLimits": info.get("rateLimits", [])}
         return
 
-    def get_candlestick(self, contract: Contract, interval: str):
+    def _on_metadata(self, metadata: Dict):
+        self.rate_limiter.configure(metadata["rateLimits"])
+        return
+
+    def get_candlestick(
+        self, contract: Contract, interval: str, as_array=False, end=None
+    ):
         """
         Get a list of the historical Candlestickes for given contract.
+        With as_array, return them as a CANDLE_DTYPE structured array.
+        With end, return the page of candles ending at this timestamp.
         """
         endpoint = self._endpoints["klines"]
-        params = {"symbol": contract.symbol, "interval": interval}
+        params = {
+            "symbol": contract.symbol,
+            "interval": interval,
+            "limit": self._klines_limit,
+        }
+        if end is not None:
+            params["endTime"] = int(end)
         response = self._execute_request(endpoint, "GET", params, need_sign=False)
         if response:
+            if as_array:
+                return candles_to_array(response.json(), self.exchange)
             return [CandleStick(candle, self.exchange) for candle in response.json()]
         return
 
@@ -135,6 +249,7 @@ class BinanceClient(CryptoExchange):
         response = self._execute_request(endpoint, "GET", params, need_sign=False)
         if response:
             self.prices[symbol] = Price(response.json(), self.exchange)
+            self.state.set("prices", symbol, self.prices[symbol])
             return self.prices[symbol]
         return
 
@@ -189,6 +304,7 @@ class BinanceClient(CryptoExchange):
                 asset["asset"]: Balance(asset, self.exchange)
                 for asset in response.json()["balances"]
             }
+            self.state.publish(balance=self.balance)
             return self.balance
         return
 
@@ -200,9 +316,9 @@ class BinanceClient(CryptoExchange):
         if not contract:
             self.add_log(msg=f"{symbol} is not correct", level="error")
         elif channel == "tickers":
-            self._bookTicket_subscribe(contract)
+            return self._bookTicket_subscribe(contract)
         elif channel == "candles":
-            self._kline_subscribe(contract, interval)
+            return self._kline_subscribe(contract, interval)
         return
 
     def _bookTicket_subscribe(self, contract: Contract):
@@ -210,13 +326,15 @@ class BinanceClient(CryptoExchange):
         if contract in self.bookTicker_subscribtion_list:
             self.add_log(f"Already subscribed to {params}", "info")
             return
-        msg = {"method": "SUBSCRIBE", "params": [params], "id": self.id}
-        # immediatly show current bid and ask prices.
-        self.get_price(contract)
-        self._ws.send(json.dumps(msg))
+        # immediatly show current bid and ask prices, unless already loaded
+        # (e.g. by the deployment warm-up)
+        if contract.symbol not in self.prices:
+            self.get_price(contract)
+        self._router.add(params, self._bookTickerMsg, contract.symbol)
+        future = self.ws_manager.subscribe(params)
         self.bookTicker_subscribtion_list[contract] = self.id
         self.id += 1
-        return
+        return future
 
     def _kline_subscribe(self, contract: Contract, interval: str):
         # Make sure the contract is in the bookTicker.
@@ -228,11 +346,11 @@ class BinanceClient(CryptoExchange):
             self.strategy_counter[strategy_key]["count"] += 1
             return
         params = f"{symbol.lower()}@kline_{interval}"
-        msg = {"method": "SUBSCRIBE", "params": [params], "id": self.id}
-        self._ws.send(json.dumps(msg))
+        self._router.add(params, self._klineMsg, symbol)
+        future = self.ws_manager.subscribe(params)
         self.strategy_counter[strategy_key] = {"count": 1, "id": self.id}
         self.id += 1
-        return
+        return future
 
     def unsubscribe_channel(
         self,
@@ -248,66 +366,71 @@ class BinanceClient(CryptoExchange):
         return
 
     def _bookTicker_unsubscribe(self, symbol: str):
-        running_strategies = [x.split("_")[0] for x in self.strategy_counter.keys()]
-        if symbol in running_strategies:
+        if symbol in self.symbol_strategies:
             msg = (
                 f"{symbol} had a running strategy and "
                 "can't be removed from the watchlist"
             )
             self.add_log(msg, "info")
             return
-        _id = self.bookTicker_subscribtion_list[self.contracts[symbol]]
-        msg = {
-            "method": "UNSUBSCRIBE",
-            "params": [f"{symbol.lower()}@bookTicker"],
-            "id": _id,
-        }
-        self._ws.send(json.dumps(msg))
+        params = f"{symbol.lower()}@bookTicker"
+        self.ws_manager.unsubscribe(params)
+        self._router.remove(params)
         self.bookTicker_subscribtion_list.pop(self.contracts[symbol])
         self.prices.pop(symbol)
+        self.state.discard("prices", symbol)
         return
 
     def _kline_unsubscribe(self, strategy: "Strategy"):
         symbol = strategy.symbol
         interval = strategy.interval
         counters_key = strategy.ws_channel_key
-        self.running_startegies.pop(strategy.strategy_key)
+        self._unregister_strategy(strategy)
+        self._release_channel(strategy)
         self.strategy_counter[counters_key]["count"] -= 1
         if self.strategy_counter[counters_key]["count"] == 0:
-            msg = {
-                "method": "UNSUBSCRIBE",
-                "params": [f"{symbol.lower()}@kline_{interval}"],
-                "id": self.strategy_counter[counters_key]["id"],
-            }
-            self._ws.send(json.dumps(msg))
+            params = f"{symbol.lower()}@kline_{interval}"
+            self.ws_manager.unsubscribe(params)
+            self._router.remove(params)
             self.strategy_counter.pop(counters_key)
         return
 
+    def _ws_request(self, streams, subscribe, request_id):
+        method = "SUBSCRIBE" if subscribe else "UNSUBSCRIBE"
+        params = {"method": method, "params": streams, "id": int(request_id)}
+        return json.dumps(params)
+
+    def _ws_reply(self, data):
+        # {"result": null, "id": 1} or {"error": {"code": 2, "msg": ""}, "id": 1}
+        if not isinstance(data, dict) or "id" not in data:
+            return None
+        if "error" in data:
+            return str(data["id"]), data["error"].get("msg", str(data["error"]))
+        if "result" in data:
+            return str(data["id"]), None
+        return None
+
     # ########################### Strategy Arguments ##########################
     def _on_message(self, ws: websocket.WebSocketApp, msg):
-        data = json.loads(msg)
-        channel = data.get("e")
-        symbol = data.get("s")
-        # Spot websocket API does not show event name in case of bookTicker
-        if channel == "bookTicker" or (channel is None and "a" in data and "b" in data):
-            self._bookTickerMsg(data, symbol)
-        elif channel == "kline":
-            self._klineMsg(data, symbol)
-        else:
-            return
+        # Routed by stream name to _bookTickerMsg or _klineMsg
+        return self._router.dispatch(msg)
 
     def _bookTickerMsg(self, data, symbol):
         self.prices[symbol].bid = float(data["b"])
         self.prices[symbol].ask = float(data["a"])
-        # Check the status of the order for each running strategy
-        for strategy in list(self.running_startegies.values()):
-            if symbol != strategy.symbol or not hasattr(strategy, "order"):
+        if symbol in self.symbol_strategies:
+            self.feed.put(("bookTicker", symbol), self._on_book_ticker, symbol)
+        return
+
+    def _on_book_ticker(self, symbol):
+        # The order status is pushed by the user stream, or polled by the
+        # order tracker, never here
+        for strategy in self._strategies_of(symbol):
+            if not hasattr(strategy, "order"):
                 continue
             if strategy.order.status in ["CANCELED", "REJECTED", "EXPIRED"]:
                 self._kline_unsubscribe(strategy)
                 continue
-            elif strategy.order.status in ["NEW", "PARTIALLY_FILLED"]:
-                strategy.order = self.order_status(strategy.order)
             if strategy.order.status == "FILLED":
                 # Calculate the uPnL only when an order is made
                 self._check_tp_sl(strategy)
@@ -324,10 +447,23 @@ class BinanceClient(CryptoExchange):
         data = data["k"]
         candle = [data[i] for i in ["t", "o", "h", "l", "c", "v"]]
         sent_candle = CandleStick(candle, self.exchange)
-        for strategy in list(self.running_startegies.values()):
-            if strategy.ws_channel_key == f'{symbol}_{data["i"]}':
-                decision = strategy.parse_trade(sent_candle)
-                self._process_dicision(strategy, decision)
+        sent_candle.is_closed = data["x"]
+        # Updates of the same candle are coalesced, a closed candle never is
+        self.feed.put(
+            ("kline", symbol, data["i"]),
+            self._on_kline,
+            sent_candle,
+            symbol,
+            data["i"],
+            group=data["t"],
+            keep=data["x"],
+        )
+        return
+
+    def _on_kline(self, sent_candle: CandleStick, symbol, interval):
+        for strategy in self._strategies_of(symbol, interval):
+            decision = strategy.parse_trade(sent_candle)
+            self._process_dicision(strategy, decision)
         return
 
     def _process_dicision(self, strategy: "Strategy", decision: str):
@@ -340,7 +476,7 @@ class BinanceClient(CryptoExchange):
         return
 
     def _buy_with_strategy(self, strategy: "Strategy"):
-        latest_price = strategy.df["close"].iloc[-1]
+        latest_price = strategy.candles["close"][-1]
         base_asset = strategy.contract.quoteAsset
         balance = self.balance[base_asset].availableBalance
         buy_margin = balance * strategy.buy_pct
@@ -364,8 +500,7 @@ class BinanceClient(CryptoExchange):
         )
         if order:
             order.price = latest_price
-            order = self.order_status(order)
-            strategy.order = order
+            self._track_buy(strategy, order)
             msg = (
                 f"{strategy.order.symbol} buying order was made. "
                 f"Quantity: {strategy.order.quantity}. "
@@ -375,6 +510,9 @@ class BinanceClient(CryptoExchange):
         return
 
     def _sell_with_strategy(self, strategy: "Strategy"):
+        # The sell order of the strategy is still being filled
+        if strategy.sell_order is not None:
+            return
         sell_order = self.make_order(
             contract=strategy.contract,
             side="SELL",
@@ -382,14 +520,14 @@ class BinanceClient(CryptoExchange):
             quantity=strategy.order.quantity,
         )
         if sell_order:
-            sell_order.price = strategy.df["close"].iloc[-1]
-            while sell_order.status != "FILLED":
-                sell_order = self.order_status(sell_order)
-                time.sleep(2)
-            strategy.relaizedPnL += strategy._PnLcalciator(sell_order)
-            strategy.order = sell_order
-            self._kline_unsubscribe(strategy)
+            sell_order.price = strategy.candles["close"][-1]
+            self._track_sell(strategy, sell_order)
         return
 
     def close(self):
-        self._ws.close()
+        self.user_stream.stop()
+        self.order_tracker.stop()
+        # The last checkpoint is taken on the feed worker, before it stops
+        self.checkpoint.stop()
+        self.ws_manager.stop()
+        self.feed.stop()
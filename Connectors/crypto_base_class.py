@@ -1,20 +1,36 @@
 import logging
-import time
 from abc import ABC, abstractmethod, abstractproperty
-from collections import deque, namedtuple
-from threading import Thread
-from typing import TYPE_CHECKING, Dict, List, Literal, Union
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List, Literal, Tuple, Union
 
+import numpy as np
+import requests
 import websocket
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 
+from Connectors.feed import CoalescingFeed
+from Connectors.order_tracker import OrderTracker
+from Connectors.user_stream import UserStream
+from Connectors.ws_manager import WsConnection, WsManager
+from Moduls.candle_store import CandleStore
+from Moduls.channel_cache import ChannelCache
+from Moduls.checkpoint import CheckpointService
 from Moduls.data_modul import Balance, CandleStick, Contract, Order, Price
+from Moduls.history import HistoryService
+from Moduls.metadata import ContractBook, MetadataService
+from Moduls.snapshot import SnapshotStore
 
 if TYPE_CHECKING:
     from strategies import Strategy
 
 
 class CryptoExchange(ABC):
+    # Market data websocket connection class of the ws_manager
+    _ws_connection = WsConnection
+
     def __init__(self):
         self.logger: logging.Logger  # Logger is defined in the inherted class
         self.log_map = {
@@ -49,6 +65,39 @@ class CryptoExchange(ABC):
         symbol, and the item is another dictionary. For the 2nd dict,
         the keys are the counter 'count' and the 'id' for the web socket
         """
+        # Running strategies by symbol and by (symbol, interval), so every
+        # websocket message reaches only its own strategies.
+        # The inner dicts key: strategy_key
+        self.symbol_strategies: Dict[str, Dict[str, Strategy]] = dict()
+        self.channel_strategies: Dict[Tuple[str, str], Dict[str, Strategy]] = dict()
+        self.channels: Dict[str, ChannelCache] = dict()
+        """
+        Candles and indicators shared by the strategies of the same channel.
+        key: symbol_interval (strategy.ws_channel_key)
+        """
+        self.history = HistoryService(self)
+        # Contracts cached on disk and parsed on first use, the connectors
+        # load them with self.metadata.load()
+        self.metadata = MetadataService(self)
+        self.contracts: ContractBook
+        # Running strategies saved periodically and on exit, restored with
+        # self.checkpoint.restore()
+        self.checkpoint = CheckpointService(self)
+        # Market data websocket connections, created by the connectors
+        self.ws_manager: WsManager
+        # The websocket callbacks only store the latest market data, the
+        # strategies run on the feed worker
+        self.feed = CoalescingFeed(self)
+        # Pushes the order updates, created by the connectors
+        self.user_stream: UserStream
+        # Latest pushed status of the recent orders (key: orderId), kept for
+        # the orders whose update arrives before the order request returns
+        self._order_updates: OrderedDict[str, str] = OrderedDict()
+        # Follows the sell orders until they are filled
+        self.order_tracker = OrderTracker(self)
+        # Prices, running strategies and balance published for the other
+        # threads (e.g. the dashboard), read with self.state.snapshot()
+        self.state = SnapshotStore()
 
     @abstractproperty
     def exchange(self) -> str:
@@ -56,8 +105,10 @@ class CryptoExchange(ABC):
 
     def run(self):
         self._ws_connect = True
-        t = Thread(target=self._start_ws)
-        t.start()
+        self.feed.start()
+        self.ws_manager.start()
+        self.user_stream.start()
+        self.checkpoint.start()
 
     @abstractmethod
     def _execute_request(
@@ -69,6 +120,10 @@ class CryptoExchange(ABC):
     def _generate_signature(self, query_string: str) -> str:
         pass
 
+    def _on_response(self, status_code: int, headers):
+        """Called with every REST response, e.g. to track the rate limits"""
+        return
+
     @abstractproperty
     def _is_connected(self) -> bool:
         pass
@@ -78,11 +133,18 @@ class CryptoExchange(ABC):
         pass
 
     @abstractmethod
-    def _get_contracts(self) -> Dict[str, Contract]:
+    def _get_metadata(self) -> Union[Dict, None]:
+        """Download the exchange metadata: {"symbols": {symbol: record}, ...}"""
         pass
 
+    def _on_metadata(self, metadata: Dict):
+        """Called with the cached or downloaded metadata, e.g. for the limits"""
+        return
+
     @abstractmethod
-    def get_candlestick(self, contract: Contract, interval: str) -> List[CandleStick]:
+    def get_candlestick(
+        self, contract: Contract, interval: str, as_array=False, end=None
+    ) -> Union[List[CandleStick], np.ndarray]:
         pass
 
     @abstractmethod
@@ -105,48 +167,43 @@ class CryptoExchange(ABC):
     def getBalance(self):
         pass
 
-    def _start_ws(self):
-        self._ws = websocket.WebSocketApp(
-            url=self._ws_url,
-            on_open=self._on_open,
-            on_close=self._on_close,
-            on_error=self._on_error,
-            on_message=self._on_message,
-        )
-        self._is_closed = False
-        # Reopen the websocket connection if it terminated
-        while not self._is_closed:
-            try:
-                if self._ws_connect:
-                    # Reconnect unless the interface is closed by the user
-                    self._ws.run_forever()
-                else:
-                    break
-            except Exception as e:
-                # Update the log about this error
-                self.add_log(
-                    msg=f"{self.exchange} error in run_forever() method: {e}",
-                    level="warning",
-                )
-            # Add sleeping interval
-            time.sleep(3)
-
-    def _on_open(self, ws: websocket.WebSocketApp):
-        self.add_log(msg="Websocket connected", level="info")
+    def _ws_endpoint(self) -> str:
+        """Url of a new market data websocket connection"""
+        return self._ws_url
+
+    @abstractmethod
+    def _ws_request(self, streams: List[str], subscribe: bool, request_id: str) -> str:
+        """Message subscribing to (or unsubscribing from) the streams"""
+        pass
+
+    @abstractmethod
+    def _ws_reply(self, data: Dict) -> Union[Tuple[str, Union[str, None]], None]:
+        """(message id, error or None) if the message replies to a request"""
+        pass
+
+    def _ws_batch_key(self, stream: str) -> str:
+        """Streams of the same key can be sent in one message"""
+        return ""
 
     def _on_error(self, ws: websocket.WebSocketApp, error):
         self.add_log(msg=f"Error: {error}", level="error")
 
-    def _on_close(self, ws: websocket.WebSocketApp):
-        self._ws_connect = False
-        self.add_log(msg="Websocket disconnect", level="info")
-        self._is_closed = True
-        return
-
     @abstractmethod
-    def _on_message(self, ws: websocket.WebSocketApp, msg):
+    def _on_message(self, ws: websocket.WebSocketApp, msg) -> bool:
+        """Handle a market data message, False if it has no route"""
         pass
 
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """
+        Keep-alive session, the REST requests reuse its pooled connections
+        instead of opening a new TCP and TLS connection each time.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def add_log(self, msg: str, level: str):
         self.log_map[level.lower()](msg)
         msg = f"{self.exchange} Connector: {msg}"
@@ -156,7 +213,11 @@ class CryptoExchange(ABC):
     @abstractmethod
     def new_subscribe(
         self, channel: Literal["tickers", "candles"], symbol: str, interval: str
-    ):
+    ) -> Union[Future, None]:
+        """
+        Return a Future resolved once the exchange confirmed the subscription,
+        None if nothing was subscribed.
+        """
         pass
 
     @abstractmethod
@@ -170,6 +231,141 @@ class CryptoExchange(ABC):
         pass
 
     # ########################### Strategy Arguments ##########################
+    def _register_strategy(self, strategy: "Strategy"):
+        key = strategy.strategy_key
+        self.running_startegies[key] = strategy
+        self.symbol_strategies.setdefault(strategy.symbol, dict())[key] = strategy
+        channel = (strategy.symbol, strategy.interval)
+        self.channel_strategies.setdefault(channel, dict())[key] = strategy
+        self.state.set("strategies", key, strategy)
+        return
+
+    def _unregister_strategy(self, strategy: "Strategy"):
+        key = strategy.strategy_key
+        self.running_startegies.pop(key, None)
+        self.state.discard("strategies", key)
+        for index, index_key in [
+            (self.symbol_strategies, strategy.symbol),
+            (self.channel_strategies, (strategy.symbol, strategy.interval)),
+        ]:
+            strategies = index.get(index_key)
+            if strategies is not None:
+                strategies.pop(key, None)
+                if not strategies:
+                    index.pop(index_key)
+        return
+
+    def _strategies_of(self, symbol: str, interval: Union[str, None] = None):
+        """
+        Running strategies of the symbol, or of the symbol channel if interval
+        is given. A copy, the strategies may be removed while iterating.
+        """
+        if interval is None:
+            strategies = self.symbol_strategies.get(symbol)
+        else:
+            strategies = self.channel_strategies.get((symbol, interval))
+        return list(strategies.values()) if strategies else []
+
+    def _acquire_channel(self, strategy: "Strategy", interval: str) -> ChannelCache:
+        """
+        Load the channel candles when its first strategy starts, the next
+        strategies of the same channel reuse them. The channel keeps the
+        longest retention window of its strategies.
+        """
+        channel = self.channels.get(strategy.ws_channel_key)
+        if channel is None:
+            history = self.history.load(
+                strategy.contract, interval, strategy.timeframe, strategy.retention
+            )
+            candles = CandleStore.from_candles(history, strategy.retention)
+            channel = ChannelCache(strategy.ws_channel_key, candles, strategy.timeframe)
+            self.channels[strategy.ws_channel_key] = channel
+        elif channel.candles.capacity < strategy.retention:
+            channel.candles.resize(strategy.retention)
+        channel.subscribe(strategy.strategy_key)
+        return channel
+
+    def _release_channel(self, strategy: "Strategy"):
+        channel = self.channels.get(strategy.ws_channel_key)
+        if channel and channel.unsubscribe(strategy.strategy_key):
+            self.channels.pop(strategy.ws_channel_key)
+        return
+
+    def _on_order_update(self, order_id: str, status: str):
+        """Apply an order status pushed by the user stream."""
+        self._order_updates[order_id] = status
+        self._order_updates.move_to_end(order_id)
+        if len(self._order_updates) > 1000:
+            self._order_updates.popitem(last=False)
+        for strategy in self.state.snapshot().strategies.values():
+            order: Union[Order, None] = getattr(strategy, "order", None)
+            if order is not None and order.orderId == order_id:
+                order.status = status
+        self.order_tracker.on_update(order_id, status)
+        return
+
+    def _sync_order(self, order: Order) -> Order:
+        """Apply the status pushed while the order request was running."""
+        status = self._order_updates.get(order.orderId)
+        if status is not None and order.status in self._open_order_statuses:
+            order.status = status
+        return order
+
+    def _track_buy(self, strategy: "Strategy", order: Order) -> Future:
+        """
+        Keep the buy order of the strategy and follow it in the background
+        until it is filled, the TP/SL is checked from then on.
+        """
+        strategy.order = self._sync_order(order)
+        future = self.order_tracker.track(strategy.order, strategy.strategy_key)
+        future.add_done_callback(partial(self._on_buy_tracked, strategy))
+        return future
+
+    def _on_buy_tracked(self, strategy: "Strategy", future: Future):
+        """Called on the order tracker or user stream thread"""
+        key = ("buy", strategy.strategy_key)
+        self.feed.call(key, self._on_buy_closed, strategy, future.result())
+        return
+
+    def _on_buy_closed(self, strategy: "Strategy", order: Order):
+        if strategy.order.orderId == order.orderId:
+            strategy.order = order
+        return
+
+    def _track_sell(self, strategy: "Strategy", sell_order: Order) -> Future:
+        """
+        Follow the sell order in the background, the strategy is closed once
+        the order is filled.
+        """
+        sell_order = self._sync_order(sell_order)
+        strategy.sell_order = sell_order
+        future = self.order_tracker.track(sell_order, strategy.strategy_key)
+        future.add_done_callback(partial(self._on_sell_tracked, strategy))
+        return future
+
+    def _on_sell_tracked(self, strategy: "Strategy", future: Future):
+        """
+        Called on the order tracker or user stream thread, the strategy is
+        closed on the feed worker.
+        """
+        key = ("sell", strategy.strategy_key)
+        self.feed.call(key, self._on_sell_closed, strategy, future.result())
+        return
+
+    def _on_sell_closed(self, strategy: "Strategy", sell_order: Order):
+        strategy.sell_order = None
+        if sell_order.status != self._filled_order_status:
+            msg = (
+                f"{strategy.symbol} sell order {sell_order.orderId} is "
+                f"{sell_order.status}, the strategy keeps its position"
+            )
+            self.add_log(msg, "warning")
+            return
+        strategy.relaizedPnL += strategy._PnLcalciator(sell_order)
+        strategy.order = sell_order
+        self._kline_unsubscribe(strategy)
+        return
+
     def _check_tp_sl(self, strategy: "Strategy"):
         buying_price = strategy.order.price
         strategy.unpnl = self.prices[strategy.symbol].ask / buying_price - 1
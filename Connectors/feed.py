@@ -0,0 +1,162 @@
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Hashable, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+class _Event:
+    __slots__ = ("handler", "args", "group", "received")
+
+    def __init__(self, handler: Callable, args: Tuple, group: Hashable):
+        self.handler = handler
+        self.args = args
+        self.group = group
+        self.received = time.monotonic()
+
+
+class _Slot:
+    """Pending events of a key: the ones that must run, then the latest."""
+
+    __slots__ = ("kept", "latest")
+
+    def __init__(self):
+        self.kept: List[_Event] = []
+        self.latest: Union[_Event, None] = None
+
+
+class CoalescingFeed:
+    """
+    Hands the market data events from the websocket callbacks (ingestion) to
+    a worker thread running the strategies, so a slow strategy never backs up
+    the sockets.
+
+    Events are coalesced by key (e.g. the symbol ticker), only the latest
+    waiting event of a key runs. Events of another group (e.g. the next
+    candle) replace nothing, and kept events (e.g. closed candles) are never
+    dropped, they run in their arrival order before the latest event.
+    """
+
+    def __init__(self, client: "CryptoExchange"):
+        self.client = client
+        # key: event key, value: its pending events. The keys run in the order
+        # they got their first pending event.
+        self._pending: Dict[Hashable, _Slot] = dict()
+        self._ready: Deque[Hashable] = deque()
+        self._condition = Condition()
+        self._running = False
+        self._received = 0
+        self._processed = 0
+        self._dropped = 0
+        self._errors = 0
+        # End-to-end lag (received -> processed) in seconds
+        self._lag = 0.0
+        self._max_lag = 0.0
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        Thread(target=self._run, daemon=True).start()
+        return
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        return
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def put(
+        self,
+        key: Hashable,
+        handler: Callable,
+        *args,
+        group: Hashable = None,
+        keep: bool = False,
+    ):
+        """Queue handler(*args), it replaces the waiting event of key"""
+        event = _Event(handler, args, group)
+        with self._condition:
+            self._received += 1
+            slot = self._pending.get(key)
+            if slot is None:
+                slot = self._pending[key] = _Slot()
+                self._ready.append(key)
+                self._condition.notify()
+            if slot.latest is not None:
+                if slot.latest.group == group:
+                    self._dropped += 1
+                else:
+                    slot.kept.append(slot.latest)
+                slot.latest = None
+            if keep:
+                slot.kept.append(event)
+            else:
+                slot.latest = event
+        return
+
+    def call(self, key: Hashable, handler: Callable, *args):
+        """
+        Run handler(*args) on the worker, after the events already waiting,
+        so it never runs next to a strategy. It runs right away when the
+        worker is not running.
+        """
+        if not self._running:
+            handler(*args)
+            return
+        self.put(key, handler, *args, keep=True)
+        return
+
+    def stats(self) -> Dict:
+        """Queue depth, event counts and lag, the max lag is reset."""
+        with self._condition:
+            stats = {
+                "pending_keys": len(self._ready),
+                "pending_events": sum(
+                    len(slot.kept) + (slot.latest is not None)
+                    for slot in self._pending.values()
+                ),
+                "received": self._received,
+                "processed": self._processed,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "lag_ms": round(self._lag * 1000, 3),
+                "max_lag_ms": round(self._max_lag * 1000, 3),
+            }
+            self._max_lag = 0.0
+        return stats
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._ready:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                slot = self._pending.pop(self._ready.popleft())
+            events = slot.kept
+            if slot.latest is not None:
+                events.append(slot.latest)
+            for event in events:
+                self._process(event)
+
+    def _process(self, event: _Event):
+        try:
+            event.handler(*event.args)
+        except Exception as e:
+            self._errors += 1
+            self.client.add_log(f"Strategy error: {e!r}", "error")
+        lag = time.monotonic() - event.received
+        with self._condition:
+            self._processed += 1
+            # Moving average of the last ~100 events
+            self._lag += (lag - self._lag) * 0.01
+            self._max_lag = max(self._max_lag, lag)
+        return
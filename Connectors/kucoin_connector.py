@@ -6,17 +6,27 @@ import logging
 import logging.config
 import os
 import random
+import re
 import string
 import time
-from typing import TYPE_CHECKING, Dict, Union, Literal
+from typing import TYPE_CHECKING, Dict, Literal, Tuple, Union
 
-import requests
 import websocket
 from dotenv import load_dotenv
 from requests.exceptions import RequestException
 
 from Connectors.crypto_base_class import CryptoExchange
-from Moduls.data_modul import Balance, CandleStick, Contract, Order, Price
+from Connectors.user_stream import KucoinUserStream
+from Connectors.ws_decoder import MessageRouter
+from Connectors.ws_manager import WsManager
+from Moduls.data_modul import (
+    Balance,
+    CandleStick,
+    Contract,
+    Order,
+    Price,
+    candles_to_array,
+)
 
 if TYPE_CHECKING:
     from strategies import Strategy
@@ -28,18 +38,37 @@ logging.config.fileConfig("logger.config")
 class KucoinClient(CryptoExchange):
     _loaded = dict()
 
-    def __new__(cls, is_spot: bool, is_test: bool):
+    def __new__(cls, is_spot: bool, is_test: bool, *args, **kwargs):
         if (client := cls._loaded.get(f"{is_spot} {is_test}")) is None:
             client = super().__new__(cls)
             cls._loaded[f"{is_spot} {is_test}"] = client
         return client
 
-    def __init__(self, is_spot: bool, is_test: bool):
+    def __init__(
+        self,
+        is_spot: bool,
+        is_test: bool,
+        pool_size: int = 10,
+        timeout: Tuple = (3.05, 10),
+    ):
         self._init(is_spot, is_test)
         self.logger = logging.getLogger(__name__)
         super().__init__()
+        self._session = self._create_session(pool_size)
+        self._timeout = timeout
+        self.user_stream = KucoinUserStream(self)
+        # The messages are routed by their topic: /market/ticker:{symbol}
+        self._router = MessageRouter("topic", "data")
+        # A connection can subscribe to 300 topics at most, and send 100
+        # messages every 10 seconds
+        self.ws_manager = WsManager(
+            self,
+            max_streams=300,
+            send_interval=0.12,
+            connection_class=self._ws_connection,
+        )
         self._check_internet_connection()
-        self.contracts = self._get_contracts()
+        self.contracts = self.metadata.load()
         self.prices: Dict[str, Price] = dict()
 
     def _init(self, is_spot: bool, is_test: bool):
@@ -52,10 +81,16 @@ class KucoinClient(CryptoExchange):
         self._base_url = urls[(is_spot, is_test)]
         spot_future = "Spot" if is_spot else "Future"
         real_test = "Test" if is_test else ""
-        self._api_key = f"{self.exchange}{spot_future}{real_test}APIKey"
-        self._api_secret = self._api_key.replace("APIKey", "APISecret")
+        env_key = f"{self.exchange}{spot_future}{real_test}APIKey"
+        # The credentials are read once and the HMAC is keyed once, each
+        # signature starts from a copy of it
+        self._api_key = os.getenv(env_key)
+        self._hmac = hmac.new(
+            key=os.getenv(env_key.replace("APIKey", "APISecret"), "").encode("utf-8"),
+            digestmod=hashlib.sha256,
+        )
         self._passphrase = self._generate_signature(
-            os.getenv(self._api_key.replace("APIKey", "Passphrase"))
+            os.getenv(env_key.replace("APIKey", "Passphrase"), "")
         )
         return
 
@@ -86,6 +121,15 @@ class KucoinClient(CryptoExchange):
     def exchange(self):
         return "Kucoin"
 
+    # Kline timestamps are in seconds, at most 1500 klines per request
+    _kline_time_unit = 1000
+    _klines_limit = 1500
+    # Seconds of the kline interval units, e.g. "15min" or "1hour"
+    _interval_units = {"min": 60, "hour": 3600, "day": 86400, "week": 604800}
+    # Status of the orders still waiting to be filled
+    _open_order_statuses = ["new", "partially_filled"]
+    _filled_order_status = "filled"
+
     def _execute_request(self, endpoint: str, http_method: str, params=dict()):
         """This argument is used to send all types of requests to the server"""
         try:
@@ -93,7 +137,7 @@ class KucoinClient(CryptoExchange):
             data_json = json.dumps(params) if params else ""
             signature = now + http_method + endpoint + data_json
             _header = {
-                "KC-API-KEY": os.getenv(self._api_key),
+                "KC-API-KEY": self._api_key,
                 "KC-API-SIGN": self._generate_signature(signature),
                 "KC-API-TIMESTAMP": now,
                 "KC-API-PASSPHRASE": self._passphrase,
@@ -102,18 +146,20 @@ class KucoinClient(CryptoExchange):
             }
             # Generate the signature for the query
             if http_method in ["GET", "DELETE"]:
-                response = requests.request(
+                response = self._session.request(
                     method=http_method,
                     url=self._base_url + endpoint,
                     params=params,
                     headers=_header,
+                    timeout=self._timeout,
                 )
             elif http_method in ["POST", "PUT"]:
-                response = requests.request(
+                response = self._session.request(
                     method=http_method,
                     url=self._base_url + endpoint,
                     data=data_json,
                     headers=_header,
+                    timeout=self._timeout,
                 )
             response.raise_for_status()
             return response
@@ -124,36 +170,52 @@ class KucoinClient(CryptoExchange):
         return None
 
     def _generate_signature(self, query_string: str):
-        return base64.b64encode(
-            hmac.new(
-                key=os.getenv(self._api_secret).encode("utf-8"),
-                msg=query_string.encode("utf-8"),
-                digestmod=hashlib.sha256,
-            ).digest()
-        )
+        signature = self._hmac.copy()
+        signature.update(query_string.encode("utf-8"))
+        return base64.b64encode(signature.digest())
 
     # ###################### MARKET DATA FUNCTION #######################
-    def _get_contracts(self) -> Dict[str, Contract] | None:
+    def _get_metadata(self) -> Dict | None:
         response = self._execute_request("/api/v2/symbols", "GET")
         if response:
-            symbols = response.json()["data"]
-            contracts = {
-                symbol["symbol"]: Contract(symbol, self.exchange) for symbol in symbols
+            fields = [
+                "symbol",
+                "baseCurrency",
+                "quoteCurrency",
+                "quoteIncrement",
+                "baseIncrement",
+                "baseMinSize",
+            ]
+            # Only the fields read by Contract are cached
+            symbols = {
+                symbol["symbol"]: {field: symbol[field] for field in fields}
+                for symbol in response.json()["data"]
             }
-            return contracts
+            return {"symbols": symbols}
         return None
 
-    def get_candlestick(self, contract: Contract, interval: str):
+    def get_candlestick(
+        self, contract: Contract, interval: str, as_array=False, end=None
+    ):
         """
         Get a list of the historical Candlestickes for given contract.
+        With as_array, return them as a CANDLE_DTYPE structured array.
+        With end, return the page of candles ending at this timestamp.
         """
         params = {"symbol": contract.symbol, "type": interval}
+        end = int(end) if end is not None else int(time.time())
+        params["endAt"] = end
+        # A full page: the _klines_limit intervals before end
+        match = re.fullmatch(r"([0-9]+)([a-z]+)", interval)
+        if match and match.group(2) in self._interval_units:
+            step = int(match.group(1)) * self._interval_units[match.group(2)]
+            params["startAt"] = end - self._klines_limit * step
         response = self._execute_request("/api/v1/market/candles", "GET", params)
         if response:
-            return [
-                CandleStick(candle, self.exchange)
-                for candle in response.json()["data"][::-1]
-            ]
+            candles = response.json()["data"][::-1]
+            if as_array:
+                return candles_to_array(candles, self.exchange)
+            return [CandleStick(candle, self.exchange) for candle in candles]
         return None
 
     def get_price(self, contract: Contract):
@@ -165,6 +227,7 @@ class KucoinClient(CryptoExchange):
         if response:
             self.prices[symbol] = Price(response.json()["data"], self.exchange)
             self.prices[symbol].symbol = symbol
+            self.state.set("prices", symbol, self.prices[symbol])
             return self.prices[symbol]
         return None
 
@@ -220,6 +283,7 @@ class KucoinClient(CryptoExchange):
                 for asset in response.json()["data"]
                 if asset["type"] == "trade"
             }
+            self.state.publish(balance=balance)
             return balance
         return None
 
@@ -229,8 +293,8 @@ class KucoinClient(CryptoExchange):
         return self.getBalance
 
     # ########################### Websocket Arguments ########################
-    def _start_ws(self):
-        # Reopen the websocket connection if it terminated
+    def _ws_endpoint(self):
+        # Every connection needs a new token
         ws_init = None
         while ws_init is None:
             ws_init = self._execute_request("/api/v1/bullet-public", "POST")
@@ -239,26 +303,34 @@ class KucoinClient(CryptoExchange):
         token = ws_init.json()["data"]["token"]
         ws_url = ws_init.json()["data"]["instanceServers"][0]["endpoint"]
         self._ws_url = f"{ws_url}?token={token}&connectId={int(time.time())}"
-        self._ws = websocket.WebSocketApp(
-            url=self._ws_url,
-            on_open=self._on_open,
-            on_close=self._on_close,
-            on_error=self._on_error,
-            on_message=self._on_message,
-        )
-        while True:
-            try:
-                if self._ws_connect:
-                    # Reconnect unless the interface is closed by the user
-                    self._ws.run_forever()
-                else:
-                    break
-            except Exception as e:
-                # Update the log about this error
-                msg = f"{self.exchange} error in run_forever() method: {e}"
-                self.add_log(msg, "warning")
-            # Add sleeping interval
-            time.sleep(3)
+        return self._ws_url
+
+    def _ws_batch_key(self, stream):
+        # The symbols of the same topic are subscribed in a single message:
+        # /market/ticker:BTC-USDT,ETH-USDT
+        return stream.split(":")[0]
+
+    def _ws_request(self, streams, subscribe, request_id):
+        prefix = self._ws_batch_key(streams[0])
+        symbols = ",".join(stream.split(":")[1] for stream in streams)
+        msg = {
+            "id": request_id,
+            "type": "subscribe" if subscribe else "unsubscribe",
+            "topic": f"{prefix}:{symbols}",
+            "privateChannel": False,
+            "response": True,
+        }
+        return json.dumps(msg)
+
+    def _ws_reply(self, data):
+        # {"id": "1", "type": "ack"} or {"id": "1", "type": "error", "data": ""}
+        if not isinstance(data, dict) or "id" not in data:
+            return None
+        if data.get("type") == "ack":
+            return str(data["id"]), None
+        if data.get("type") == "error":
+            return str(data["id"]), str(data.get("data"))
+        return None
 
     def new_subscribe(
         self,
@@ -268,28 +340,24 @@ class KucoinClient(CryptoExchange):
     ):
         contract = self.contracts[symbol]
         if channel == "tickers":
-            self._bookTicket_subscribe(contract)
+            return self._bookTicket_subscribe(contract)
         elif channel == "candles":
-            self._kline_subscribe(contract, interval)
+            return self._kline_subscribe(contract, interval)
 
     def _bookTicket_subscribe(self, contract: Contract):
-        channel = f"/ticker:{contract.symbol}"
+        channel = f"/market/ticker:{contract.symbol}"
         if contract in self.bookTicker_subscribtion_list:
             self.add_log(f"Already subscribed to {channel}", "info")
             return
-        msg = {
-            "id": self.id,
-            "type": "subscribe",
-            "topic": channel,
-            "privateChannel": False,
-            "response": False,
-        }
-        # Subscribe to the websocket channel
-        self.get_price(contract)
-        self._ws.send(json.dumps(msg))
+        # Subscribe to the websocket channel, the current bid and ask prices
+        # may be already loaded (e.g. by the deployment warm-up)
+        if contract.symbol not in self.prices:
+            self.get_price(contract)
+        self._router.add(channel, self._bookTickerMsg, contract.symbol)
+        future = self.ws_manager.subscribe(channel)
         self.bookTicker_subscribtion_list[contract] = self.id
         self.id += 1
-        return
+        return future
 
     def _kline_subscribe(self, contract: Contract, interval: str):
         # Make sure the contract is in the bookTicker.
@@ -302,19 +370,12 @@ class KucoinClient(CryptoExchange):
             self.strategy_counter[strategy_key]["count"] += 1
             self.add_log(f"Already subscribed to {channel}", "info")
             return
-        msg = {
-            "id": self.id,
-            "type": "subscribe",
-            "topic": channel,
-            "privateChannel": False,
-            "response": False,
-        }
-
         # Subscribe to the websocket channel
-        self._ws.send(json.dumps(msg))
+        self._router.add(channel, self._klineMsg, symbol, interval)
+        future = self.ws_manager.subscribe(channel)
         self.strategy_counter[strategy_key] = {"count": 1, "id": self.id}
         self.id += 1
-        return
+        return future
 
     def unsubscribe_channel(
         self,
@@ -326,10 +387,7 @@ class KucoinClient(CryptoExchange):
         if channel == "candles":
             self._kline_unsubscribe(strategy)
         elif channel == "tickers":
-            running_contracts = list(
-                map(lambda x: x.split("_")[0], self.strategy_counter.keys())
-            )
-            if symbol in running_contracts:
+            if symbol in self.symbol_strategies:
                 msg = (
                     f"{symbol} had a running strategy and "
                     "can't be removed from the watchlist"
@@ -340,34 +398,23 @@ class KucoinClient(CryptoExchange):
         return
 
     def _bookTicker_unsubscribe(self, symbol: str):
-        _id = self.bookTicker_subscribtion_list[self.contracts[symbol]]
         channel = f"/market/ticker:{symbol}"
-        msg = {
-            "id": _id,
-            "type": "unsubscribe",
-            "topic": channel,
-            "privateChannel": False,
-            "response": False,
-        }
-        self._ws.send(json.dumps(msg))
+        self.ws_manager.unsubscribe(channel)
+        self._router.remove(channel)
         self.bookTicker_subscribtion_list.pop(self.contracts[symbol])
         self.prices.pop(symbol)
+        self.state.discard("prices", symbol)
         return
 
     def _kline_unsubscribe(self, strategy: "Strategy"):
         counters_key = strategy.ws_channel_key
-        self.running_startegies.pop(strategy.strategy_key)
+        self._unregister_strategy(strategy)
+        self._release_channel(strategy)
         self.strategy_counter[counters_key]["count"] -= 1
         if self.strategy_counter[counters_key]["count"] == 0:
             channel = f"/market/candles:{strategy.symbol}_{strategy.interval}"
-            msg = {
-                "id": self.strategy_counter[counters_key]["id"],
-                "type": "unsubscribe",
-                "topic": channel,
-                "privateChannel": False,
-                "response": False,
-            }
-            self._ws.send(json.dumps(msg))
+            self.ws_manager.unsubscribe(channel)
+            self._router.remove(channel)
             self.strategy_counter.pop(counters_key)
         return
 
@@ -377,18 +424,9 @@ class KucoinClient(CryptoExchange):
         This is the argument that will form most of the connections between
         the backend and frontend by automating trades and send data to the UI
         """
-        # Read the received message
-        data = json.loads(msg)
-        if "type" in data and data["type"] == "welcome":
-            return
-        channel = data["subject"]
-        symbol = data["topic"].split(":")[-1]
-        if channel == "trade.ticker":
-            self._bookTickerMsg(data["data"], symbol)
-        elif channel == "trade.candles.update":
-            self._klineMsg(data, symbol)
-        else:
-            return
+        # Routed by topic to _bookTickerMsg or _klineMsg, the welcome and
+        # the replies have no route
+        return self._router.dispatch(msg)
 
     def _bookTickerMsg(self, data, symbol):
         """
@@ -400,12 +438,16 @@ class KucoinClient(CryptoExchange):
         # Update ask/bid prices
         self.prices[symbol].bid = float(data["bestBid"])
         self.prices[symbol].ask = float(data["bestAsk"])
-        # Check the status of the order for each running strategy
-        for strategy in self.running_startegies.values():
-            if symbol == strategy.symbol and hasattr(strategy, "order"):
-                if strategy.order.status in ["new", "partially_filled"]:
-                    strategy.order = self.order_status(strategy.order)
-                elif strategy.order.status == "canceled":
+        if symbol in self.symbol_strategies:
+            self.feed.put(("bookTicker", symbol), self._on_book_ticker, symbol)
+        return
+
+    def _on_book_ticker(self, symbol):
+        # The order status is pushed by the user stream, or polled by the
+        # order tracker, never here
+        for strategy in self._strategies_of(symbol):
+            if hasattr(strategy, "order"):
+                if strategy.order.status == "canceled":
                     self._kline_unsubscribe(strategy)
                     continue
                 if strategy.order.status == "filled":
@@ -413,7 +455,7 @@ class KucoinClient(CryptoExchange):
                     self._check_tp_sl(strategy)
         return
 
-    def _klineMsg(self, data, symbol):
+    def _klineMsg(self, data, symbol, interval):
         """
         AggTrade message is send when a trade is made.
         Used to update indicators and make trading decision.
@@ -421,13 +463,24 @@ class KucoinClient(CryptoExchange):
         Subscribe to this channel when starting new strategy, and cancel the
         subscribtion once all running strategies for a given contract stopped.
         """
-        interval = data["topic"].split("_")[-1]
-        sent_candle = CandleStick(data["data"]["candles"], self.exchange)
-        for strategy in self.running_startegies.values():
+        sent_candle = CandleStick(data["candles"], self.exchange)
+        # Updates of the same candle are coalesced, the last update of a
+        # candle is kept once the next one starts
+        self.feed.put(
+            ("kline", symbol, interval),
+            self._on_kline,
+            sent_candle,
+            symbol,
+            interval,
+            group=data["candles"][0],
+        )
+        return
+
+    def _on_kline(self, sent_candle: CandleStick, symbol, interval):
+        for strategy in self._strategies_of(symbol, interval):
             if hasattr(strategy, "order"):
-                if [strategy.symbol, strategy.interval] == [symbol, interval]:
-                    decision = strategy.parse_trade(sent_candle)
-                    self._process_dicision(strategy, decision)
+                decision = strategy.parse_trade(sent_candle)
+                self._process_dicision(strategy, decision)
             else:
                 self._kline_unsubscribe(strategy)
         return
@@ -440,7 +493,7 @@ class KucoinClient(CryptoExchange):
         return
 
     def _buy_with_strategy(self, strategy: "Strategy"):
-        latest_price = strategy.df["close"].iloc[-1]
+        latest_price = strategy.candles["close"][-1]
         min_qty = 10 / latest_price
         base_asset = strategy.contract.quoteAsset
         balance = self.getBalance[base_asset].availableBalance
@@ -455,7 +508,7 @@ class KucoinClient(CryptoExchange):
                 size=quantity_margin,
             )
             if order:
-                strategy.order = order
+                self._track_buy(strategy, order)
                 msg = (
                     f"{strategy.order.symbol} buying order was made. "
                     f"Quantity: {strategy.order.quantity}. "
@@ -471,19 +524,17 @@ class KucoinClient(CryptoExchange):
             self.add_log(msg, "info")
 
     def _sell_with_strategy(self, strategy: "Strategy"):
+        # The sell order of the strategy is still being filled
+        if strategy.sell_order is not None:
+            return
         sell_order = self.make_order(
-            contract=self.strategy.contract,
+            contract=strategy.contract,
             side="sell",
             order_type="market",
             size=strategy.order.quantity,
         )
         if sell_order:
-            while sell_order.status != "filled":
-                sell_order = self.order_status(sell_order)
-                # time.sleep(2)
-            strategy.relaizedPnL += strategy._PnLcalciator(sell_order)
-            strategy.order = sell_order
-            self._kline_unsubscribe(strategy)
+            self._track_sell(strategy, sell_order)
         return
 
     def _generate_client_order_id(self):
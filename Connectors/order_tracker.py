@@ -0,0 +1,150 @@
+import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Dict, List, Union
+
+from Moduls.data_modul import Order
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+class _Pending:
+    __slots__ = ("order", "key", "future", "next_poll", "delay")
+
+    def __init__(self, order: Order, key: str, delay: float):
+        self.order = order
+        self.key = key
+        self.future: Future = Future()
+        self.next_poll = time.monotonic() + delay
+        self.delay = delay
+
+
+class OrderTracker:
+    """
+    Follows the pending orders in the background until they are closed
+    (filled, canceled, rejected...) and resolves their futures.
+
+    The updates pushed by the user stream (on_update) resolve the orders
+    right away. The REST status is only polled as a fallback, from the
+    tracker thread and with an exponential backoff, so market data
+    processing never waits for an order.
+    """
+
+    def __init__(
+        self,
+        client: "CryptoExchange",
+        first_poll: float = 1.0,
+        max_poll: float = 30.0,
+    ):
+        self.client = client
+        self.first_poll = first_poll
+        self.max_poll = max_poll
+        # key: orderId
+        self._pending: Dict[str, _Pending] = dict()
+        self._condition = Condition()
+        self._thread: Union[Thread, None] = None
+        self._running = False
+
+    def track(self, order: Order, key: Union[str, None] = None) -> Future:
+        """
+        Follow the order until it is closed. The future result is the closed
+        order. key (e.g. the strategy key) can be checked with is_pending.
+        """
+        pending = _Pending(order, key, self.first_poll)
+        if self._is_closed(order.status):
+            pending.future.set_result(order)
+            return pending.future
+        with self._condition:
+            self._pending[order.orderId] = pending
+            self._start()
+            self._condition.notify()
+        return pending.future
+
+    def is_pending(self, key: str) -> bool:
+        with self._condition:
+            return any(pending.key == key for pending in self._pending.values())
+
+    def on_update(self, order_id: str, status: str):
+        """Order status pushed by the exchange."""
+        with self._condition:
+            pending = self._pending.get(order_id)
+            if pending is None:
+                return
+            pending.order.status = status
+            if self._is_closed(status):
+                self._pending.pop(order_id)
+            else:
+                return
+        pending.future.set_result(pending.order)
+        return
+
+    def poll_now(self):
+        """Poll the pending orders right away, e.g. updates may have been lost"""
+        with self._condition:
+            now = time.monotonic()
+            for pending in self._pending.values():
+                pending.next_poll = now
+            self._condition.notify()
+        return
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        return
+
+    def _is_closed(self, status: str) -> bool:
+        return status not in self.client._open_order_statuses
+
+    def _start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._wait_due()
+                if due is None:
+                    return
+            for pending in due:
+                self._poll(pending)
+
+    def _wait_due(self) -> Union[List[_Pending], None]:
+        """Wait for the orders to poll, None once the tracker is stopped"""
+        while self._running:
+            now = time.monotonic()
+            due = [p for p in self._pending.values() if p.next_poll <= now]
+            if due:
+                return due
+            next_poll = min((p.next_poll for p in self._pending.values()), default=None)
+            self._condition.wait(None if next_poll is None else next_poll - now)
+        return None
+
+    def _poll(self, pending: _Pending):
+        try:
+            order = self.client.order_status(pending.order)
+        except Exception as e:
+            self.client.add_log(f"Order {pending.order.orderId} status: {e}", "error")
+            order = None
+        with self._condition:
+            if self._pending.get(pending.order.orderId) is not pending:
+                # Resolved by a pushed update meanwhile
+                return
+            pending.delay = min(pending.delay * 2, self.max_poll)
+            pending.next_poll = time.monotonic() + pending.delay
+            if order is None:
+                return
+            # Market orders have no price, keep the one set by the connector
+            if not order.price:
+                order.price = pending.order.price
+            pending.order.status = order.status
+            if not self._is_closed(order.status):
+                return
+            self._pending.pop(pending.order.orderId)
+        pending.future.set_result(order)
+        return
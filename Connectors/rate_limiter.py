@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import time
+from threading import Condition
+from typing import Dict, List, Tuple
+
+# Request priorities, the lowest value goes first
+ORDER, STATUS, MARKET, BACKGROUND = range(4)
+# Part of each budget a priority may use, the rest is kept for the orders
+SHARES = {ORDER: 1.0, STATUS: 0.9, MARKET: 0.85, BACKGROUND: 0.75}
+_INTERVALS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+
+class Budget:
+    """Counter of one exchange rate limit, reset every interval."""
+
+    __slots__ = ("limit", "interval", "used", "window")
+
+    def __init__(self, limit: int, interval: float):
+        self.limit = limit
+        self.interval = interval
+        self.used = 0
+        self.window = 0.0
+
+    def _roll(self, now: float):
+        # The exchanges reset the counters at the start of each interval
+        window = now - now % self.interval
+        if window != self.window:
+            self.window = window
+            self.used = 0
+        return
+
+    def wait(self, now: float, weight: int, share: float) -> float:
+        """Seconds to wait before `weight` fits in the share of the budget."""
+        self._roll(now)
+        if self.used + weight <= self.limit * share:
+            return 0.0
+        return self.window + self.interval - now
+
+
+class RateLimiter:
+    """
+    Request weight scheduler of an exchange REST API.
+
+    Every request takes a ticket with its weight and priority. The tickets
+    go out one at a time, the lowest priority value first, once the request
+    fits in the budgets. The lower priorities may only use a share of each
+    budget, so order placement always has some left. The budgets are
+    corrected with the used weight the exchange returns in the headers.
+    """
+
+    def __init__(
+        self,
+        weight_limits: Dict[str, Tuple[int, float]],
+        order_limits: Dict[str, Tuple[int, float]],
+        weight_header: str = "",
+        order_header: str = "",
+    ):
+        # key: interval as in the headers (1M, 10S, 1D), value: (limit, seconds)
+        self.weights = {k: Budget(*limit) for k, limit in weight_limits.items()}
+        self.orders = {k: Budget(*limit) for k, limit in order_limits.items()}
+        self._weight_header = weight_header.lower()
+        self._order_header = order_header.lower()
+        self._condition = Condition()
+        self._queue: List[Tuple[int, int]] = []
+        self._counter = itertools.count()
+        self._banned_until = 0.0
+
+    def configure(self, rate_limits: List[Dict]):
+        """Set the budgets from the exchange rateLimits (Binance exchangeInfo)."""
+        with self._condition:
+            for rate_limit in rate_limits:
+                budgets = {"REQUEST_WEIGHT": self.weights, "ORDERS": self.orders}
+                budgets = budgets.get(rate_limit["rateLimitType"])
+                if budgets is None:
+                    continue
+                interval = rate_limit["interval"]
+                key = f"{rate_limit['intervalNum']}{interval[0]}"
+                seconds = rate_limit["intervalNum"] * _INTERVALS[interval]
+                if key in budgets:
+                    budgets[key].limit = rate_limit["limit"]
+                    budgets[key].interval = seconds
+                else:
+                    budgets[key] = Budget(rate_limit["limit"], seconds)
+            self._condition.notify_all()
+        return
+
+    # ########################### Tickets ##########################
+    def acquire(self, weight: int, priority: int = BACKGROUND, order=False):
+        """Block until the request can be sent."""
+        ticket = self._enqueue(priority)
+        try:
+            with self._condition:
+                while (wait := self._take(ticket, weight, order)) > 0:
+                    self._condition.wait(wait)
+        except BaseException:
+            self._discard(ticket)
+            raise
+        return
+
+    async def acquire_async(self, weight: int, priority=BACKGROUND, order=False):
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._take(ticket, weight, order)
+                if wait == 0:
+                    return
+                # Wake up often, a higher priority request may have been sent
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            self._discard(ticket)
+            raise
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        ticket = (priority, next(self._counter))
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _discard(self, ticket: Tuple[int, int]):
+        """Remove a ticket whose request was given up."""
+        with self._condition:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+        return
+
+    def _take(self, ticket: Tuple[int, int], weight: int, order: bool) -> float:
+        """Take the budget if it is the ticket turn, else return the time to wait"""
+        now = time.time()
+        if now < self._banned_until:
+            return self._banned_until - now
+        if self._queue[0] != ticket:
+            return 0.05
+        share = SHARES[ticket[0]]
+        budgets = [(budget, weight) for budget in self.weights.values()]
+        if order:
+            budgets += [(budget, 1) for budget in self.orders.values()]
+        wait = max([budget.wait(now, cost, share) for budget, cost in budgets] + [0])
+        if wait > 0:
+            return wait
+        for budget, cost in budgets:
+            budget.used += cost
+        heapq.heappop(self._queue)
+        self._condition.notify_all()
+        return 0
+
+    # ########################### Responses ##########################
+    def update(self, headers: Dict[str, str]):
+        """Correct the budgets with the counters sent by the exchange."""
+        now = time.time()
+        with self._condition:
+            for name, value in headers.items():
+                name = name.lower()
+                if self._weight_header and name.startswith(self._weight_header):
+                    budget = self.weights.get(name[len(self._weight_header) :].upper())
+                elif self._order_header and name.startswith(self._order_header):
+                    budget = self.orders.get(name[len(self._order_header) :].upper())
+                else:
+                    continue
+                if budget is not None:
+                    budget._roll(now)
+                    # Keep the local count of the requests still in flight
+                    budget.used = max(budget.used, int(value))
+        return
+
+    def ban(self, seconds: float):
+        """Stop all the requests (HTTP 429/418 with Retry-After)."""
+        with self._condition:
+            self._banned_until = max(self._banned_until, time.time() + seconds)
+        return
+
+    def usage(self) -> Dict:
+        """Used and remaining part of each budget."""
+        now = time.time()
+        with self._condition:
+            usage = dict()
+            for kind, budgets in [("weight", self.weights), ("orders", self.orders)]:
+                for key, budget in budgets.items():
+                    budget._roll(now)
+                    usage[f"{kind}_{key}"] = {
+                        "used": budget.used,
+                        "limit": budget.limit,
+                        "reset_in": round(budget.window + budget.interval - now, 3),
+                    }
+            usage["queued"] = len(self._queue)
+            usage["banned_for"] = round(max(self._banned_until - now, 0), 3)
+        return usage
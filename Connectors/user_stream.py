@@ -0,0 +1,202 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Dict, Union
+
+import websocket
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+class UserStream(ABC):
+    """
+    Private websocket of the account. The exchange pushes the updates of the
+    orders, which are passed to client._on_order_update, so the orders never
+    have to be polled.
+
+    The connection runs on its own thread and reconnects (with a new key)
+    until stop() is called. ws_url replaces the exchange websocket endpoint,
+    e.g. to connect to a local server.
+    """
+
+    # Seconds between two _keepalive calls
+    keepalive_interval = 30 * 60
+
+    def __init__(self, client: "CryptoExchange", ws_url: Union[str, None] = None):
+        self.client = client
+        self.ws_url = ws_url
+        self._ws: Union[websocket.WebSocketApp, None] = None
+        self._running = False
+        self._stopped = Event()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._stopped.clear()
+        Thread(target=self._run, daemon=True).start()
+        Thread(target=self._keepalive_loop, daemon=True).start()
+        return
+
+    def stop(self):
+        self._running = False
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+        return
+
+    def _run(self):
+        while self._running:
+            url = self._connect_url()
+            if url is None:
+                self._stopped.wait(3)
+                continue
+            self._ws = websocket.WebSocketApp(
+                url=url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            try:
+                self._ws.run_forever()
+            except Exception as e:
+                self.client.add_log(f"User stream error: {e}", "warning")
+            if self._running:
+                self.client.add_log("User stream disconnected", "info")
+                self._stopped.wait(3)
+        return
+
+    def _keepalive_loop(self):
+        while not self._stopped.wait(self.keepalive_interval):
+            try:
+                self._keepalive()
+            except Exception as e:
+                self.client.add_log(f"User stream keepalive error: {e}", "warning")
+        return
+
+    def _on_open(self, ws: websocket.WebSocketApp):
+        self.client.add_log("User stream connected", "info")
+        # The updates sent while the stream was disconnected are lost
+        self.client.order_tracker.poll_now()
+        return
+
+    def _on_error(self, ws: websocket.WebSocketApp, error):
+        self.client.add_log(f"User stream error: {error}", "error")
+        return
+
+    def _on_message(self, ws: websocket.WebSocketApp, msg: str):
+        update = self._parse(json.loads(msg))
+        if update is not None:
+            self.client._on_order_update(*update)
+        return
+
+    # ########################### Exchange specific ##########################
+    @abstractmethod
+    def _connect_url(self) -> Union[str, None]:
+        """Get a key from the exchange and return the websocket url"""
+        pass
+
+    def _keepalive(self):
+        return
+
+    @abstractmethod
+    def _parse(self, data: Dict):
+        """Return (order_id, status) for an order update, else None"""
+        pass
+
+
+class BinanceUserStream(UserStream):
+    """Binance user data stream (listenKey and executionReport events)."""
+
+    endpoint = "/v3/userDataStream"
+
+    def __init__(self, client: "CryptoExchange", ws_url: Union[str, None] = None):
+        super().__init__(client, ws_url)
+        self._listen_key: Union[str, None] = None
+
+    def _connect_url(self):
+        response = self.client._execute_request(
+            self.endpoint, "POST", dict(), need_sign=False
+        )
+        if not response:
+            return None
+        self._listen_key = response.json()["listenKey"]
+        return f"{self.ws_url or self.client._user_ws_url}/{self._listen_key}"
+
+    def _keepalive(self):
+        # The listenKey expires after 60 minutes without keepalive
+        if self._listen_key is not None:
+            params = {"listenKey": self._listen_key}
+            self.client._execute_request(self.endpoint, "PUT", params, need_sign=False)
+        return
+
+    def _parse(self, data: Dict):
+        event = data.get("e")
+        if event == "executionReport":
+            return str(data["i"]), data["X"]
+        if event == "listenKeyExpired":
+            # Reconnect with a new listenKey
+            self._ws.close()
+        return None
+
+
+class KucoinUserStream(UserStream):
+    """Kucoin private websocket, /spotMarket/tradeOrders topic."""
+
+    topic = "/spotMarket/tradeOrders"
+    # Order event type: order status as in Order._from_kucoin
+    _statuses = {
+        "open": "new",
+        "match": "partially_filled",
+        "filled": "filled",
+        "canceled": "canceled",
+    }
+
+    def __init__(self, client: "CryptoExchange", ws_url: Union[str, None] = None):
+        super().__init__(client, ws_url)
+        self._ping_interval = 18
+
+    def _connect_url(self):
+        response = self.client._execute_request("/api/v1/bullet-private", "POST")
+        if not response:
+            return None
+        data = response.json()["data"]
+        server = data["instanceServers"][0]
+        # Kucoin closes the connection without a ping message in this interval
+        self._ping_interval = server.get("pingInterval", 18000) / 1000
+        endpoint = self.ws_url or server["endpoint"]
+        return f"{endpoint}?token={data['token']}&connectId={int(time.time())}"
+
+    def _on_open(self, ws: websocket.WebSocketApp):
+        super()._on_open(ws)
+        msg = {
+            "id": int(time.time() * 1000),
+            "type": "subscribe",
+            "topic": self.topic,
+            "privateChannel": True,
+            "response": True,
+        }
+        ws.send(json.dumps(msg))
+        Thread(target=self._ping_loop, args=(ws,), daemon=True).start()
+        return
+
+    def _ping_loop(self, ws: websocket.WebSocketApp):
+        while ws is self._ws and not self._stopped.wait(self._ping_interval):
+            try:
+                ws.send(json.dumps({"id": int(time.time() * 1000), "type": "ping"}))
+            except Exception:
+                break
+        return
+
+    def _parse(self, data: Dict):
+        if data.get("topic") != self.topic or data.get("subject") != "orderChange":
+            return None
+        order = data["data"]
+        status = self._statuses.get(order["type"])
+        if status is None:
+            # "update" (size changed): done when nothing is left to fill
+            done = order.get("status") == "done"
+            status = "filled" if done else "partially_filled"
+        return str(order["orderId"]), status
@@ -0,0 +1,100 @@
+import json
+from typing import Callable, Dict, Tuple, Union
+
+# The fastest JSON backend installed, orjson is optional
+try:
+    import orjson
+
+    loads: Callable = orjson.loads
+    backend = "orjson"
+except ImportError:
+    loads = json.loads
+    backend = "json"
+
+# C scanner of the stdlib decoder, it decodes the JSON value starting at an
+# index of the string, without the checks json.loads makes on the whole text
+_scan_once = json.JSONDecoder().scan_once
+
+
+class MessageRouter:
+    """
+    Dispatch table of the websocket messages, keyed by stream name.
+
+    The connectors add a route (handler and its arguments, e.g. the symbol)
+    when they subscribe to a stream. The stream name is read from the raw
+    frame first, so the frames without a route (subscription replies, streams
+    being removed...) are never decoded. The handler gets the payload only,
+    and with the stdlib backend only the payload is decoded.
+
+    key: message field holding the stream name (Binance "stream", Kucoin
+    "topic"). payload: message field passed to the handler. loads replaces
+    the JSON backend, it decodes whole messages.
+    """
+
+    def __init__(self, key: str, payload: str, loads: Callable = loads):
+        self.key = key
+        self.payload = payload
+        self.loads = loads
+        # orjson decodes the whole message faster than the stdlib decodes the
+        # payload alone
+        self._decode_payload = loads is json.loads
+        self._key_needle = f'"{key}":"'
+        self._payload_needle = f'"{payload}":'
+        # key: stream name, value: (handler, arguments)
+        self._routes: Dict[str, Tuple[Callable, Tuple]] = dict()
+
+    def add(self, stream: str, handler: Callable, *args):
+        self._routes[stream] = (handler, args)
+        return
+
+    def remove(self, stream: str):
+        self._routes.pop(stream, None)
+        return
+
+    def __contains__(self, stream: str) -> bool:
+        return stream in self._routes
+
+    def dispatch(self, msg: Union[str, bytes]) -> bool:
+        """Pass the message payload to its handler, False if it has no route"""
+        if isinstance(msg, bytes):
+            msg = msg.decode()
+        stream = self._peek(msg)
+        if stream is None:
+            # Not a compact frame, look for the stream in the decoded message
+            data = self.loads(msg)
+            if not isinstance(data, dict):
+                return False
+            route = self._routes.get(data.get(self.key))
+            if route is None:
+                return False
+            payload = data[self.payload]
+        else:
+            route = self._routes.get(stream)
+            if route is None:
+                return False
+            payload = self._decode(msg)
+        handler, args = route
+        handler(payload, *args)
+        return True
+
+    def _peek(self, msg: str) -> Union[str, None]:
+        """Stream name of the frame without decoding it"""
+        start = msg.find(self._key_needle)
+        if start == -1:
+            return None
+        start += len(self._key_needle)
+        end = msg.find('"', start)
+        if end == -1 or "\\" in msg[start:end]:
+            return None
+        return msg[start:end]
+
+    def _decode(self, msg: str):
+        if self._decode_payload:
+            start = msg.find(self._payload_needle)
+            if start != -1:
+                try:
+                    return _scan_once(msg, start + len(self._payload_needle))[0]
+                except StopIteration:
+                    # Not a compact frame (e.g. a space after the colon)
+                    pass
+        return self.loads(msg)[self.payload]
@@ -0,0 +1,560 @@
+import itertools
+import json
+import time
+from concurrent.futures import Future
+from functools import partial
+from threading import Condition, Event, Lock, RLock, Thread
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+import websocket
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+def gather(futures: List[Future]) -> Future:
+    """Future resolved once all the futures are, or with the first error."""
+    result = Future()
+    remaining = [len(futures)]
+    lock = Lock()
+
+    def done(future: Future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if result.done():
+            return
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+        elif last:
+            result.set_result(None)
+
+    if not futures:
+        result.set_result(None)
+    for future in futures:
+        future.add_done_callback(done)
+    return result
+
+
+class _Request:
+    __slots__ = ("stream", "subscribe", "futures")
+
+    def __init__(self, stream: str, subscribe: bool, futures: List[Future]):
+        self.stream = stream
+        self.subscribe = subscribe
+        self.futures = futures
+
+
+class WsConnection:
+    """
+    One market data websocket of the manager, with the streams subscribed on
+    it. It runs on its own thread and reconnects until stopped, every
+    (re)connection subscribes to all its streams again.
+
+    The subscribe and unsubscribe requests are queued. A sender thread merges
+    the queued streams into a single message per direction (and per
+    client._ws_batch_key), sends at most one message every send_interval, and
+    resolves the request futures when the exchange replies to the message id.
+    """
+
+    def __init__(self, manager: "WsManager", index: int):
+        self.manager = manager
+        self.client = manager.client
+        self.index = index
+        self.streams: Dict[str, None] = dict()
+        # Messages received since the last rebalance check
+        self.messages = 0
+        self._ws: Union[websocket.WebSocketApp, None] = None
+        self._connected = Event()
+        self._running = False
+        self._condition = Condition()
+        self._queue: List[_Request] = []
+        # key: message id, value: (requests sent, reply deadline)
+        self._inflight: Dict[str, Tuple[List[_Request], float]] = dict()
+        self._next_send = 0.0
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        Thread(target=self._send_loop, daemon=True).start()
+        self._start()
+        return
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            requests = self._take_all()
+            self._condition.notify()
+        # Closing the connection drops its subscriptions
+        self._resolve([r for r in requests if not r.subscribe])
+        error = ConnectionError(f"Websocket {self.index} closed")
+        self._resolve([r for r in requests if r.subscribe], error)
+        self._close()
+        return
+
+    def request(self, streams: List[str], subscribe: bool) -> Future:
+        """Queue the streams, the future is resolved by the exchange reply"""
+        futures = [Future() for _ in streams]
+        with self._condition:
+            for stream, future in zip(streams, futures):
+                self._queue.append(_Request(stream, subscribe, [future]))
+            self._condition.notify()
+        return gather(futures)
+
+    # ########################### Transport ##########################
+    def _start(self):
+        Thread(target=self._run, daemon=True).start()
+        return
+
+    def _close(self):
+        if self._ws is not None:
+            self._ws.close()
+        return
+
+    def _send(self, msg: str):
+        try:
+            self._ws.send(msg)
+        except websocket.WebSocketException as e:
+            self.client.add_log(f"Websocket {self.index} send: {e}", "warning")
+        return
+
+    def _run(self):
+        while self._running:
+            try:
+                self._ws = websocket.WebSocketApp(
+                    url=self.client._ws_endpoint(),
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self.client._on_error,
+                )
+                if not self._running:
+                    # Stopped while the url was requested
+                    break
+                self._ws.run_forever(ping_interval=20)
+            except Exception as e:
+                msg = f"{self.client.exchange} websocket {self.index} error: {e}"
+                self.client.add_log(msg, "warning")
+            self._connected.clear()
+            if self._running:
+                self.client.add_log(f"Websocket {self.index} disconnect", "info")
+                time.sleep(3)
+        return
+
+    def _on_open(self, ws):
+        self.client.add_log(f"Websocket {self.index} connected", "info")
+        self.manager._resubscribe(self)
+        self._connected.set()
+        with self._condition:
+            self._condition.notify()
+        return
+
+    def _on_message(self, ws, msg: str):
+        self.messages += 1
+        # Only the messages without a route can be replies
+        if not self.client._on_message(ws, msg) and self._inflight:
+            self._on_reply(msg)
+        return
+
+    # ########################### Requests ##########################
+    def _resubscribe(self):
+        """
+        After a (re)connection, subscribe to all the streams again. The
+        requests waiting for a reply are answered by the new subscriptions.
+        """
+        with self._condition:
+            requests = self._take_all()
+            waiting: Dict[str, List[Future]] = dict()
+            resolved = []
+            for request in requests:
+                if request.subscribe and request.stream in self.streams:
+                    waiting.setdefault(request.stream, []).extend(request.futures)
+                else:
+                    # Nothing to unsubscribe on the new connection
+                    resolved.append(request)
+            self._queue = [
+                _Request(stream, True, waiting.get(stream, []))
+                for stream in self.streams
+            ]
+            self._next_send = 0.0
+            self._condition.notify()
+        self._resolve(resolved)
+        return
+
+    def _take_all(self) -> List[_Request]:
+        requests = [r for sent, _ in self._inflight.values() for r in sent]
+        requests += self._queue
+        self._inflight.clear()
+        self._queue = []
+        return requests
+
+    def _next_batch(self) -> List[_Request]:
+        """Queued requests of the first direction and batch key, in order"""
+        first = self._queue[0]
+        key = self.client._ws_batch_key(first.stream)
+        batch, rest, blocked = [], [], set()
+        for request in self._queue:
+            if (
+                len(batch) < self.manager.batch
+                and request.subscribe == first.subscribe
+                and request.stream not in blocked
+                and self.client._ws_batch_key(request.stream) == key
+            ):
+                batch.append(request)
+            else:
+                # The later requests of this stream keep their order
+                blocked.add(request.stream)
+                rest.append(request)
+        self._queue = rest
+        return batch
+
+    def _send_loop(self):
+        while True:
+            expired = []
+            with self._condition:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                for request_id, (sent, deadline) in list(self._inflight.items()):
+                    if deadline <= now:
+                        self._inflight.pop(request_id)
+                        expired += sent
+                msg = None
+                if self._queue and self.is_connected and now >= self._next_send:
+                    batch = self._next_batch()
+                    request_id = str(next(self.manager._ids))
+                    streams = [request.stream for request in batch]
+                    msg = self.client._ws_request(
+                        streams, batch[0].subscribe, request_id
+                    )
+                    deadline = now + self.manager.reply_timeout
+                    self._inflight[request_id] = (batch, deadline)
+                    self._next_send = now + self.manager.send_interval
+                    # Sent while holding the lock, so the messages keep the
+                    # order of the queue
+                    self._send(msg)
+                elif not expired:
+                    waits = [deadline for _, deadline in self._inflight.values()]
+                    if self._queue and self.is_connected:
+                        waits.append(self._next_send)
+                    wait = min(waits, default=now + 1) - now
+                    self._condition.wait(max(wait, 0.001))
+            if expired:
+                error = TimeoutError(f"No reply from websocket {self.index}")
+                self.client.add_log(f"{error} for {len(expired)} streams", "warning")
+                self._resolve(expired, error)
+
+    def _on_reply(self, msg: str):
+        try:
+            reply = self.client._ws_reply(json.loads(msg))
+        except ValueError:
+            return
+        if reply is None:
+            return
+        request_id, error = reply
+        with self._condition:
+            sent, _ = self._inflight.pop(str(request_id), (None, None))
+            self._condition.notify()
+        if sent is None:
+            return
+        if error is not None:
+            self.client.add_log(f"Websocket {self.index} request: {error}", "error")
+            self._resolve(sent, RuntimeError(error))
+        else:
+            self._resolve(sent)
+        return
+
+    def _resolve(self, requests: List[_Request], error: Exception = None):
+        # Never called with a lock held, the callbacks may use the manager
+        for request in requests:
+            for future in request.futures:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+        return
+
+
+class WsManager:
+    """
+    Shards the market data streams of a client over several websocket
+    connections, so no connection goes over the exchange limits.
+
+    A new stream goes to the least loaded connection with room for it, and a
+    connection is opened when all of them are full. Every few seconds the
+    connections receiving more than max_rate messages per second move half of
+    their streams to a quieter (or new) connection. The streams are removed
+    from the old connection once the new one confirmed them, so no message is
+    lost. All the connections pass their messages to client._on_message.
+
+    subscribe and unsubscribe return a Future resolved when the exchange
+    confirmed every stream (TimeoutError or RuntimeError otherwise).
+
+    The exchange specific parts are in the client: _ws_endpoint (url of a new
+    connection), _ws_request (subscribe/unsubscribe message), _ws_reply (id of
+    the replied message) and _ws_batch_key (streams sent together).
+    """
+
+    def __init__(
+        self,
+        client: "CryptoExchange",
+        max_streams: int,
+        send_interval: float,
+        max_rate: float = 500,
+        max_connections: int = 20,
+        batch: int = 100,
+        reply_timeout: float = 10,
+        check_interval: float = 10,
+        connection_class=WsConnection,
+    ):
+        self.client = client
+        self.max_streams = max_streams
+        # Seconds between two messages sent on a connection
+        self.send_interval = send_interval
+        self.max_rate = max_rate
+        self.max_connections = max_connections
+        # Most streams sent in a single subscribe message
+        self.batch = batch
+        self.reply_timeout = reply_timeout
+        self.check_interval = check_interval
+        self.connection_class = connection_class
+        self.connections: List[WsConnection] = []
+        # key: stream name, value: the connection it is subscribed on
+        self._streams: Dict[str, WsConnection] = dict()
+        self._rates: Dict[WsConnection, float] = dict()
+        self._ids = itertools.count(1)
+        self._counter = itertools.count()
+        self._lock = RLock()
+        self._stopped = Event()
+        self._running = False
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._stopped.clear()
+            for connection in self.connections:
+                connection.start()
+        Thread(target=self._monitor, daemon=True).start()
+        return
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._stopped.set()
+            for connection in self.connections:
+                connection.stop()
+        return
+
+    # ########################### Streams ##########################
+    def subscribe(self, *streams: str) -> Future:
+        with self._lock:
+            added: Dict[WsConnection, List[str]] = dict()
+            for stream in streams:
+                if stream in self._streams:
+                    continue
+                connection = self._pick()
+                connection.streams[stream] = None
+                self._streams[stream] = connection
+                added.setdefault(connection, []).append(stream)
+            return gather(
+                [
+                    connection.request(new_streams, subscribe=True)
+                    for connection, new_streams in added.items()
+                ]
+            )
+
+    def unsubscribe(self, *streams: str) -> Future:
+        with self._lock:
+            removed: Dict[WsConnection, List[str]] = dict()
+            for stream in streams:
+                connection = self._streams.pop(stream, None)
+                if connection is None:
+                    continue
+                connection.streams.pop(stream)
+                removed.setdefault(connection, []).append(stream)
+            futures = []
+            for connection, old_streams in removed.items():
+                futures.append(connection.request(old_streams, subscribe=False))
+                if not connection.streams:
+                    # Closing the connection drops its subscriptions
+                    self._close(connection)
+            return gather(futures)
+
+    def __contains__(self, stream: str) -> bool:
+        return stream in self._streams
+
+    def stats(self) -> List[Dict]:
+        """Streams and message rate of each connection."""
+        with self._lock:
+            return [
+                {
+                    "connection": connection.index,
+                    "connected": connection.is_connected,
+                    "streams": len(connection.streams),
+                    "rate": round(self._rates.get(connection, 0.0), 1),
+                }
+                for connection in self.connections
+            ]
+
+    def _pick(self) -> WsConnection:
+        """Least loaded connection with room for a stream, else a new one"""
+        candidates = [
+            c
+            for c in self.connections
+            if len(c.streams) < self.max_streams
+            and self._rates.get(c, 0.0) < self.max_rate
+        ]
+        if candidates:
+            return min(
+                candidates, key=lambda c: (self._rates.get(c, 0.0), len(c.streams))
+            )
+        if len(self.connections) >= self.max_connections:
+            # Over the rate, but still under the exchange stream limit
+            candidates = [
+                c for c in self.connections if len(c.streams) < self.max_streams
+            ]
+            if not candidates:
+                raise RuntimeError(
+                    f"{self.client.exchange} websocket streams limit reached"
+                )
+            return min(candidates, key=lambda c: len(c.streams))
+        return self._open()
+
+    def _open(self) -> WsConnection:
+        connection = self.connection_class(self, next(self._counter))
+        self.connections.append(connection)
+        if self._running:
+            connection.start()
+        return connection
+
+    def _close(self, connection: WsConnection):
+        connection.stop()
+        self.connections.remove(connection)
+        self._rates.pop(connection, None)
+        return
+
+    def _resubscribe(self, connection: WsConnection):
+        with self._lock:
+            connection._resubscribe()
+        return
+
+    # ########################### Rebalance ##########################
+    def _monitor(self):
+        last = time.monotonic()
+        while not self._stopped.wait(self.check_interval):
+            now = time.monotonic()
+            self.rebalance(now - last)
+            last = now
+        return
+
+    def rebalance(self, elapsed: float):
+        """Move streams away from the connections receiving too many messages"""
+        with self._lock:
+            for connection in self.connections:
+                self._rates[connection] = connection.messages / elapsed
+                connection.messages = 0
+            saturated = [
+                c
+                for c in self.connections
+                if self._rates[c] > self.max_rate and len(c.streams) > 1
+            ]
+            for connection in saturated:
+                streams = list(connection.streams)
+                moved = streams[len(streams) // 2 :]
+                rate = self._rates[connection]
+                # The moved streams are assumed to carry their share of the rate
+                self._rates[connection] = rate * (1 - len(moved) / len(streams))
+                target = self._target(len(moved), connection)
+                if target is None:
+                    self.client.add_log(
+                        f"Websocket {connection.index} is saturated "
+                        f"({rate:.0f} msg/s) and no connection is left",
+                        "warning",
+                    )
+                    continue
+                share = rate * len(moved) / len(streams)
+                self._rates[target] = self._rates.get(target, 0.0) + share
+                for stream in moved:
+                    connection.streams.pop(stream)
+                    target.streams[stream] = None
+                    self._streams[stream] = target
+                future = target.request(moved, subscribe=True)
+                future.add_done_callback(
+                    partial(self._moved, connection, target, moved, share)
+                )
+                msg = (
+                    f"Websocket {connection.index} at {rate:.0f} msg/s, "
+                    f"{len(moved)} streams moved to websocket {target.index}"
+                )
+                self.client.add_log(msg, "info")
+        return
+
+    def _moved(
+        self,
+        source: WsConnection,
+        target: WsConnection,
+        streams: List[str],
+        share: float,
+        future: Future,
+    ):
+        """Unsubscribe the moved streams from their previous connection"""
+        if future.exception() is not None:
+            msg = (
+                f"Websocket {source.index} keeps {len(streams)} moved streams: "
+                f"{future.exception()}"
+            )
+            self.client.add_log(msg, "warning")
+            self._move_back(source, target, streams, share)
+            return
+        with self._lock:
+            streams = [s for s in streams if s not in source.streams]
+            if streams and source in self.connections:
+                source.request(streams, subscribe=False)
+        return
+
+    def _move_back(
+        self,
+        source: WsConnection,
+        target: WsConnection,
+        streams: List[str],
+        share: float,
+    ):
+        """The target did not subscribe, the streams are still on the source"""
+        with self._lock:
+            if source not in self.connections:
+                return
+            self._rates[source] = self._rates.get(source, 0.0) + share
+            if target in self._rates:
+                self._rates[target] = max(self._rates[target] - share, 0.0)
+            # Unsubscribed meanwhile, from the target
+            removed = [s for s in streams if s not in self._streams]
+            for stream in streams:
+                if self._streams.get(stream) is target:
+                    target.streams.pop(stream, None)
+                    source.streams[stream] = None
+                    self._streams[stream] = source
+            if removed:
+                source.request(removed, subscribe=False)
+        return
+
+    def _target(self, n_streams: int, source: WsConnection):
+        candidates = [
+            c
+            for c in self.connections
+            if c is not source
+            and len(c.streams) + n_streams <= self.max_streams
+            and self._rates.get(c, 0.0) < self.max_rate / 2
+        ]
+        if candidates:
+            return min(candidates, key=lambda c: self._rates.get(c, 0.0))
+        if len(self.connections) < self.max_connections:
+            return self._open()
+        return None
@@ -0,0 +1,161 @@
+from typing import List, Union
+
+import numpy as np
+
+from Moduls.data_modul import CandleStick
+
+
+class CandleStore:
+    """
+    Fixed-capacity OHLCV store backed by contiguous NumPy columns.
+
+    Every column is allocated twice its capacity and each candle is written
+    to both halves (a mirrored ring buffer). The latest `capacity` candles
+    are then always a contiguous slice of the buffer, so appending is O(1)
+    and the columns can be returned as views without copying. Once the
+    store is full, appending a candle evicts the oldest one.
+    """
+
+    columns = ("timestamp", "open", "close", "high", "low", "volume")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = {
+            name: np.empty(
+                2 * capacity, dtype=np.int64 if name == "timestamp" else np.float64
+            )
+            for name in self.columns
+        }
+        # Position where the next candle will be written
+        self._head = 0
+        self._size = 0
+        # Number of candles appended since the store was created
+        self.total = 0
+        # Increased on every change, used to know when derived data is stale
+        self.version = 0
+
+    @classmethod
+    def from_candles(
+        cls, candles: Union[List[CandleStick], np.ndarray], capacity: int
+    ):
+        """Create a store from CandleSticks or a CANDLE_DTYPE structured array"""
+        store = cls(max(capacity, len(candles)))
+        if isinstance(candles, np.ndarray):
+            columns = {name: candles[name] for name in cls.columns}
+        else:
+            columns = {
+                name: np.array([getattr(candle, name) for candle in candles])
+                for name in cls.columns
+            }
+        store.extend(**columns)
+        return store
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Zero-copy view of a column, ordered from the oldest candle."""
+        end = self._head + self.capacity
+        return self._data[name][end - self._size : end]
+
+    def append(self, candle: CandleStick):
+        self._write(self._head, candle)
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+        self.version += 1
+        return
+
+    def update_last(self, candle: CandleStick):
+        """Overwrite the last candle in place (intra-candle update)."""
+        self._write((self._head - 1) % self.capacity, candle)
+        self.version += 1
+        return
+
+    def fill_gap(self, count: int, timeframe: int):
+        """Append `count` empty candles after the last one in one pass."""
+        last_timestamp = self["timestamp"][-1]
+        # Only the candles that fit in the store are written
+        offsets = np.arange(max(count - self.capacity, 0), count) + 1
+        nan = np.full(len(offsets), np.nan)
+        self.extend(
+            timestamp=last_timestamp + offsets * timeframe,
+            open=nan,
+            close=nan,
+            high=nan,
+            low=nan,
+            volume=np.zeros(len(offsets)),
+        )
+        self.total += count - len(offsets)
+        return
+
+    def extend(self, **columns: np.ndarray):
+        """Append many candles at once. Takes one array per column."""
+        count = len(columns["timestamp"])
+        keep = min(count, self.capacity)
+        positions = (self._head + np.arange(keep)) % self.capacity
+        for name in self.columns:
+            values = np.asarray(columns[name])[count - keep :]
+            self._data[name][positions] = values
+            self._data[name][positions + self.capacity] = values
+        self._head = (self._head + keep) % self.capacity
+        self._size = min(self._size + keep, self.capacity)
+        self.total += count
+        self.version += 1
+        return
+
+    def resize(self, capacity: int):
+        """Change the capacity, keeping the latest candles that still fit."""
+        columns = {name: self[name].copy() for name in self.columns}
+        total, version = self.total, self.version
+        self.__init__(capacity)
+        self.extend(**columns)
+        self.total, self.version = total, version + 1
+        return
+
+    def merge(self, candles: np.ndarray):
+        """
+        Add CANDLE_DTYPE candles (oldest first) from the last one on. The
+        candle with the last timestamp overwrites it, the older ones are
+        skipped.
+        """
+        if self._size:
+            last_timestamp = self["timestamp"][-1]
+            candles = candles[candles["timestamp"] >= last_timestamp]
+            if len(candles) and candles["timestamp"][0] == last_timestamp:
+                position = (self._head - 1) % self.capacity
+                for name in self.columns:
+                    self._data[name][position] = candles[name][0]
+                    self._data[name][position + self.capacity] = candles[name][0]
+                self.version += 1
+                candles = candles[1:]
+        if len(candles):
+            self.extend(**{name: candles[name] for name in self.columns})
+        return
+
+    def __getstate__(self):
+        """Only the kept candles are pickled, not the mirrored buffers"""
+        return {
+            "capacity": self.capacity,
+            "columns": {name: self[name].copy() for name in self.columns},
+            "total": self.total,
+            "version": self.version,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["capacity"])
+        self.extend(**state["columns"])
+        self.total, self.version = state["total"], state["version"]
+        return
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: self[name] for name in self.columns})
+
+    def _write(self, position: int, candle: CandleStick):
+        for name in self.columns:
+            value = getattr(candle, name)
+            self._data[name][position] = value
+            self._data[name][position + self.capacity] = value
+        return
@@ -0,0 +1,138 @@
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+from Moduls.candle_store import CandleStore
+from Moduls.data_modul import CandleStick
+from Moduls.indicators import EWM, MACD, RSI, SAR
+
+# Indicator name: (constructor, candle columns it is fed with)
+INDICATORS = {
+    "ema": (lambda span: EWM(span=span), ("close",)),
+    "macd": (MACD, ("close",)),
+    "rsi": (RSI, ("close",)),
+    "sar": (SAR, ("high", "low", "close")),
+}
+
+
+class ChannelCache:
+    """
+    Candles and streaming indicators of one websocket channel (symbol_interval),
+    shared by all the strategies running on it.
+
+    Indicators are keyed by their name and parameters, so strategies asking
+    for the same indicator get the same object and it is calculated once.
+    Each indicator is reference counted by the strategies using it and
+    dropped when the last one leaves.
+    """
+
+    def __init__(self, key: str, candles: CandleStore, timeframe: int):
+        self.key = key
+        self.candles = candles
+        self.timeframe = timeframe
+        self._last_candle: CandleStick = None
+        self._last_status: str = None
+        self._indicators: Dict[Tuple, object] = dict()
+        # Number of candles each indicator was fed with, and the store
+        # version it was last synced at
+        self._streamed: Dict[Tuple, int] = dict()
+        self._synced: Dict[Tuple, int] = dict()
+        # key: strategy_key, value: keys of the indicators it uses
+        self._subscribers: Dict[str, Set[Tuple]] = dict()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, owner: str):
+        self._subscribers.setdefault(owner, set())
+        return
+
+    def unsubscribe(self, owner: str) -> bool:
+        """Release the owner indicators. Return True if nobody is left."""
+        keys = self._subscribers.pop(owner, set())
+        still_used = set().union(*self._subscribers.values())
+        for key in keys - still_used:
+            self._indicators.pop(key)
+            self._streamed.pop(key)
+            self._synced.pop(key)
+        return len(self._subscribers) == 0
+
+    def indicator(self, owner: str, name: str, *params):
+        """Get (or create) a shared streaming indicator for the owner."""
+        key = (name, *params)
+        if key not in self._indicators:
+            factory, columns = INDICATORS[name]
+            indicator = factory(*params)
+            indicator.compute(*[self.candles[column] for column in columns])
+            self._indicators[key] = indicator
+            self._streamed[key] = self.candles.total
+            self._synced[key] = self.candles.version
+        self._subscribers[owner].add(key)
+        return self._indicators[key]
+
+    def update(self, new_candle: CandleStick) -> str:
+        """
+        Add the candle to the store. Strategies of the same channel receive
+        the same candle object, so only the first of them updates the store.
+        """
+        if new_candle is self._last_candle:
+            return self._last_status
+        self._last_candle = new_candle
+        last_timestamp = self.candles["timestamp"][-1]
+        # Check if the last trade belongs to the last candle
+        if new_candle.timestamp == last_timestamp:
+            self.candles.update_last(new_candle)
+            self._last_status = "Same candle"
+            return self._last_status
+        # Account for missing candles
+        missing_candles = int(
+            (new_candle.timestamp - last_timestamp) / self.timeframe - 1
+        )
+        # If there are any missing candles, create them
+        if missing_candles > 0:
+            self.candles.fill_gap(missing_candles, self.timeframe)
+        self.candles.append(new_candle)
+        self._last_status = "New candle"
+        return self._last_status
+
+    def backfill(self, candles: np.ndarray) -> bool:
+        """
+        Add the candles closed since the last one (CANDLE_DTYPE, oldest
+        first), e.g. the ones missed while the bot was down. The indicators
+        are fed with them on their next sync. Return False if the candles do
+        not join the last one, the channel has to be loaded again.
+        """
+        last_timestamp = self.candles["timestamp"][-1]
+        candles = candles[candles["timestamp"] >= last_timestamp]
+        if len(candles) == 0:
+            return False
+        if candles["timestamp"][0] > last_timestamp + self.timeframe:
+            return False
+        self.candles.merge(candles)
+        self._last_candle = None
+        return True
+
+    def sync(self, owner: str):
+        """Feed the owner indicators with the candles they have not seen."""
+        for key in self._subscribers[owner]:
+            if self._synced[key] != self.candles.version:
+                self._sync_indicator(key)
+        return
+
+    def _sync_indicator(self, key: Tuple):
+        """
+        The last seen candle is updated again first, because it may have
+        changed before the next candle was opened.
+        """
+        indicator = self._indicators[key]
+        columns = INDICATORS[key[0]][1]
+        streamed = self._streamed[key]
+        # Index of the first candle still kept in the store
+        first = self.candles.total - len(self.candles)
+        start = max(streamed - 1, first)
+        rows = zip(*[self.candles[name][start - first :].tolist() for name in columns])
+        for i, row in enumerate(rows, start):
+            indicator.update(*row, new_bar=i >= streamed)
+        self._streamed[key] = self.candles.total
+        self._synced[key] = self.candles.version
+        return
@@ -0,0 +1,213 @@
+import atexit
+import os
+import pickle
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Dict, List, Union
+from urllib.parse import urlparse
+
+from Moduls.channel_cache import ChannelCache
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+    from strategies import Strategy
+
+
+class CheckpointService:
+    """
+    Checkpoints of the running strategies of a client, pickled together with
+    their channels (candles and indicators state) in one file per exchange
+    and host. A checkpoint is written every `interval` seconds and when the
+    process exits.
+
+    restore starts the checkpointed strategies again, with their orders (the
+    open positions), their pending sell orders and PnL. The channels continue
+    from their checkpointed state: only the candles closed while the bot was
+    down are downloaded, and the indicators are fed with them alone. So the
+    restore time does not depend on the history length. A channel down for
+    longer than its retention window is loaded again from the history.
+    """
+
+    cache_dir = os.getenv("CHECKPOINT_DIR", "checkpoints")
+    interval = float(os.getenv("CHECKPOINT_INTERVAL", 60))
+    # Checkpoints of another format version are not restored
+    version = 2
+
+    def __init__(self, client: "CryptoExchange"):
+        self.client = client
+        self._running = False
+        self._stopped = Event()
+
+    def start(self):
+        """Write a checkpoint periodically, and when the process exits"""
+        if self._running or self.interval <= 0:
+            return
+        self._running = True
+        self._stopped.clear()
+        atexit.register(self.stop)
+        Thread(target=self._run, daemon=True).start()
+        return
+
+    def stop(self):
+        """Stop the periodic checkpoints and write the last one"""
+        if not self._running:
+            return
+        self._running = False
+        self._stopped.set()
+        atexit.unregister(self.stop)
+        self.save(timeout=10)
+        return
+
+    def save(self, timeout: Union[float, None] = None) -> bool:
+        """
+        Write a checkpoint. The state is pickled on the feed worker, between
+        two strategy events, so it is consistent.
+        """
+        future = Future()
+
+        def snapshot():
+            try:
+                future.set_result(self._snapshot())
+            except Exception as e:
+                future.set_exception(e)
+
+        self.client.feed.call(("checkpoint",), snapshot)
+        try:
+            data = future.result(timeout)
+        except Exception as e:
+            self.client.add_log(f"Checkpoint failed: {e!r}", "warning")
+            return False
+        path = self._path()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            msg = f"Could not write the checkpoint {path}: {e}"
+            self.client.add_log(msg, "warning")
+            return False
+        return True
+
+    def restore(self, workers: int = 8) -> List["Strategy"]:
+        """Start the strategies of the last checkpoint, if any"""
+        from strategies import Strategy
+
+        checkpoint = self._read()
+        if checkpoint is None:
+            return []
+        Strategy.new_strategy_id = max(
+            Strategy.new_strategy_id, checkpoint["next_strategy_id"]
+        )
+        strategies: List[Strategy] = []
+        for strategy in checkpoint["strategies"]:
+            strategy.client = self.client
+            try:
+                strategy.contract = self.client.contracts[strategy.symbol]
+            except KeyError:
+                msg = f"{strategy.strategy_key} is not restored, unknown symbol"
+                self.client.add_log(msg, "error")
+                strategy.channel.unsubscribe(strategy.strategy_key)
+                continue
+            strategies.append(strategy)
+        # The first strategy of each channel downloads its missed candles
+        channels: Dict[str, Strategy] = dict()
+        for strategy in strategies:
+            channels.setdefault(strategy.ws_channel_key, strategy)
+        with ThreadPoolExecutor(workers) as executor:
+            joined = executor.map(self._backfill, channels.values())
+            for strategy, channel_joined in zip(channels.values(), joined):
+                if channel_joined:
+                    self.client.channels[strategy.ws_channel_key] = strategy.channel
+            for strategy in strategies:
+                executor.submit(self._refresh_order, strategy)
+                executor.submit(self._refresh_order, strategy, "sell_order")
+        restored = []
+        for strategy in strategies:
+            try:
+                # Reuses the restored channel and its indicators
+                strategy.start()
+                restored.append(strategy)
+            except Exception as e:
+                msg = f"{strategy.strategy_key} is not restored: {e!r}"
+                self.client.add_log(msg, "error")
+                continue
+            # The restored sell_order keeps the strategy from selling again,
+            # the sell is followed again until it is closed
+            if strategy.sell_order is not None:
+                self.client._track_sell(strategy, strategy.sell_order)
+            order = getattr(strategy, "order", None)
+            if order is not None and order.status in self.client._open_order_statuses:
+                self.client._track_buy(strategy, order)
+        age = time.time() - checkpoint["time"]
+        msg = f"{len(restored)} strategies restored from a {age:.0f}s old checkpoint"
+        self.client.add_log(msg, "info")
+        return restored
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.save(timeout=self.interval)
+        return
+
+    def _snapshot(self) -> bytes:
+        from strategies import Strategy
+
+        checkpoint = {
+            "version": self.version,
+            "time": time.time(),
+            "next_strategy_id": Strategy.new_strategy_id,
+            # The strategies keep references to their channel and indicators,
+            # pickled once for all
+            "strategies": list(self.client.state.snapshot().strategies.values()),
+        }
+        return pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _backfill(self, strategy: "Strategy") -> bool:
+        channel: ChannelCache = strategy.channel
+        try:
+            candles = self.client.history.since(
+                strategy.contract,
+                strategy._channel_interval,
+                int(channel.candles["timestamp"][-1]),
+                channel.candles.capacity,
+            )
+        except Exception as e:
+            msg = f"Could not backfill {strategy.ws_channel_key}: {e!r}"
+            self.client.add_log(msg, "warning")
+            return False
+        return channel.backfill(candles)
+
+    def _refresh_order(self, strategy: "Strategy", attribute: str = "order"):
+        """The order may have been filled or canceled while the bot was down"""
+        order = getattr(strategy, attribute, None)
+        if order is None or order.status not in self.client._open_order_statuses:
+            return
+        try:
+            setattr(strategy, attribute, self.client.order_status(order) or order)
+        except Exception as e:
+            msg = f"Could not refresh the {strategy.strategy_key} order: {e!r}"
+            self.client.add_log(msg, "warning")
+        return
+
+    def _path(self) -> str:
+        host = urlparse(self.client._base_url).hostname
+        return os.path.join(self.cache_dir, f"{self.client.exchange}_{host}.pkl")
+
+    def _read(self) -> Union[Dict, None]:
+        try:
+            with open(self._path(), "rb") as file:
+                checkpoint = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.client.add_log(f"Could not read the checkpoint: {e!r}", "warning")
+            return None
+        is_current = isinstance(checkpoint, dict) and (
+            checkpoint.get("version") == self.version
+        )
+        if not is_current:
+            self.client.add_log("The checkpoint format is outdated", "warning")
+            return None
+        return checkpoint
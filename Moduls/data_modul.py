@@ -2,104 +2,205 @@ from typing import Dict, List, Union
 
 from math import log10
 
+import numpy as np
+
+# Structured array layout of the candles, same columns as the CandleStore
+CANDLE_DTYPE = np.dtype(
+    [
+        ("timestamp", np.int64),
+        ("open", np.float64),
+        ("close", np.float64),
+        ("high", np.float64),
+        ("low", np.float64),
+        ("volume", np.float64),
+    ]
+)
+# Position of timestamp, open, close, high, low and volume in a kline
+_KLINE_COLUMNS = {"Binance": [0, 1, 4, 2, 3, 5], "Kucoin": [0, 1, 2, 3, 4, 5]}
+
+
+def candles_to_array(response: List[List], exchange: str) -> np.ndarray:
+    """
+    Convert a klines JSON array into a CANDLE_DTYPE structured array, without
+    creating a CandleStick for each candle.
+    """
+    candles = np.empty(len(response), dtype=CANDLE_DTYPE)
+    for name, column in zip(CANDLE_DTYPE.names, _KLINE_COLUMNS[exchange]):
+        candles[name] = np.fromiter(
+            (kline[column] for kline in response),
+            dtype=CANDLE_DTYPE[name],
+            count=len(response),
+        )
+    return candles
+
 
 class Contract:
+    __slots__ = (
+        "exchange",
+        "symbol",
+        "baseAsset",
+        "quoteAsset",
+        "pricePrecision",
+        "quantityPrecision",
+        "minQuantity",
+        "maxQuantity",
+        "stepSize",
+    )
+
     def __init__(self, response: Dict, exchange: str):
         self.exchange = exchange
-        if exchange == "Binance":
-            self.symbol: str = response["symbol"]  # BTCUSDT
-            self.baseAsset: str = response["baseAsset"]  # BTC
-            self.quoteAsset: str = response["quoteAsset"]  # USDT
-            self.pricePrecision = int(response["quotePrecision"])
-            self.quantityPrecision = int(response["baseAssetPrecision"])
-            for filter_ in response["filters"]:
-                if filter_["filterType"] != "LOT_SIZE":
-                    continue
-                self.minQuantity = float(filter_["minQty"])
-                self.maxQuantity = float(filter_["maxQty"])
-                self.stepSize = float(filter_["stepSize"])
-        elif exchange == "Kucoin":
-            self.symbol: str = response["symbol"]  # BTCUSDT
-            self.baseAsset: str = response["baseCurrency"]  # BTC
-            self.quoteAsset: str = response["quoteCurrency"]  # USDT
-            self.pricePrecision = -log10(float(response["quoteIncrement"]))
-            self.quantityPrecision = -log10(float(response["baseIncrement"]))
-            self.minQuantity = float(response["baseMinSize"])
+        self._parsers[exchange](self, response)
+
+    def update(self, response: Dict):
+        """Refresh the contract from a newer exchange record"""
+        self._parsers[self.exchange](self, response)
+        return
+
+    def _from_binance(self, response: Dict):
+        self.symbol: str = response["symbol"]  # BTCUSDT
+        self.baseAsset: str = response["baseAsset"]  # BTC
+        self.quoteAsset: str = response["quoteAsset"]  # USDT
+        self.pricePrecision = int(response["quotePrecision"])
+        self.quantityPrecision = int(response["baseAssetPrecision"])
+        for filter_ in response["filters"]:
+            if filter_["filterType"] != "LOT_SIZE":
+                continue
+            self.minQuantity = float(filter_["minQty"])
+            self.maxQuantity = float(filter_["maxQty"])
+            self.stepSize = float(filter_["stepSize"])
+
+    def _from_kucoin(self, response: Dict):
+        self.symbol: str = response["symbol"]  # BTCUSDT
+        self.baseAsset: str = response["baseCurrency"]  # BTC
+        self.quoteAsset: str = response["quoteCurrency"]  # USDT
+        self.pricePrecision = -log10(float(response["quoteIncrement"]))
+        self.quantityPrecision = -log10(float(response["baseIncrement"]))
+        self.minQuantity = float(response["baseMinSize"])
+
+    _parsers = {"Binance": _from_binance, "Kucoin": _from_kucoin}
 
 
 class CandleStick:
+    __slots__ = (
+        "exchange",
+        "is_closed",
+        "timestamp",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+    )
+
     def __init__(self, response: List, exchange: str):
         self.exchange = exchange
-        if exchange == "Binance":
-            self.timestamp = int(response[0])  # Open timestamp
-            self.open = float(response[1])
-            self.high = float(response[2])
-            self.low = float(response[3])
-            self.close = float(response[4])
-            self.volume = float(response[5])
-        elif exchange == "Kucoin":
-            self.timestamp = int(response[0])
-            self.open = float(response[1])
-            self.close = float(response[2])
-            self.high = float(response[3])
-            self.low = float(response[4])
-            self.volume = float(response[5])
+        # Set by the websocket when the exchange tells if the candle is closed
+        self.is_closed: Union[bool, None] = None
+        self._parsers[exchange](self, response)
+
+    def _from_binance(self, response: List):
+        self.timestamp = int(response[0])  # Open timestamp
+        self.open = float(response[1])
+        self.high = float(response[2])
+        self.low = float(response[3])
+        self.close = float(response[4])
+        self.volume = float(response[5])
+
+    def _from_kucoin(self, response: List):
+        self.timestamp = int(response[0])
+        self.open = float(response[1])
+        self.close = float(response[2])
+        self.high = float(response[3])
+        self.low = float(response[4])
+        self.volume = float(response[5])
+
+    _parsers = {"Binance": _from_binance, "Kucoin": _from_kucoin}
 
 
 class Price:
+    __slots__ = ("exchange", "symbol", "bid", "ask")
+
     def __init__(self, response: Dict[str, str], exchange: str):
         self.exchange = exchange
-        if exchange == "Binance":
-            self.exchange = "Binance"
-            self.symbol = response["symbol"]
-            self.bid = float(response["bidPrice"])
-            self.ask = float(response["askPrice"])
-        elif exchange == "Kucoin":
-            self.exchange = "Kucoin"
-            self.symbol: str
-            self.bid = float(response["bestBid"])
-            self.ask = float(response["bestAsk"])
+        self._parsers[exchange](self, response)
+
+    def _from_binance(self, response: Dict[str, str]):
+        self.symbol = response["symbol"]
+        self.bid = float(response["bidPrice"])
+        self.ask = float(response["askPrice"])
+
+    def _from_kucoin(self, response: Dict[str, str]):
+        # Kucoin does not send the symbol, it is set by the connector
+        self.bid = float(response["bestBid"])
+        self.ask = float(response["bestAsk"])
+
+    _parsers = {"Binance": _from_binance, "Kucoin": _from_kucoin}
 
 
 class Order:
+    __slots__ = (
+        "exchange",
+        "symbol",
+        "orderId",
+        "time",
+        "price",
+        "quantity",
+        "status",
+        "type",
+        "side",
+        "is_closed",
+    )
+
     def __init__(self, response, exchange, price: Union[float, None] = None):
         self.exchange = exchange
-        if exchange == "Binance":
-            self.symbol: str = response["symbol"]
-            self.orderId = str(response["orderId"])
-            self.time: int = response["workingTime"]
-            self.price = float(response["price"]) if price is None else price
-            self.quantity = float(response["origQty"])
-            self.status: str = response["status"]
-            self.type: str = response["type"]
-            self.side: str = response["side"]
-        elif exchange == "Kucoin":
-            self.orderId = str(response.get("id"))
-            self.time = int(response.get("createdAt"))
-            self.symbol: str = response.get("symbol")
-            self.price = float(response.get("price")) if price is None else price
-            self.quantity = float(response.get("size"))
-            self.is_closed: bool = not response.get("isActive")
-            self.type: str = response.get("type")
-            self.side: str = response.get("side")
-            if response.get("size") == response.get("dealSize"):
-                self.status = "filled"
-            elif response.get("dealSize") == "0" and response.get("isActive"):
-                self.status = "new"
-            elif response.get("cancelExist"):
-                self.status = "canceled"
-            else:
-                self.status = "partially_filled"
+        self._parsers[exchange](self, response, price)
+
+    def _from_binance(self, response, price: Union[float, None]):
+        self.symbol: str = response["symbol"]
+        self.orderId = str(response["orderId"])
+        self.time: int = response["workingTime"]
+        self.price = float(response["price"]) if price is None else price
+        self.quantity = float(response["origQty"])
+        self.status: str = response["status"]
+        self.type: str = response["type"]
+        self.side: str = response["side"]
+
+    def _from_kucoin(self, response, price: Union[float, None]):
+        self.orderId = str(response.get("id"))
+        self.time = int(response.get("createdAt"))
+        self.symbol: str = response.get("symbol")
+        self.price = float(response.get("price")) if price is None else price
+        self.quantity = float(response.get("size"))
+        self.is_closed: bool = not response.get("isActive")
+        self.type: str = response.get("type")
+        self.side: str = response.get("side")
+        if response.get("size") == response.get("dealSize"):
+            self.status = "filled"
+        elif response.get("dealSize") == "0" and response.get("isActive"):
+            self.status = "new"
+        elif response.get("cancelExist"):
+            self.status = "canceled"
+        else:
+            self.status = "partially_filled"
+
+    _parsers = {"Binance": _from_binance, "Kucoin": _from_kucoin}
 
 
 class Balance:
+    __slots__ = ("exchange", "asset", "availableBalance", "totalBalance")
+
     def __init__(self, response: Dict, exchange):
         self.exchange = exchange
-        if exchange == "Binance":
-            self.asset: str = response["asset"]  # USDT
-            self.availableBalance = float(response["free"])
-            self.totalBalance = float(response["free"]) + float(response["locked"])
-        elif exchange == "Kucoin":
-            self.asset: str = response["currency"]  # USDT
-            self.availableBalance = float(response["balance"])
-            self.totalBalance = float(response["free"]) + float(response["locked"])
+        self._parsers[exchange](self, response)
+
+    def _from_binance(self, response: Dict):
+        self.asset: str = response["asset"]  # USDT
+        self.availableBalance = float(response["free"])
+        self.totalBalance = float(response["free"]) + float(response["locked"])
+
+    def _from_kucoin(self, response: Dict):
+        self.asset: str = response["currency"]  # USDT
+        self.availableBalance = float(response["balance"])
+        self.totalBalance = float(response["free"]) + float(response["locked"])
+
+    _parsers = {"Binance": _from_binance, "Kucoin": _from_kucoin}
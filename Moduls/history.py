@@ -0,0 +1,137 @@
+import os
+import time
+from threading import Lock
+from typing import TYPE_CHECKING, Dict
+
+import numpy as np
+
+from Moduls.data_modul import CANDLE_DTYPE, Contract
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+class HistoryService:
+    """
+    Historical candles of a client, cached on disk per exchange, symbol and
+    interval as a CANDLE_DTYPE `.npy` file.
+
+    The exchanges return a limited number of candles per request, so deeper
+    histories are downloaded page by page, going backwards in time. Once a
+    channel is cached, the next loads read the file (memory-mapped) and only
+    download the candles that closed since it was written.
+    """
+
+    cache_dir = os.getenv("HISTORY_CACHE_DIR", "history_cache")
+
+    def __init__(self, client: "CryptoExchange"):
+        self.client = client
+        self._locks: Dict[str, Lock] = dict()
+        self._locks_lock = Lock()
+
+    def load(
+        self, contract: Contract, interval: str, timeframe: int, depth: int
+    ) -> np.ndarray:
+        """
+        Return (at least) the last `depth` candles of the channel, oldest
+        first. timeframe is the candle duration in milliseconds.
+        """
+        path = self._path(contract.symbol, interval)
+        with self._lock(path):
+            cached = self._read(path)
+            # Candle timestamps are in the exchange time unit
+            unit = self.client._kline_time_unit
+            now = int(time.time() * 1000) // unit
+            step = timeframe // unit
+            tail = np.empty(0, dtype=CANDLE_DTYPE)
+            # The last cached candle may have been still open, so it is
+            # downloaded again with the candles that followed it
+            if len(cached) == 0 or now >= cached["timestamp"][-1] + step:
+                stop = cached["timestamp"][-1] if len(cached) else None
+                tail = self._fetch(contract, interval, None, stop, depth)
+                # The cache is too old to be joined with the new candles
+                if len(tail) and stop is not None and tail["timestamp"][0] > stop:
+                    cached = np.empty(0, dtype=CANDLE_DTYPE)
+            candles = self._merge(cached, tail)
+            # The cache is shorter than the requested depth
+            head = np.empty(0, dtype=CANDLE_DTYPE)
+            if 0 < len(candles) < depth:
+                end = candles["timestamp"][0] - 1
+                missing = depth - len(candles)
+                head = self._fetch(contract, interval, end, None, missing)
+            if len(tail) == 0 and len(head) == 0:
+                return cached[-depth:]
+            candles = self._merge(head, candles)
+            self._write(path, candles)
+        return candles[-depth:]
+
+    def since(
+        self, contract: Contract, interval: str, timestamp: int, limit: int
+    ) -> np.ndarray:
+        """
+        The candles from `timestamp` to now, oldest first, without the disk
+        cache. At most the last `limit` of them are downloaded.
+        """
+        candles = self._fetch(contract, interval, None, timestamp, limit)
+        return candles[candles["timestamp"] >= timestamp]
+
+    def _fetch(self, contract: Contract, interval: str, end, stop, count):
+        """
+        Download pages backwards from `end` (the latest candle if None) until
+        the `stop` timestamp is reached or `count` candles were downloaded.
+        """
+        pages = []
+        downloaded = 0
+        while True:
+            page = self.client.get_candlestick(contract, interval, True, end)
+            if page is None or len(page) == 0:
+                break
+            pages.append(page)
+            downloaded += len(page)
+            first = page["timestamp"][0]
+            if stop is not None and first <= stop:
+                break
+            if count is not None and downloaded >= count:
+                break
+            end = first - 1
+        if not pages:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.concatenate(pages[::-1])
+
+    @staticmethod
+    def _merge(*arrays: np.ndarray) -> np.ndarray:
+        """Sort the candles, the latest download wins for duplicated ones."""
+        candles = np.concatenate(arrays)
+        # np.unique keeps the first occurrence, so search the reversed array
+        reverse = candles[::-1]
+        _, index = np.unique(reverse["timestamp"], return_index=True)
+        return reverse[index]
+
+    def _path(self, symbol: str, interval: str) -> str:
+        name = f"{self.client.exchange}_{symbol}_{interval}.npy"
+        return os.path.join(self.cache_dir, name)
+
+    def _lock(self, path: str) -> Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, Lock())
+
+    def _read(self, path: str) -> np.ndarray:
+        try:
+            candles = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        if candles.dtype != CANDLE_DTYPE:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return candles
+
+    def _write(self, path: str, candles: np.ndarray):
+        """Write to a temporary file first, so readers never see a partial file"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                np.save(file, candles)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.client.add_log(f"Could not cache the candles {path}: {e}", "warning")
+        return
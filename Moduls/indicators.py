@@ -0,0 +1,297 @@
+from math import isnan
+from typing import Tuple, Union
+
+import numpy as np
+
+
+class EWM:
+    """
+    Running equivalent of pandas `Series.ewm(...).mean()` (adjust=True,
+    ignore_na=False). Each update costs O(1).
+
+    The state is split into the committed part (all the closed candles)
+    and the value of the currently open candle. Updating the open candle
+    recalculates the output from the committed state, so intra-candle
+    updates roll back instead of accumulating.
+    """
+
+    def __init__(
+        self,
+        span: Union[int, None] = None,
+        alpha: Union[float, None] = None,
+        min_periods: int = 0,
+    ):
+        if alpha is None:
+            alpha = 2 / (span + 1)
+        self._decay = 1 - alpha
+        self._min_periods = max(min_periods, 1)
+        # Committed state (closed candles only)
+        self._num = 0.0
+        self._den = 0.0
+        self._nobs = 0
+        self._committed_value = np.nan
+        # Value of the open candle, None before the first update
+        self._pending: Union[float, None] = None
+        self.value = np.nan
+
+    def update(self, x: float, new_bar: bool = True) -> float:
+        if new_bar and self._pending is not None:
+            self._num, self._den, self._nobs = self._fold(self._pending)
+            self._committed_value = self.value
+        self._pending = x
+        num, den, nobs = self._fold(x)
+        if nobs < self._min_periods:
+            self.value = np.nan
+        elif den == 0:
+            # alpha=1 and a missing candle, pandas carries the last value
+            self.value = self._committed_value
+        else:
+            self.value = num / den
+        return self.value
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        """Feed a whole history, the last value is left as the open candle"""
+        return np.array([self.update(x) for x in np.asarray(values).tolist()])
+
+    def _fold(self, x: float) -> Tuple[float, float, int]:
+        num = self._num * self._decay
+        den = self._den * self._decay
+        nobs = self._nobs
+        if not isnan(x):
+            num += x
+            den += 1
+            nobs += 1
+        return num, den, nobs
+
+
+class MACD:
+    """Running MACD line and the distance between MACD and its signal line."""
+
+    def __init__(self, fast: int, slow: int, signal: int):
+        self._fast = EWM(span=fast)
+        self._slow = EWM(span=slow)
+        self._signal = EWM(span=signal)
+        self.value: Tuple[float, float] = (np.nan, np.nan)
+
+    def update(self, close: float, new_bar: bool = True) -> Tuple[float, float]:
+        macd = self._fast.update(close, new_bar) - self._slow.update(close, new_bar)
+        signal = self._signal.update(macd, new_bar)
+        self.value = (macd, macd - signal)
+        return self.value
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return np.array([self.update(x) for x in np.asarray(close).tolist()])
+
+
+class RSI:
+    """
+    Running RSI. method="ema" smooths gains and losses with span=period
+    (the pandas implementation used by TechnicalStrategies), while
+    method="wilder" uses Wilder's smoothing (alpha=1/period).
+    """
+
+    def __init__(self, period: int, method: str = "ema"):
+        if method == "ema":
+            kwargs = {"span": period}
+        elif method == "wilder":
+            kwargs = {"alpha": 1 / period}
+        else:
+            raise ValueError(f"Unknown RSI method {method}")
+        self._gain = EWM(min_periods=period, **kwargs)
+        self._loss = EWM(min_periods=period, **kwargs)
+        # Close of the last closed candle and of the open candle
+        self._prev_close = np.nan
+        self._pending: Union[float, None] = None
+        self.value = np.nan
+
+    def update(self, close: float, new_bar: bool = True) -> float:
+        if new_bar and self._pending is not None:
+            self._prev_close = self._pending
+        self._pending = close
+        # Missing candles give NaN difference, which counts as no change
+        diff = close - self._prev_close
+        gain = self._gain.update(diff if diff > 0 else 0.0, new_bar)
+        loss = self._loss.update(-diff if diff < 0 else 0.0, new_bar)
+        rsi = 100 if loss == 0 else 100 - (100 / (1 + (gain / loss)))
+        self.value = np.round(rsi, 2)
+        return self.value
+
+    def compute(self, close: np.ndarray) -> np.ndarray:
+        return np.array([self.update(x) for x in np.asarray(close).tolist()])
+
+
+# SAR state: (number of candles, up trend, sar, extreme point, acceleration
+# factor, low and high of the two previous candles, previous close)
+_SAR_START = (0, False, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan)
+
+
+def _sar_step(state: Tuple, high, low, close, af_init, af_max, af_step) -> Tuple:
+    """Parabolic SAR after one more candle. Missing candles are skipped."""
+    if isnan(high) or isnan(low) or isnan(close):
+        return state
+    count, up_trend, sar, ep, af, low1, low2, high1, high2, prev_close = state
+    if count == 0:
+        return (1, False, np.nan, np.nan, af_init, np.nan, low, np.nan, high, close)
+    if count == 1:
+        # The trend is seeded from the direction of the first two candles
+        up_trend = close > prev_close
+        ep = high if up_trend else low
+        sar = low2 if up_trend else high2
+        sar += af_init * (ep - sar)
+        return (2, up_trend, sar, ep, af_init, low2, low, high2, high, close)
+
+    reversal = False
+    if up_trend and sar > low:
+        reversal, up_trend = True, False
+        sar, ep, af = max(ep, high), low, af_step
+    elif not up_trend and sar < high:
+        reversal, up_trend = True, True
+        sar, ep, af = min(ep, low), high, af_step
+    if not reversal:
+        if up_trend and high > ep:
+            ep = high
+            af = min(af_max, af + af_step)
+        elif not up_trend and low < ep:
+            ep = low
+            af = min(af_max, af + af_step)
+    # SAR can't move into the range of the two previous candles
+    if up_trend:
+        sar = min(sar, low1, low2)
+    else:
+        sar = max(sar, high1, high2)
+    sar += af * (ep - sar)
+    return (count + 1, up_trend, sar, ep, af, low2, low, high2, high, close)
+
+
+def sar_series(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    af=0.02,
+    af_max=0.2,
+    af_step=0.02,
+    state: Tuple = _SAR_START,
+):
+    """
+    Parabolic SAR over a whole history in one pass. Returns the sar, extreme
+    point, acceleration factor and up trend arrays, and the state after the
+    last candle so the calculation can be continued.
+    """
+    n = len(close)
+    sar, ep, af_ = np.empty(n), np.empty(n), np.empty(n)
+    up_trend = np.zeros(n, dtype=bool)
+    rows = zip(
+        np.asarray(high).tolist(),
+        np.asarray(low).tolist(),
+        np.asarray(close).tolist(),
+    )
+    for i, (h, l, c) in enumerate(rows):
+        state = _sar_step(state, h, l, c, af, af_max, af_step)
+        up_trend[i], sar[i], ep[i], af_[i] = state[1:5]
+    return sar, ep, af_, up_trend, state
+
+
+class SAR:
+    """
+    Streaming Parabolic SAR. `compute` processes the loaded history in one
+    pass, then `update` continues from the saved state in O(1) per message,
+    so live values are the same as the ones of `sar_series`. Like the other
+    streaming indicators, updates of the open candle roll back to the state
+    of the last closed candle.
+    """
+
+    def __init__(self, af=0.02, af_max=0.2, af_step=0.02):
+        self._params = (af, af_max, af_step)
+        self._committed = _SAR_START
+        self._pending: Union[Tuple[float, float, float], None] = None
+        self._publish(self._committed)
+
+    def update(self, high: float, low: float, close: float, new_bar: bool = True):
+        if new_bar and self._pending is not None:
+            self._committed = _sar_step(self._committed, *self._pending, *self._params)
+        self._pending = (high, low, close)
+        self._publish(_sar_step(self._committed, high, low, close, *self._params))
+        return self.value
+
+    def compute(self, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+        """Process a whole history, the last candle is left open"""
+        *series, self._committed = sar_series(
+            high[:-1], low[:-1], close[:-1], *self._params, state=self._committed
+        )
+        self._pending = None
+        self.update(high[-1], low[-1], close[-1])
+        last = (self.value, self.ep, self.af, self.up_trend)
+        return [np.append(values, value) for values, value in zip(series, last)]
+
+    def _publish(self, state: Tuple):
+        self.up_trend, self.value, self.ep, self.af = state[1:5]
+
+
+def ewm_mean(
+    values: np.ndarray,
+    span: Union[int, None] = None,
+    alpha: Union[float, None] = None,
+    min_periods: int = 0,
+) -> np.ndarray:
+    """
+    Vectorized equivalent of pandas `Series.ewm(...).mean()` (adjust=True,
+    ignore_na=False) for a whole array.
+
+    The recurrence num[t] = decay * num[t-1] + x[t] is solved with cumulative
+    sums over blocks. Inside a block the terms are rescaled by decay**-k,
+    and the block length is chosen so the rescaling cannot overflow.
+    """
+    if alpha is None:
+        alpha = 2 / (span + 1)
+    decay = 1 - alpha
+    values = np.asarray(values, dtype=np.float64)
+    observed = ~np.isnan(values)
+    x = np.where(observed, values, 0.0)
+    mask = observed.astype(np.float64)
+    if decay == 0:
+        # Only the last observation has weight, missing values carry it
+        last_observed = np.maximum.accumulate(
+            np.where(observed, np.arange(len(x)), 0)
+        )
+        out = values[last_observed]
+    else:
+        num = np.empty_like(x)
+        den = np.empty_like(x)
+        block = max(int(200 / -np.log(decay)), 1)
+        powers = decay ** np.arange(min(block, len(x)))
+        num_carry = den_carry = 0.0
+        for start in range(0, len(x), block):
+            end = min(start + block, len(x))
+            pw = powers[: end - start]
+            num_carry = decay * num_carry + np.cumsum(x[start:end] / pw)
+            den_carry = decay * den_carry + np.cumsum(mask[start:end] / pw)
+            num[start:end] = pw * num_carry
+            den[start:end] = pw * den_carry
+            num_carry, den_carry = num[end - 1], den[end - 1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = num / den
+    nobs = np.cumsum(observed)
+    out[nobs < max(min_periods, 1)] = np.nan
+    return out
+
+
+def macd_series(
+    close: np.ndarray, fast: int, slow: int, signal: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    macd = ewm_mean(close, span=fast) - ewm_mean(close, span=slow)
+    return macd, macd - ewm_mean(macd, span=signal)
+
+
+def rsi_series(close: np.ndarray, period: int, method: str = "ema") -> np.ndarray:
+    if method == "ema":
+        kwargs = {"span": period}
+    elif method == "wilder":
+        kwargs = {"alpha": 1 / period}
+    else:
+        raise ValueError(f"Unknown RSI method {method}")
+    diff = np.diff(close, prepend=np.nan)
+    gain = ewm_mean(np.where(diff > 0, diff, 0.0), min_periods=period, **kwargs)
+    loss = ewm_mean(np.where(diff < 0, -diff, 0.0), min_periods=period, **kwargs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.where(loss == 0, 100.0, 100 - (100 / (1 + (gain / loss))))
+    return np.round(rsi, 2)
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+from collections.abc import Mapping
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple, Union
+from urllib.parse import urlparse
+
+from Moduls.data_modul import Contract
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+
+class ContractBook(Mapping):
+    """
+    Contracts of an exchange by symbol, parsed from the exchange records the
+    first time a symbol is used. symbols() is the cheap index of the names,
+    e.g. for the dashboard dropdowns.
+
+    The book can be read before the metadata is loaded: iterating it sees no
+    symbol yet, while looking up a symbol waits for the load (load_timeout).
+    A refresh updates the parsed contracts in place, so the contracts held
+    by the strategies and the subscriptions stay the same objects.
+    """
+
+    load_timeout = 60
+
+    def __init__(self, exchange: str):
+        self.exchange = exchange
+        # key: symbol, value: exchange record of the contract
+        self._records: Dict[str, Dict] = dict()
+        self._contracts: Dict[str, Contract] = dict()
+        self._symbols: List[str] = []
+        self._loaded = Event()
+        # Increased on every update, used to refresh the dashboard options
+        self.version = 0
+
+    def update(self, records: Dict[str, Dict]):
+        for symbol, contract in list(self._contracts.items()):
+            if symbol in records:
+                contract.update(records[symbol])
+        self._records = records
+        self._symbols = sorted(records)
+        self.version += 1
+        self._loaded.set()
+        return
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    def wait(self, timeout: Union[float, None] = None) -> bool:
+        """Block until the metadata is loaded, False on timeout"""
+        return self._loaded.wait(timeout)
+
+    def symbols(self) -> List[str]:
+        return self._symbols
+
+    def __getitem__(self, symbol: str) -> Contract:
+        contract = self._contracts.get(symbol)
+        if contract is not None:
+            return contract
+        if not self._loaded.is_set():
+            self._loaded.wait(self.load_timeout)
+        record = self._records.get(symbol)
+        if record is None:
+            raise KeyError(symbol)
+        # Two threads may parse the same record, only the first one is kept
+        return self._contracts.setdefault(symbol, Contract(record, self.exchange))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+
+class MetadataService:
+    """
+    Exchange metadata of a client, cached on disk per exchange and host as a
+    JSON file and downloaded again once older than `ttl` seconds.
+
+    The connectors return the metadata with _get_metadata, trimmed to the
+    fields they use: {"symbols": {symbol: record}, ...}. load returns the
+    ContractBook right away, from the cache when there is one. A missing or
+    stale cache is downloaded on a background thread, so the startup never
+    waits for the exchange.
+    """
+
+    cache_dir = os.getenv("METADATA_CACHE_DIR", "metadata_cache")
+    ttl = float(os.getenv("METADATA_TTL", 24 * 3600))
+
+    def __init__(self, client: "CryptoExchange"):
+        self.client = client
+        self.contracts = ContractBook(client.exchange)
+        self._refreshing = Lock()
+
+    def load(self) -> ContractBook:
+        metadata, age = self._read()
+        if metadata is not None:
+            self._apply(metadata)
+        if metadata is None or age > self.ttl:
+            Thread(target=self.refresh, daemon=True).start()
+        return self.contracts
+
+    def refresh(self):
+        """Download the metadata, unless a download is already running"""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            metadata = self.client._get_metadata()
+            if metadata is None:
+                msg = f"Could not download the {self.client.exchange} contracts"
+                self.client.add_log(msg, "warning")
+                return
+            self._apply(metadata)
+            self._write(metadata)
+        finally:
+            self._refreshing.release()
+        return
+
+    def _apply(self, metadata: Dict):
+        self.client._on_metadata(metadata)
+        self.contracts.update(metadata["symbols"])
+        return
+
+    def _path(self) -> str:
+        host = urlparse(self.client._base_url).hostname
+        return os.path.join(self.cache_dir, f"{self.client.exchange}_{host}.json")
+
+    def _read(self) -> Tuple[Union[Dict, None], float]:
+        """The cached metadata and its age in seconds"""
+        try:
+            with open(self._path(), "rb") as file:
+                cached = json.load(file)
+            return cached["metadata"], time.time() - cached["time"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _write(self, metadata: Dict):
+        """Write to a temporary file first, so readers never see a partial file"""
+        path = self._path()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump({"time": time.time(), "metadata": metadata}, file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.client.add_log(f"Could not cache the metadata {path}: {e}", "warning")
+        return
@@ -0,0 +1,78 @@
+from threading import Lock
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, Mapping, NamedTuple
+
+if TYPE_CHECKING:
+    from strategies import Strategy
+    from Moduls.data_modul import Balance, Price
+
+_EMPTY = MappingProxyType(dict())
+
+
+class Snapshot(NamedTuple):
+    """
+    State of a client at one version. The mappings are read-only and never
+    change once published, so they can be iterated from any thread. The
+    objects they hold are the live ones: the prices bid/ask and the
+    strategies uPnL and order keep moving between two versions.
+    """
+
+    version: int
+    prices: Mapping[str, "Price"]
+    strategies: Mapping[str, "Strategy"]
+    balance: Mapping[str, "Balance"]
+
+
+class SnapshotStore:
+    """
+    State of a client published for the readers of other threads, e.g. the
+    dashboard callbacks.
+
+    The engine publishes copy-on-write: every change copies the changed
+    section and replaces the whole snapshot, under a lock shared by the
+    writers only. A reader takes the current snapshot with snapshot(), a
+    single reference read, and can skip its work when the version did not
+    change since its last read.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = Snapshot(0, _EMPTY, _EMPTY, _EMPTY)
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def publish(self, **sections: Mapping):
+        """Replace whole sections, e.g. publish(balance=balance)"""
+        changes = {
+            name: MappingProxyType(dict(section)) for name, section in sections.items()
+        }
+        with self._lock:
+            self._replace(changes)
+        return
+
+    def set(self, section: str, key: Any, value: Any):
+        with self._lock:
+            items: Dict = dict(getattr(self._snapshot, section))
+            items[key] = value
+            self._replace({section: MappingProxyType(items)})
+        return
+
+    def discard(self, section: str, key: Any):
+        with self._lock:
+            items: Mapping = getattr(self._snapshot, section)
+            if key not in items:
+                return
+            items = dict(items)
+            del items[key]
+            self._replace({section: MappingProxyType(items)})
+        return
+
+    def _replace(self, changes: Dict[str, Mapping]):
+        snapshot = self._snapshot
+        self._snapshot = snapshot._replace(version=snapshot.version + 1, **changes)
+        return
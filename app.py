@@ -1,19 +1,20 @@
+import signal
+import sys
 from typing import TYPE_CHECKING, Dict, List
 
 import dash_bootstrap_components as dbc
 from dash import Dash, Input, Output, State, callback, ctx, dcc, html, no_update
 
-from Connectors.binance_connector import BinanceClient
-
-# from Connectors.kucoin_connector import KucoinClient
 from dashboard.dashboard_ui import (
     bottom_container,
     footer,
+    get_contracts,
     middel_container,
     nav_bar,
     technical_modal,
     upper_container,
 )
+from engine import create_clients, start
 from Moduls.data_modul import Contract
 from strategies import TechnicalStrategies
 
@@ -29,13 +30,19 @@ def get_removed_row(prev_data, data):
 
 
 @callback(
-    Output("websocket-init", "disabled"),
-    Input("websocket-init", "n_intervals"),
-    prevent_initial_call=True,
+    Output("watchlist-select", "options"),
+    Output("strategy-contracts-dropdown", "options"),
+    Output("contracts-version", "data"),
+    Input("update-interval", "n_intervals"),
+    State("contracts-version", "data"),
 )
-def start_websockets(*args):
-    [client.run() for client in clients.values()]
-    return True
+def update_contracts_options(n, version):
+    # The contracts are downloaded in the background on a cold start
+    current = [client.contracts.version for client in clients.values()]
+    if current == version:
+        return no_update, no_update, no_update
+    contracts = get_contracts(clients)
+    return contracts, contracts, current
 
 
 @callback(Output("watchlist-select", "value"), Input("watchlist-select", "value"))
@@ -62,7 +69,7 @@ def update_watchlist_table(prev_data, n, data):
                 "askPrice": price.ask,
             }
             for client in clients.values()
-            for price in client.prices.values()
+            for price in client.state.snapshot().prices.values()
         ]
     elif ctx.triggered_id == "watchlist-table":
         removed_row = get_removed_row(prev_data, data)
@@ -84,9 +91,10 @@ def update_strategy_table(prev_data, n, data):
     if ctx.triggered_id == "uPnl-table":
         removed_row = get_removed_row(prev_data, data)
         client = clients[removed_row["Exchange"]]
-        strategy_id = removed_row["ID"]
-        strategy = client.running_startegies[strategy_id]
-        client = strategy.client
+        strategy = client.state.snapshot().strategies.get(removed_row["ID"])
+        if strategy is None:
+            # Already closed by the engine
+            return data
         client.unsubscribe_channel(channel="candles", strategy=strategy)
         if hasattr(strategy, "order"):
             strategy.order = client.make_order(
@@ -96,6 +104,7 @@ def update_strategy_table(prev_data, n, data):
                 quantity=strategy.order.quantity,
             )
     elif ctx.triggered_id == "update-interval":
+        snapshots = [client.state.snapshot() for client in clients.values()]
         data = [
             {
                 "ID": strategy.strategy_key,
@@ -105,11 +114,15 @@ def update_strategy_table(prev_data, n, data):
                 "Entry Price": (
                     strategy.order.price if hasattr(strategy, "order") else 0
                 ),
-                "Current Price": client.prices[strategy.symbol].bid,
+                "Current Price": (
+                    snapshot.prices[strategy.symbol].bid
+                    if strategy.symbol in snapshot.prices
+                    else None
+                ),
                 "uPnl": f"{strategy.unpnl*100:.2f}%",
             }
-            for client in clients.values()
-            for strategy in client.running_startegies.values()
+            for snapshot in snapshots
+            for strategy in snapshot.strategies.values()
         ]
     return data
 
@@ -210,21 +223,27 @@ def update_log_list(n, logs_list: List):
 
 @callback(
     Output("assets-table", "data"),
+    Output("state-version", "data"),
     Input("update-interval", "n_intervals"),
-    State("assets-table", "data"),
+    State("state-version", "data"),
 )
-def update_assets_table(n, data):
+def update_assets_table(n, version):
+    # The balance is only published again when it is downloaded
+    snapshots = [client.state.snapshot() for client in clients.values()]
+    current = [snapshot.version for snapshot in snapshots]
+    if current == version:
+        return no_update, no_update
     data = [
         {
             "Asset": asset,
             "Available Balance": balance.availableBalance,
             "Total Balance": balance.totalBalance,
         }
-        for client in clients.values()
-        for asset, balance in client.balance.items()
+        for snapshot in snapshots
+        for asset, balance in snapshot.balance.items()
         if asset in ["BTC", "USDT"]
     ]
-    return data
+    return data, current
 
 
 def main(clients: Dict[str, "CryptoExchange"]):
@@ -247,7 +266,8 @@ def main(clients: Dict[str, "CryptoExchange"]):
                     footer(),
                     technical_modal(),
                     dcc.Interval(id="update-interval", interval=1000),
-                    dcc.Interval(id="websocket-init", max_intervals=1),
+                    dcc.Store(id="contracts-version"),
+                    dcc.Store(id="state-version"),
                 ],
                 className="body-container",
             ),
@@ -257,9 +277,10 @@ def main(clients: Dict[str, "CryptoExchange"]):
 
 
 if __name__ == "__main__":
-    clients = {
-        "Binance": BinanceClient(is_test=False),
-        #    'Kucoin': KucoinClient(is_spot=True, is_test=False),
-    }
+    # engine.py runs the same without the dashboard
+    clients = create_clients()
+    start(clients)
+    # Exit normally on SIGTERM, so the last checkpoint is written
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
     app = main(clients)
     app.run(debug=True, use_reloader=False)
@@ -0,0 +1,375 @@
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from math import prod
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+from Moduls.candle_store import CandleStore
+from Moduls.data_modul import CandleStick
+from Moduls.indicators import ewm_mean, rsi_series, sar_series
+
+DECISIONS = {1: "buy or hodl", -1: "sell or don't enter", 0: None}
+
+Trade = namedtuple(
+    "Trade",
+    "entry_time, exit_time, entry_price, exit_price, quantity, pnl, reason",
+)
+
+
+class BacktestResult:
+    def __init__(
+        self,
+        timestamp: np.ndarray,
+        confidence: np.ndarray,
+        decisions: np.ndarray,
+        equity: np.ndarray,
+        trades: List[Trade],
+        capital: float,
+    ):
+        self.timestamp = timestamp
+        self.confidence = confidence
+        """1 for "buy or hodl", -1 for "sell or don't enter" and 0 otherwise"""
+        self.decisions = decisions
+        self.equity = equity
+        self.trades = trades
+        self.capital = capital
+
+    @property
+    def pnl(self) -> float:
+        return self.equity[-1] - self.capital
+
+    @property
+    def max_drawdown(self) -> float:
+        """Largest drop from a previous equity peak, as a fraction of the peak"""
+        peaks = np.maximum.accumulate(self.equity)
+        return float(np.max(1 - self.equity / peaks))
+
+
+class TechnicalBacktest:
+    """
+    Offline replay of TechnicalStrategies over historical candles.
+
+    The first `warmup` candles play the role of the history loaded when the
+    strategy starts, every later candle is treated as one closed kline
+    message. The strategy doesn't trade during the warmup. Indicators and
+    the confidence score are calculated for all the candles at once, then
+    the orders of `_process_dicision` and `_check_tp_sl` are simulated.
+    Unlike the live strategy, the simulated strategy may enter again after
+    closing its position.
+
+    The candles are expected to be continuous (no missing intervals), like
+    the ones returned by `get_candlestick`.
+    """
+
+    def __init__(
+        self,
+        candles: Union[List[CandleStick], CandleStore, Dict[str, np.ndarray]],
+        tp: float,
+        sl: float,
+        buy_pct: float,
+        ema: Dict[str, int],
+        macd: Dict[str, int],
+        af=0.02,
+        af_max=0.2,
+        af_step=0.02,
+        rsi=12,
+        warmup=500,
+        capital=1000.0,
+        fee=0.0,
+        cache: Union[Dict, None] = None,
+    ):
+        if isinstance(candles, list):
+            candles = CandleStore.from_candles(candles, len(candles))
+        self.timestamp = np.asarray(candles["timestamp"])
+        self.open = np.asarray(candles["open"], dtype=np.float64)
+        self.close = np.asarray(candles["close"], dtype=np.float64)
+        self.high = np.asarray(candles["high"], dtype=np.float64)
+        self.low = np.asarray(candles["low"], dtype=np.float64)
+        self.tp = tp
+        self.sl = sl
+        self.buy_pct = buy_pct
+        self.ema = ema
+        self.macd = macd
+        self.rsi = rsi
+        self._af = af
+        self._af_max = af_max
+        self._af_step = af_step
+        self.warmup = min(max(warmup, 2), len(self.close))
+        self.capital = capital
+        self.fee = fee
+        # Indicators keyed by their parameters, can be shared between
+        # backtests of the same candles
+        self._cache = dict() if cache is None else cache
+
+    def run(self) -> BacktestResult:
+        confidence = self.confidence()
+        decisions = np.where(confidence >= 6, 1, np.where(confidence < 3, -1, 0))
+        decisions[: self.warmup] = 0
+        equity, trades = self._simulate(decisions)
+        return BacktestResult(
+            self.timestamp, confidence, decisions, equity, trades, self.capital
+        )
+
+    # ########################### Indicators ##########################
+    def confidence(self) -> np.ndarray:
+        ema_check = self._cached(
+            ("ema_check", self.ema["fast"], self.ema["slow"]),
+            lambda: 3 * (self._EMA(self.ema["fast"]) > self._EMA(self.ema["slow"])),
+        )
+        macd_check = self._cached(
+            ("macd_check", self.macd["fast"], self.macd["slow"], self.macd["signal"]),
+            lambda: self._macd_eval(*self._MACD()),
+        )
+        rsi_check = self._cached(
+            ("rsi_check", self.rsi),
+            lambda: self._RSI_eval(rsi_series(self.close, self.rsi)),
+        )
+        sar_check = self._cached(
+            ("sar_check", self._af, self._af_max, self._af_step),
+            lambda: 3 * self.sar_trend(),
+        )
+        return ema_check + macd_check + rsi_check + sar_check
+
+    def _cached(self, key, calculate):
+        if key not in self._cache:
+            self._cache[key] = calculate()
+        return self._cache[key]
+
+    def _EMA(self, window: int) -> np.ndarray:
+        return self._cached(("ema", window), lambda: ewm_mean(self.close, window))
+
+    def _MACD(self):
+        macd = self._EMA(self.macd["fast"]) - self._EMA(self.macd["slow"])
+        return macd, macd - ewm_mean(macd, span=self.macd["signal"])
+
+    def sar_trend(self) -> np.ndarray:
+        """Parabolic SAR trend over the whole history, True for up trend"""
+        *_, up_trend, _ = sar_series(
+            self.high, self.low, self.close, self._af, self._af_max, self._af_step
+        )
+        return up_trend.astype(np.int64)
+
+    @staticmethod
+    def _RSI_eval(rsi: np.ndarray) -> np.ndarray:
+        return np.select(
+            [rsi >= 70, rsi >= 60, rsi >= 50, rsi >= 40, rsi >= 30],
+            [3, 2, 1, 0, -1],
+            -10,
+        )
+
+    @staticmethod
+    def _macd_eval(macd: np.ndarray, macd_signal: np.ndarray) -> np.ndarray:
+        above = macd > macd_signal
+        return np.select(
+            [above & (macd_signal > 0), above & (macd > 0), above, macd_signal < 0],
+            [3, 2, 1, -3],
+            -2,
+        )
+
+    # ########################### Orders ##########################
+    def _simulate(self, decisions: np.ndarray):
+        """
+        Orders are filled at the close of the candle that gave the decision.
+        TP/SL are checked with the high and low of the following candles,
+        the stop loss first when both are reached in the same candle.
+        """
+        close = self.close
+        equity = np.full(len(close), self.capital, dtype=np.float64)
+        trades: List[Trade] = []
+        cash = self.capital
+        quantity = entry_price = entry_time = 0
+        # Only the candles with an order or an open position need a visit
+        active = np.flatnonzero(decisions == 1)
+        i = active[0] if len(active) else len(close)
+        while i < len(close):
+            if quantity:
+                exit_price = reason = None
+                if self.low[i] <= entry_price * (1 - self.sl):
+                    exit_price, reason = entry_price * (1 - self.sl), "sl"
+                elif self.high[i] >= entry_price * (1 + self.tp):
+                    exit_price, reason = entry_price * (1 + self.tp), "tp"
+                elif decisions[i] == -1:
+                    exit_price, reason = close[i], "signal"
+                if reason:
+                    cash += quantity * exit_price * (1 - self.fee)
+                    pnl = quantity * (exit_price - entry_price)
+                    trades.append(
+                        Trade(
+                            entry_time,
+                            self.timestamp[i],
+                            entry_price,
+                            exit_price,
+                            quantity,
+                            pnl,
+                            reason,
+                        )
+                    )
+                    quantity = 0
+            if not quantity and decisions[i] == 1:
+                entry_price = close[i]
+                entry_time = self.timestamp[i]
+                quantity = cash * self.buy_pct / entry_price
+                cash -= quantity * entry_price * (1 + self.fee)
+            equity[i] = cash + quantity * close[i]
+            if quantity:
+                i += 1
+            else:
+                # Jump to the next buying signal, equity is flat until then
+                following = np.searchsorted(active, i, side="right")
+                next_i = active[following] if following < len(active) else len(close)
+                equity[i + 1 : next_i] = cash
+                i = next_i
+        return equity, trades
+
+
+# ########################### Parameter Sweep ##########################
+# Candles and indicators cache of the current sweep worker process
+_sweep_worker = dict()
+
+
+def _init_sweep_worker(shm_name: str, shape, settings: Dict):
+    # Attach to the candles shared by the parent process, nothing is copied
+    shm = shared_memory.SharedMemory(name=shm_name)
+    columns = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _sweep_worker["shm"] = shm
+    _sweep_worker["candles"] = dict(zip(ParameterSweep.columns, columns))
+    _sweep_worker["settings"] = settings
+    _sweep_worker["cache"] = dict()
+
+
+def _run_sweep_point(params: Dict) -> Dict:
+    cache = _sweep_worker["cache"]
+    # Neighbouring combinations share most indicators, but keep memory bounded
+    if len(cache) > ParameterSweep.cache_size:
+        cache.clear()
+    result = TechnicalBacktest(
+        _sweep_worker["candles"],
+        **_sweep_worker["settings"],
+        **ParameterSweep.to_kwargs(params),
+        cache=cache,
+    ).run()
+    return {
+        **params,
+        "pnl": float(result.pnl),
+        "max_drawdown": result.max_drawdown,
+        "trades": len(result.trades),
+    }
+
+
+class ParameterSweep:
+    """
+    Backtest TechnicalStrategies parameters over the same candles on a
+    process pool, and rank them by PnL, then drawdown, then number of trades.
+
+    `grid` maps a parameter name to the values to try; missing parameters use
+    the defaults of the dashboard. All the combinations are evaluated unless
+    `samples` is given, then a random sample of them is taken.
+    """
+
+    columns = ("timestamp", "open", "close", "high", "low")
+    defaults = {
+        "ema_fast": 9,
+        "ema_slow": 25,
+        "macd_fast": 12,
+        "macd_slow": 26,
+        "macd_signal": 9,
+        "rsi": 12,
+        "af": 0.02,
+        "af_max": 0.2,
+        "af_step": 0.02,
+    }
+    # Maximum number of indicators arrays kept by each worker
+    cache_size = 256
+
+    def __init__(
+        self,
+        candles: Union[List[CandleStick], CandleStore, Dict[str, np.ndarray]],
+        grid: Dict[str, List],
+        tp: float,
+        sl: float,
+        buy_pct: float,
+        samples: Union[int, None] = None,
+        seed: Union[int, None] = None,
+        max_workers: Union[int, None] = None,
+        **settings,
+    ):
+        if isinstance(candles, list):
+            candles = CandleStore.from_candles(candles, len(candles))
+        self.candles = candles
+        unknown = set(grid) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters {unknown}")
+        self.grid = {
+            name: list(grid.get(name, [default]))
+            for name, default in self.defaults.items()
+        }
+        self.samples = samples
+        self.seed = seed
+        self.max_workers = max_workers or os.cpu_count()
+        # warmup, capital and fee are forwarded to TechnicalBacktest as well
+        self.settings = dict(tp=tp, sl=sl, buy_pct=buy_pct, **settings)
+
+    @staticmethod
+    def to_kwargs(params: Dict) -> Dict:
+        return {
+            "ema": {"fast": params["ema_fast"], "slow": params["ema_slow"]},
+            "macd": {
+                "fast": params["macd_fast"],
+                "slow": params["macd_slow"],
+                "signal": params["macd_signal"],
+            },
+            "rsi": params["rsi"],
+            "af": params["af"],
+            "af_max": params["af_max"],
+            "af_step": params["af_step"],
+        }
+
+    def combinations(self) -> Iterator[Dict]:
+        names = list(self.grid)
+        values = list(self.grid.values())
+        total = prod(len(v) for v in values)
+        if self.samples is None or self.samples >= total:
+            indices = range(total)
+        else:
+            # Sorted, so that neighbouring combinations share indicators
+            rng = random.Random(self.seed)
+            indices = sorted(rng.sample(range(total), self.samples))
+        for index in indices:
+            params = dict()
+            for name, options in zip(reversed(names), reversed(values)):
+                index, i = divmod(index, len(options))
+                params[name] = options[i]
+            if params["ema_fast"] >= params["ema_slow"]:
+                continue
+            if params["macd_fast"] >= params["macd_slow"]:
+                continue
+            yield {name: params[name] for name in names}
+
+    def run(self) -> List[Dict]:
+        combinations = list(self.combinations())
+        columns = np.stack(
+            [np.asarray(self.candles[name], dtype=np.float64) for name in self.columns]
+        )
+        shm = shared_memory.SharedMemory(create=True, size=columns.nbytes)
+        try:
+            shared = np.ndarray(columns.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = columns
+            del shared
+            chunksize = max(1, len(combinations) // (self.max_workers * 8))
+            with ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_init_sweep_worker,
+                initargs=(shm.name, columns.shape, self.settings),
+            ) as executor:
+                results = list(
+                    executor.map(_run_sweep_point, combinations, chunksize=chunksize)
+                )
+        finally:
+            shm.close()
+            shm.unlink()
+        results.sort(key=lambda r: (-r["pnl"], r["max_drawdown"], -r["trades"]))
+        return results
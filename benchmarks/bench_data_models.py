@@ -0,0 +1,161 @@
+"""
+Construction time and memory of the data models.
+
+Compares the slotted models of Moduls.data_modul with the previous
+dict-based classes, and the bulk klines path (candles_to_array) with
+building one CandleStick per candle.
+
+    python -m benchmarks.bench_data_models
+"""
+import random
+import time
+import tracemalloc
+from math import log10
+
+from Moduls.data_modul import CandleStick, Contract, candles_to_array
+
+
+# ########################### Previous models ##########################
+class DictContract:
+    def __init__(self, response, exchange):
+        self.exchange = exchange
+        if exchange == "Binance":
+            self.symbol = response["symbol"]
+            self.baseAsset = response["baseAsset"]
+            self.quoteAsset = response["quoteAsset"]
+            self.pricePrecision = int(response["quotePrecision"])
+            self.quantityPrecision = int(response["baseAssetPrecision"])
+            for filter_ in response["filters"]:
+                if filter_["filterType"] != "LOT_SIZE":
+                    continue
+                self.minQuantity = float(filter_["minQty"])
+                self.maxQuantity = float(filter_["maxQty"])
+                self.stepSize = float(filter_["stepSize"])
+        elif exchange == "Kucoin":
+            self.symbol = response["symbol"]
+            self.baseAsset = response["baseCurrency"]
+            self.quoteAsset = response["quoteCurrency"]
+            self.pricePrecision = -log10(float(response["quoteIncrement"]))
+            self.quantityPrecision = -log10(float(response["baseIncrement"]))
+            self.minQuantity = float(response["baseMinSize"])
+
+
+class DictCandleStick:
+    def __init__(self, response, exchange):
+        self.exchange = exchange
+        if exchange == "Binance":
+            self.timestamp = int(response[0])
+            self.open = float(response[1])
+            self.high = float(response[2])
+            self.low = float(response[3])
+            self.close = float(response[4])
+            self.volume = float(response[5])
+        elif exchange == "Kucoin":
+            self.timestamp = int(response[0])
+            self.open = float(response[1])
+            self.close = float(response[2])
+            self.high = float(response[3])
+            self.low = float(response[4])
+            self.volume = float(response[5])
+
+
+# ########################### Recorded-like responses ##########################
+def binance_klines(n: int):
+    klines, price, t = [], 30000.0, 1_600_000_000_000
+    for i in range(n):
+        close = price + random.uniform(-50, 50)
+        klines.append(
+            [
+                t + i * 60_000,
+                f"{price:.8f}",
+                f"{max(price, close) + 5:.8f}",
+                f"{min(price, close) - 5:.8f}",
+                f"{close:.8f}",
+                f"{random.uniform(0, 100):.8f}",
+                t + i * 60_000 + 59_999,
+                "1234.5",
+                100,
+                "12.3",
+                "456.7",
+                "0",
+            ]
+        )
+        price = close
+    return klines
+
+
+def binance_symbols(n: int):
+    filters = [
+        {"filterType": "PRICE_FILTER", "minPrice": "0.01", "maxPrice": "1000000"},
+        {
+            "filterType": "LOT_SIZE",
+            "minQty": "0.00001",
+            "maxQty": "9000",
+            "stepSize": "0.00001",
+        },
+        {"filterType": "MIN_NOTIONAL", "minNotional": "10"},
+    ]
+    return [
+        {
+            "symbol": f"SYM{i}USDT",
+            "baseAsset": f"SYM{i}",
+            "quoteAsset": "USDT",
+            "quotePrecision": 8,
+            "baseAssetPrecision": 8,
+            "filters": filters,
+        }
+        for i in range(n)
+    ]
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = build()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return elapsed, memory
+
+
+def report(title, rows):
+    print(title)
+    for name, (elapsed, memory) in rows:
+        print(f"  {name:<24}{elapsed * 1000:>10.1f} ms{memory / 2**20:>10.2f} MiB")
+
+
+def main():
+    random.seed(0)
+    klines = binance_klines(100_000)
+    symbols = binance_symbols(3_000)
+    report(
+        f"{len(klines)} klines",
+        [
+            (
+                "dict CandleStick",
+                measure(lambda: [DictCandleStick(k, "Binance") for k in klines]),
+            ),
+            (
+                "slotted CandleStick",
+                measure(lambda: [CandleStick(k, "Binance") for k in klines]),
+            ),
+            ("candles_to_array", measure(lambda: candles_to_array(klines, "Binance"))),
+        ],
+    )
+    report(
+        f"{len(symbols)} contracts",
+        [
+            (
+                "dict Contract",
+                measure(lambda: [DictContract(s, "Binance") for s in symbols]),
+            ),
+            (
+                "slotted Contract",
+                measure(lambda: [Contract(s, "Binance") for s in symbols]),
+            ),
+        ],
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Staleness of the prices seen by a slow strategy, in milliseconds.
+
+A producer pushes bookTicker frames for 50 symbols at 5,000 frames per
+second into a queue, standing for the socket buffer, and the strategy of a
+symbol takes 1 ms. Compares running the strategies inside the websocket
+callback (previous) with the CoalescingFeed of Connectors.feed. The lag is
+measured from the frame arrival to the strategy run.
+
+    python -m benchmarks.bench_feed
+"""
+import queue
+import statistics
+import time
+from threading import Thread
+from types import SimpleNamespace
+
+from Connectors.feed import CoalescingFeed
+
+N_SYMBOLS = 50
+RATE = 5_000
+DURATION = 2.0
+STRATEGY_COST = 0.001
+
+
+def produce(frames: queue.Queue):
+    interval = 1 / RATE
+    start = time.perf_counter()
+    for i in range(int(RATE * DURATION)):
+        while time.perf_counter() < start + i * interval:
+            pass
+        frames.put((f"SYM{i % N_SYMBOLS}USDT", time.perf_counter()))
+    frames.put(None)
+    return
+
+
+def strategy(lags: list, received: float):
+    time.sleep(STRATEGY_COST)
+    lags.append(time.perf_counter() - received)
+    return
+
+
+def inline(frames: queue.Queue, lags: list):
+    while (frame := frames.get()) is not None:
+        symbol, received = frame
+        strategy(lags, received)
+    return
+
+
+def coalesced(frames: queue.Queue, lags: list):
+    feed = CoalescingFeed(SimpleNamespace(add_log=print))
+    feed.start()
+    while (frame := frames.get()) is not None:
+        symbol, received = frame
+        feed.put(symbol, strategy, lags, received)
+    while feed.stats()["pending_keys"]:
+        time.sleep(0.01)
+    stats = feed.stats()
+    feed.stop()
+    return stats
+
+
+def measure(consumer):
+    frames, lags = queue.Queue(), []
+    producer = Thread(target=produce, args=(frames,))
+    producer.start()
+    stats = consumer(frames, lags)
+    producer.join()
+    lags.sort()
+    return {
+        "runs": len(lags),
+        "median": statistics.median(lags) * 1000,
+        "p99": lags[int(len(lags) * 0.99)] * 1000,
+        "max": lags[-1] * 1000,
+        "dropped": stats["dropped"] if stats else 0,
+    }
+
+
+def main():
+    print(f"{int(RATE * DURATION)} frames, {STRATEGY_COST * 1000:.0f} ms strategy")
+    for name, consumer in [("previous", inline), ("feed", coalesced)]:
+        r = measure(consumer)
+        print(
+            f"  {name:<12}{r['runs']:>8} runs{r['dropped']:>8} dropped"
+            f"  lag median {r['median']:>8.1f} ms  p99 {r['p99']:>8.1f} ms"
+            f"  max {r['max']:>8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-request latency of the REST calls, against a local HTTP server.
+
+Compares a new connection per request (module-level requests.request, as
+the connectors did before) with the pooled keep-alive session, and the
+per-call HMAC keying with copying a precomputed HMAC. Over the internet
+the handshake also includes TLS, so the real gap is larger.
+
+    python -m benchmarks.bench_http_session
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlencode
+
+import requests
+
+from Connectors.crypto_base_class import CryptoExchange
+
+REQUESTS = 500
+SIGNATURES = 100_000
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({"serverTime": int(time.time() * 1000)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        return
+
+
+def per_request(send, url: str) -> float:
+    send(url).raise_for_status()  # warm up
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        send(url).raise_for_status()
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def per_signature(sign) -> float:
+    query = urlencode(
+        {"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", "quantity": 0.001}
+    )
+    start = time.perf_counter()
+    for i in range(SIGNATURES):
+        sign(f"{query}&timestamp={i}")
+    return (time.perf_counter() - start) / SIGNATURES
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/v3/time"
+
+    session = CryptoExchange._create_session(None, pool_size=10)
+    results = {
+        "requests.request": per_request(
+            lambda url: requests.request("GET", url, timeout=(3.05, 10)), url
+        ),
+        "pooled session": per_request(
+            lambda url: session.request("GET", url, timeout=(3.05, 10)), url
+        ),
+    }
+    server.shutdown()
+
+    os.environ.setdefault("BenchAPISecret", "x" * 64)
+
+    def sign_per_call(query: str):
+        return hmac.new(
+            key=os.getenv("BenchAPISecret").encode("utf-8"),
+            msg=query.encode("utf-8"),
+            digestmod=hashlib.sha256,
+        ).hexdigest()
+
+    keyed = hmac.new(os.getenv("BenchAPISecret").encode("utf-8"), None, "sha256")
+
+    def sign_copy(query: str):
+        signature = keyed.copy()
+        signature.update(query.encode("utf-8"))
+        return signature.hexdigest()
+
+    results["sign, key per call"] = per_signature(sign_per_call)
+    results["sign, copy keyed hmac"] = per_signature(sign_copy)
+    for name, seconds in results.items():
+        print(f"{name:<24}{seconds * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Time to get the contracts at startup, in milliseconds.
+
+Compares the previous startup (decode the full exchangeInfo and build a
+Contract for every symbol) with the MetadataService of Moduls.metadata:
+a cold start, which downloads in the background, and a warm start, which
+reads the trimmed cache. The exchangeInfo is shaped like the Binance one,
+3,000 symbols, and the download time is left out. The strategies then use
+20 contracts.
+
+    python -m benchmarks.bench_metadata
+"""
+import json
+import os
+import tempfile
+import time
+
+from Moduls.data_modul import Contract
+from Moduls.metadata import MetadataService
+
+N_SYMBOLS = 3_000
+USED = [f"SYM{i}USDT" for i in range(0, N_SYMBOLS, N_SYMBOLS // 20)]
+
+
+def exchange_info(n: int) -> str:
+    """Binance-like exchangeInfo, with the fields Contract does not read"""
+    filters = [
+        {
+            "filterType": "LOT_SIZE",
+            "minQty": "0.00001",
+            "maxQty": "9000",
+            "stepSize": "0.00001",
+        }
+    ]
+    filters += [
+        {"filterType": f"FILTER_{k}", "min": "0.01", "max": "1000000", "mins": 5}
+        for k in range(8)
+    ]
+    symbols = [
+        {
+            "symbol": f"SYM{i}USDT",
+            "status": "TRADING",
+            "baseAsset": f"SYM{i}",
+            "baseAssetPrecision": 8,
+            "quoteAsset": "USDT",
+            "quotePrecision": 8,
+            "quoteAssetPrecision": 8,
+            "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS_LIMIT"],
+            "icebergAllowed": True,
+            "ocoAllowed": True,
+            "isSpotTradingAllowed": True,
+            "isMarginTradingAllowed": False,
+            "filters": filters,
+            "permissions": [],
+            "permissionSets": [["SPOT", *[f"TRD_GRP_{g:03}" for g in range(40)]]],
+            "defaultSelfTradePreventionMode": "EXPIRE_MAKER",
+            "allowedSelfTradePreventionModes": ["EXPIRE_TAKER", "EXPIRE_MAKER"],
+        }
+        for i in range(n)
+    ]
+    return json.dumps({"rateLimits": [], "symbols": symbols})
+
+
+class Client:
+    """The part of a connector used by the MetadataService."""
+
+    exchange = "Binance"
+    _base_url = "https://api.binance.com/api"
+
+    def __init__(self, info: str):
+        self.info = info
+
+    def _get_metadata(self):
+        # Same trimming as BinanceClient._get_metadata
+        info = json.loads(self.info)
+        symbols = {
+            symbol["symbol"]: {
+                "symbol": symbol["symbol"],
+                "baseAsset": symbol["baseAsset"],
+                "quoteAsset": symbol["quoteAsset"],
+                "quotePrecision": symbol["quotePrecision"],
+                "baseAssetPrecision": symbol["baseAssetPrecision"],
+                "filters": [
+                    filter_
+                    for filter_ in symbol["filters"]
+                    if filter_["filterType"] == "LOT_SIZE"
+                ],
+            }
+            for symbol in info["symbols"]
+        }
+        return {"symbols": symbols, "rateLimits": info["rateLimits"]}
+
+    def _on_metadata(self, metadata):
+        return
+
+    def add_log(self, msg, level):
+        print(msg)
+
+
+def previous(info: str):
+    start = time.perf_counter()
+    contracts = {
+        symbol["symbol"]: Contract(symbol, "Binance")
+        for symbol in json.loads(info)["symbols"]
+    }
+    ready = time.perf_counter() - start
+    [contracts[symbol] for symbol in USED]
+    return ready, time.perf_counter() - start
+
+
+def cached(client: Client):
+    start = time.perf_counter()
+    contracts = MetadataService(client).load()
+    ready = time.perf_counter() - start
+    contracts.wait()
+    [contracts[symbol] for symbol in USED]
+    contracts.symbols()
+    return ready, time.perf_counter() - start
+
+
+def main():
+    info = exchange_info(N_SYMBOLS)
+    MetadataService.cache_dir = tempfile.mkdtemp()
+    client = Client(info)
+    rows = [("previous", previous(info)), ("cold cache", cached(client))]
+    # Let the background download write the cache
+    time.sleep(0.5)
+    rows.append(("warm cache", cached(client)))
+    (name,) = os.listdir(MetadataService.cache_dir)
+    path = os.path.join(MetadataService.cache_dir, name)
+    print(
+        f"exchangeInfo {len(info) / 2**20:.2f} MiB, "
+        f"cache {os.path.getsize(path) / 2**20:.2f} MiB, {N_SYMBOLS} symbols"
+    )
+    for name, (ready, used) in rows:
+        print(
+            f"  {name:<16}client ready {ready * 1000:>8.1f} ms"
+            f"   {len(USED)} contracts used {used * 1000:>8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Startup time of the two entry points, in milliseconds.
+
+Each mode runs in a fresh interpreter: the imports of the entry point, plus
+building the layout for the dashboard. The process time includes the
+interpreter start. The connector requests (contracts, balance, histories)
+are the same in both modes and are left out.
+
+    python -m benchmarks.bench_startup
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+MODES = {
+    # What engine.main imports before starting the clients
+    "headless (engine.py)": (
+        "import engine\nimport deployment\nimport Connectors.binance_connector"
+    ),
+    "dashboard (app.py)": "import app\napp.main({})",
+}
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+print(json.dumps({{
+    "ms": (time.perf_counter() - start) * 1000,
+    "modules": len(sys.modules),
+    "pandas": "pandas" in sys.modules,
+    "dash": "dash" in sys.modules,
+}}))
+"""
+
+
+def run(code: str):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code=code)],
+        capture_output=True,
+        text=True,
+    )
+    process_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        return None, process_ms
+    return json.loads(result.stdout.splitlines()[-1]), process_ms
+
+
+def main():
+    for name, code in MODES.items():
+        runs = [run(code) for _ in range(RUNS)]
+        if runs[0][0] is None:
+            print(f"  {name:<24}not available, the import failed")
+            continue
+        imports = statistics.median(probe["ms"] for probe, _ in runs)
+        process = statistics.median(process_ms for _, process_ms in runs)
+        probe = runs[0][0]
+        print(
+            f"  {name:<24}imports {imports:>7.1f} ms   process {process:>7.1f} ms"
+            f"   {probe['modules']:>5} modules   pandas {probe['pandas']!s:<5}"
+            f"   dash {probe['dash']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Dispatch of the websocket messages to the running strategies.
+
+Compares scanning every running strategy for each message with the
+symbol and channel indexes of CryptoExchange, with 1,000 strategies over
+200 symbols.
+
+    python -m benchmarks.bench_strategy_dispatch
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from Connectors.crypto_base_class import CryptoExchange
+from Moduls.snapshot import SnapshotStore
+
+INTERVALS = ["1m", "5m", "15m", "1h", "4h"]
+
+
+class Dispatcher:
+    """The strategy bookkeeping of CryptoExchange, without a connection."""
+
+    _register_strategy = CryptoExchange._register_strategy
+    _unregister_strategy = CryptoExchange._unregister_strategy
+    _strategies_of = CryptoExchange._strategies_of
+
+    def __init__(self):
+        self.running_startegies = dict()
+        self.symbol_strategies = dict()
+        self.channel_strategies = dict()
+        self.strategy_counter = dict()
+        self.state = SnapshotStore()
+
+
+def build(n_strategies: int, n_symbols: int) -> Dispatcher:
+    client = Dispatcher()
+    symbols = [f"SYM{i}USDT" for i in range(n_symbols)]
+    for i in range(n_strategies):
+        symbol, interval = random.choice(symbols), random.choice(INTERVALS)
+        strategy = SimpleNamespace(
+            symbol=symbol,
+            interval=interval,
+            ws_channel_key=f"{symbol}_{interval}",
+            strategy_key=f"{symbol}_{interval}_{i}",
+        )
+        client._register_strategy(strategy)
+        counter = client.strategy_counter.setdefault(strategy.ws_channel_key, {})
+        counter["count"] = counter.get("count", 0) + 1
+    return client
+
+
+# ########################### Previous dispatch ##########################
+def scan_book_ticker(client: Dispatcher, symbol: str) -> int:
+    reached = 0
+    for strategy in list(client.running_startegies.values()):
+        if symbol != strategy.symbol:
+            continue
+        reached += 1
+    return reached
+
+
+def scan_kline(client: Dispatcher, symbol: str, interval: str) -> int:
+    reached = 0
+    for strategy in list(client.running_startegies.values()):
+        if strategy.ws_channel_key == f"{symbol}_{interval}":
+            reached += 1
+    return reached
+
+
+def scan_has_strategy(client: Dispatcher, symbol: str) -> bool:
+    return symbol in [x.split("_")[0] for x in client.strategy_counter.keys()]
+
+
+# ########################### Indexed dispatch ##########################
+def index_book_ticker(client: Dispatcher, symbol: str) -> int:
+    reached = 0
+    for strategy in client._strategies_of(symbol):
+        reached += 1
+    return reached
+
+
+def index_kline(client: Dispatcher, symbol: str, interval: str) -> int:
+    reached = 0
+    for strategy in client._strategies_of(symbol, interval):
+        reached += 1
+    return reached
+
+
+def index_has_strategy(client: Dispatcher, symbol: str) -> bool:
+    return symbol in client.symbol_strategies
+
+
+def measure(dispatch, messages):
+    start = time.perf_counter()
+    reached = sum(dispatch(*message) for message in messages)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(messages), reached
+
+
+def report(title, rows):
+    print(title)
+    for name, (per_message, reached) in rows:
+        print(f"  {name:<24}{per_message * 1e6:>10.2f} µs/msg{reached:>10} reached")
+
+
+def main():
+    random.seed(0)
+    client = build(1_000, 200)
+    symbols = [f"SYM{i}USDT" for i in range(200)]
+    tickers = [(client, random.choice(symbols)) for _ in range(20_000)]
+    klines = [
+        (client, random.choice(symbols), random.choice(INTERVALS))
+        for _ in range(20_000)
+    ]
+    report(
+        "bookTicker messages",
+        [
+            ("scan", measure(scan_book_ticker, tickers)),
+            ("symbol index", measure(index_book_ticker, tickers)),
+        ],
+    )
+    report(
+        "kline messages",
+        [
+            ("scan", measure(scan_kline, klines)),
+            ("channel index", measure(index_kline, klines)),
+        ],
+    )
+    report(
+        "unsubscribe check",
+        [
+            ("split keys", measure(scan_has_strategy, tickers)),
+            ("symbol index", measure(index_has_strategy, tickers)),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
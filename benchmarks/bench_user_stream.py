@@ -0,0 +1,112 @@
+"""
+Delay between an order update on the exchange and the connector seeing
+it, in milliseconds.
+
+A local websocket server plays the Binance user data stream (listenKey
+request and executionReport events), and BinanceUserStream connects to it
+with ws_url. Each order is filled at a random time, compared with polling
+the order status on the OrderTracker schedule (first poll after 1 s, then
+doubling up to 30 s).
+
+    python -m benchmarks.bench_user_stream
+"""
+import asyncio
+import json
+import random
+import statistics
+import time
+from threading import Event, Thread
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from Connectors.order_tracker import OrderTracker
+from Connectors.user_stream import BinanceUserStream
+
+N_ORDERS = 200
+PORT = 8766
+
+
+class Client:
+    """The part of a connector used by the user stream."""
+
+    def __init__(self):
+        self.updates = dict()
+        self.order_tracker = OrderTracker(self)
+
+    def _execute_request(self, endpoint, method, params, need_sign=True):
+        return SimpleNamespace(json=lambda: {"listenKey": "key"})
+
+    def _on_order_update(self, order_id: str, status: str):
+        self.updates[order_id] = (status, time.perf_counter())
+        return
+
+    def add_log(self, msg, level):
+        return
+
+
+def serve(sockets: list, connected: Event):
+    async def user_data(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        sockets.append((ws, asyncio.get_running_loop()))
+        connected.set()
+        async for _ in ws:
+            pass
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws/key", user_data)])
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", PORT).start())
+    Thread(target=loop.run_forever, daemon=True).start()
+    return
+
+
+def polled(tracker: OrderTracker, fill_after: float) -> float:
+    """Time from the fill to the first status poll after it"""
+    delay = tracker.first_poll
+    elapsed = delay
+    while elapsed < fill_after:
+        delay = min(delay * 2, tracker.max_poll)
+        elapsed += delay
+    return elapsed - fill_after
+
+
+def pushed(client: Client, sockets: list) -> list:
+    ws, loop = sockets[0]
+    delays = []
+    for i in range(N_ORDERS):
+        event = {"e": "executionReport", "i": i, "X": "FILLED"}
+        sent = time.perf_counter()
+        asyncio.run_coroutine_threadsafe(ws.send_str(json.dumps(event)), loop)
+        while str(i) not in client.updates:
+            time.sleep(0.0001)
+        delays.append(client.updates[str(i)][1] - sent)
+    return delays
+
+
+def main():
+    sockets, connected = [], Event()
+    serve(sockets, connected)
+    client = Client()
+    stream = BinanceUserStream(client, ws_url=f"ws://127.0.0.1:{PORT}/ws")
+    stream.start()
+    connected.wait(5)
+    delays = pushed(client, sockets)
+    stream.stop()
+    random.seed(1)
+    tracker = OrderTracker(client)
+    polls = [polled(tracker, random.uniform(0, 60)) for _ in range(N_ORDERS)]
+    for name, values in [("polling", polls), ("user stream", delays)]:
+        values = sorted(value * 1000 for value in values)
+        print(
+            f"  {name:<14}median {statistics.median(values):>9.2f} ms"
+            f"   p99 {values[int(len(values) * 0.99)]:>9.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
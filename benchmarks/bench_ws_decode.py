@@ -0,0 +1,211 @@
+"""
+Throughput of the websocket message pipeline, in messages per second.
+
+Compares the previous _on_message (json.loads then an if chain on the
+decoded fields) with the MessageRouter of Connectors.ws_decoder, with the
+stdlib json and, when installed, orjson. The frames are shaped like the
+recorded Binance combined streams and Kucoin topics: 90% tickers, 10%
+klines, over 200 symbols, and 10% of frames for streams without a route.
+
+    python -m benchmarks.bench_ws_decode
+"""
+import json
+import random
+import time
+
+from Connectors import ws_decoder
+from Connectors.ws_decoder import MessageRouter
+
+N_SYMBOLS = 200
+
+
+# ########################### Recorded-like frames ##########################
+def binance_frames(n: int):
+    frames, t = [], 1_600_000_000_000
+    for i in range(n):
+        symbol = f"SYM{random.randrange(N_SYMBOLS * 11 // 10)}USDT"
+        price = random.uniform(1, 30000)
+        if random.random() < 0.9:
+            data = {
+                "u": 400900217 + i,
+                "s": symbol,
+                "b": f"{price:.8f}",
+                "B": "31.21000000",
+                "a": f"{price * 1.0001:.8f}",
+                "A": "40.66000000",
+            }
+            stream = f"{symbol.lower()}@bookTicker"
+        else:
+            data = {
+                "e": "kline",
+                "E": t + i,
+                "s": symbol,
+                "k": {
+                    "t": t,
+                    "T": t + 59_999,
+                    "s": symbol,
+                    "i": "1m",
+                    "f": 100,
+                    "L": 200,
+                    "o": f"{price:.8f}",
+                    "c": f"{price:.8f}",
+                    "h": f"{price:.8f}",
+                    "l": f"{price:.8f}",
+                    "v": "1000.00000000",
+                    "n": 100,
+                    "x": False,
+                    "q": "1.00000000",
+                    "V": "500.00000000",
+                    "Q": "0.50000000",
+                    "B": "0",
+                },
+            }
+            stream = f"{symbol.lower()}@kline_1m"
+        frame = json.dumps({"stream": stream, "data": data}, separators=(",", ":"))
+        frames.append(frame)
+    return frames
+
+
+def kucoin_frames(n: int):
+    frames, t = [], 1_600_000_000
+    for i in range(n):
+        symbol = f"SYM{random.randrange(N_SYMBOLS * 11 // 10)}-USDT"
+        price = random.uniform(1, 30000)
+        if random.random() < 0.9:
+            msg = {
+                "type": "message",
+                "topic": f"/market/ticker:{symbol}",
+                "subject": "trade.ticker",
+                "data": {
+                    "sequence": str(1545896668986 + i),
+                    "price": f"{price:.8f}",
+                    "size": "0.017",
+                    "bestAsk": f"{price * 1.0001:.8f}",
+                    "bestAskSize": "0.99",
+                    "bestBid": f"{price:.8f}",
+                    "bestBidSize": "0.3",
+                },
+            }
+        else:
+            msg = {
+                "type": "message",
+                "topic": f"/market/candles:{symbol}_1min",
+                "subject": "trade.candles.update",
+                "data": {
+                    "symbol": symbol,
+                    "candles": [str(t), *[f"{price:.8f}"] * 4, "1000.0", "1.0"],
+                    "time": (t + i) * 10**9,
+                },
+            }
+        frames.append(json.dumps(msg, separators=(",", ":")))
+    return frames
+
+
+# ########################### Previous pipelines ##########################
+class Handlers:
+    def __init__(self):
+        self.count = 0
+
+    def ticker(self, data, symbol):
+        self.count += 1
+
+    def kline(self, data, symbol, interval=None):
+        self.count += 1
+
+
+def binance_previous(handlers: Handlers, subscribed: set):
+    def on_message(msg):
+        data = json.loads(msg)["data"]
+        channel = data.get("e")
+        symbol = data.get("s")
+        if symbol not in subscribed:
+            return
+        if channel == "bookTicker" or (channel is None and "a" in data and "b" in data):
+            handlers.ticker(data, symbol)
+        elif channel == "kline":
+            handlers.kline(data, symbol)
+
+    return on_message
+
+
+def kucoin_previous(handlers: Handlers, subscribed: set):
+    def on_message(msg):
+        data = json.loads(msg)
+        if "type" in data and data["type"] == "welcome":
+            return
+        channel = data["subject"]
+        symbol = data["topic"].split(":")[-1]
+        if channel == "trade.ticker":
+            if symbol in subscribed:
+                handlers.ticker(data["data"], symbol)
+        elif channel == "trade.candles.update":
+            symbol, interval = symbol.rsplit("_", 1)
+            if symbol in subscribed:
+                handlers.kline(data["data"], symbol, interval)
+
+    return on_message
+
+
+# ########################### Routed pipelines ##########################
+def binance_router(handlers: Handlers, subscribed: set, loads):
+    router = MessageRouter("stream", "data", loads)
+    for symbol in subscribed:
+        router.add(f"{symbol.lower()}@bookTicker", handlers.ticker, symbol)
+        router.add(f"{symbol.lower()}@kline_1m", handlers.kline, symbol)
+    return router.dispatch
+
+
+def kucoin_router(handlers: Handlers, subscribed: set, loads):
+    router = MessageRouter("topic", "data", loads)
+    for symbol in subscribed:
+        router.add(f"/market/ticker:{symbol}", handlers.ticker, symbol)
+        router.add(f"/market/candles:{symbol}_1min", handlers.kline, symbol, "1min")
+    return router.dispatch
+
+
+def measure(on_message, handlers: Handlers, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        on_message(frame)
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, handlers.count
+
+
+def report(title, rows):
+    print(title)
+    for name, (rate, handled) in rows:
+        print(f"  {name:<24}{rate:>12,.0f} msg/s{handled:>10} handled")
+
+
+def main():
+    random.seed(0)
+    backends = [("json", json.loads)]
+    if ws_decoder.backend != "json":
+        backends.append((ws_decoder.backend, ws_decoder.loads))
+    for exchange, frames, subscribed, previous, routed in [
+        (
+            "Binance",
+            binance_frames(200_000),
+            {f"SYM{i}USDT" for i in range(N_SYMBOLS)},
+            binance_previous,
+            binance_router,
+        ),
+        (
+            "Kucoin",
+            kucoin_frames(200_000),
+            {f"SYM{i}-USDT" for i in range(N_SYMBOLS)},
+            kucoin_previous,
+            kucoin_router,
+        ),
+    ]:
+        handlers = Handlers()
+        rows = [("previous", measure(previous(handlers, subscribed), handlers, frames))]
+        for name, loads in backends:
+            handlers = Handlers()
+            on_message = routed(handlers, subscribed, loads)
+            rows.append((f"router ({name})", measure(on_message, handlers, frames)))
+        report(f"{exchange}: {len(frames)} frames", rows)
+
+
+if __name__ == "__main__":
+    main()
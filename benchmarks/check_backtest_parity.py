@@ -0,0 +1,73 @@
+"""
+Checks that TechnicalBacktest gives the decisions of the live strategy.
+
+The same candles are backtested and replayed as kline messages through
+TechnicalStrategies, with the "tick" and the "close" evaluation policies.
+The backtest decision of each candle must be the one parse_trade returns
+for the message closing it. With "close", the updates of the open candle
+must not be evaluated at all.
+
+    python -m benchmarks.check_backtest_parity
+"""
+import random
+
+from backtesting import DECISIONS, TechnicalBacktest
+from benchmarks.check_streaming_indicators import (
+    INTERVAL,
+    PARAMS,
+    SYMBOL,
+    Client,
+    klines,
+    messages,
+)
+from Moduls.data_modul import CandleStick
+from strategies import TechnicalStrategies
+
+HISTORY = 500
+REPLAYED = 1_000
+POLICIES = ("tick", "close")
+
+
+def main():
+    rows = klines(HISTORY + REPLAYED, seed=2)
+    candles = [CandleStick(row, "Binance") for row in rows]
+    client = Client(candles[:HISTORY])
+    results = [
+        TechnicalBacktest(candles, 0.01, 0.01, 0.1, warmup=HISTORY, **params).run()
+        for params in PARAMS
+    ]
+    # Each backtest is compared with a live strategy of every policy
+    pairs = [
+        (
+            TechnicalStrategies(
+                client, SYMBOL, INTERVAL, 0.01, 0.01, 0.1, evaluate=evaluate, **params
+            ),
+            result,
+        )
+        for params, result in zip(PARAMS, results)
+        for evaluate in POLICIES
+    ]
+    rng = random.Random(3)
+    checked = {evaluate: 0 for evaluate in POLICIES}
+    signals = 0
+    for i, row in enumerate(rows[HISTORY:], HISTORY):
+        updates = messages(row, rng)
+        # Like the feed, each message reaches all the strategies of the channel
+        for candle in updates:
+            for strategy, result in pairs:
+                decision = strategy.parse_trade(candle)
+                if not candle.is_closed:
+                    # Only the closed candle is evaluated
+                    assert strategy.evaluate == "tick" or decision is None
+                    continue
+                expected = DECISIONS[int(result.decisions[i])]
+                assert decision == expected, (strategy.evaluate, i)
+                checked[strategy.evaluate] += 1
+                signals += expected is not None
+    for evaluate, count in checked.items():
+        print(f"  {evaluate:<8}{count:>6} closed candles match the backtest")
+    print(f"  {signals} buy or sell signals among them")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Replays the same candles through TechnicalStrategies with streaming=True and
+streaming=False and checks that they give the same indicators and decisions.
+
+The candles are sent as kline messages, several updates of the open candle
+then the closed one, with a missing candle on the way. The streaming
+strategies share their channel and keep the default retention window, so
+the old candles are evicted, while the pandas strategies keep the whole
+history. Every message is compared, the updates of the open candle
+included.
+
+    python -m benchmarks.check_streaming_indicators
+"""
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+from Connectors.crypto_base_class import CryptoExchange
+from Moduls.data_modul import CandleStick
+from Moduls.snapshot import SnapshotStore
+from strategies import TechnicalStrategies
+
+SYMBOL = "BTCUSDT"
+INTERVAL = "1m"
+TIMEFRAME = 60_000
+HISTORY = 500
+REPLAYED = 400
+TICKS = 3
+# Replayed candle that is never received
+MISSING = 150
+# Two strategies sharing the fast EMA
+PARAMS = [
+    {"ema": {"fast": 9, "slow": 25}, "macd": {"fast": 12, "slow": 26, "signal": 9}},
+    {
+        "ema": {"fast": 9, "slow": 50},
+        "macd": {"fast": 8, "slow": 21, "signal": 5},
+        "rsi": 14,
+    },
+]
+FIELDS = ("ema_fast", "ema_slow", "macd", "macd_signal", "rsi", "up_trend")
+# The RSI is rounded to 2 decimals by both modes
+TOLERANCE = {"rsi": 0.011}
+
+
+class Client:
+    """The part of a connector used to start and run the strategies."""
+
+    exchange = "Binance"
+    _register_strategy = CryptoExchange._register_strategy
+    _acquire_channel = CryptoExchange._acquire_channel
+
+    def __init__(self, history: List[CandleStick]):
+        self.contracts = {SYMBOL: SimpleNamespace(symbol=SYMBOL)}
+        self.history = SimpleNamespace(load=lambda *args: history)
+        self.channels = dict()
+        self.running_startegies = dict()
+        self.symbol_strategies = dict()
+        self.channel_strategies = dict()
+        self.state = SnapshotStore()
+
+    def new_subscribe(self, *args):
+        return None
+
+    def add_log(self, msg: str, level: str):
+        return
+
+
+def klines(n: int, seed: int = 0) -> List[List]:
+    """Random walk candles, [timestamp, open, high, low, close, volume]"""
+    rng = random.Random(seed)
+    rows, close = [], 100.0
+    for i in range(n):
+        open_ = close
+        close = open_ * (1 + rng.gauss(0, 0.004))
+        high = max(open_, close) * (1 + rng.random() * 0.002)
+        low = min(open_, close) * (1 - rng.random() * 0.002)
+        rows.append([1_700_000_040_000 + i * TIMEFRAME, open_, high, low, close, 1.0])
+    return rows
+
+
+def messages(kline: List, rng: random.Random) -> List[CandleStick]:
+    """Updates of the open candle, the last one closes it"""
+    timestamp, open_, high, low, close, volume = kline
+    updates, tick_high, tick_low = [], open_, open_
+    for tick in range(TICKS):
+        last = tick == TICKS - 1
+        price = close if last else rng.uniform(low, high)
+        tick_high = high if last else max(tick_high, price)
+        tick_low = low if last else min(tick_low, price)
+        candle = CandleStick(
+            [timestamp, open_, tick_high, tick_low, price, volume], "Binance"
+        )
+        candle.is_closed = last
+        updates.append(candle)
+    return updates
+
+
+def indicators(strategy: TechnicalStrategies) -> Dict[str, float]:
+    """Indicator values used by the last parse_trade of the strategy"""
+    if strategy.streaming:
+        ema_fast = strategy._ema_fast.value
+        ema_slow = strategy._ema_slow.value
+        macd, macd_signal = strategy._macd.value
+        rsi = strategy._rsi.value
+    else:
+        ema_fast = strategy._EMA(strategy.ema["fast"]).iloc[-1]
+        ema_slow = strategy._EMA(strategy.ema["slow"]).iloc[-1]
+        macd, macd_signal = strategy._MACD()
+        rsi = strategy._RSI()
+    values = (ema_fast, ema_slow, macd, macd_signal, rsi, strategy._upTrend)
+    return dict(zip(FIELDS, map(float, values)))
+
+
+def main():
+    rows = klines(HISTORY + REPLAYED)
+    history = [CandleStick(row, "Binance") for row in rows[:HISTORY]]
+    rng = random.Random(1)
+    replay = [
+        messages(row, rng)
+        for i, row in enumerate(rows[HISTORY:])
+        if i != MISSING
+    ]
+    strategies = dict()
+    for streaming in (True, False):
+        client = Client(history)
+        # Without streaming, the whole history is kept to compare with
+        retention = None if streaming else HISTORY + REPLAYED
+        strategies[streaming] = [
+            TechnicalStrategies(
+                client,
+                SYMBOL,
+                INTERVAL,
+                0.01,
+                0.01,
+                0.1,
+                streaming=streaming,
+                retention=retention,
+                **params,
+            )
+            for params in PARAMS
+        ]
+    channel = strategies[True][0].channel
+    assert channel is strategies[True][1].channel
+    elapsed = {True: 0.0, False: 0.0}
+    differences = {field: 0.0 for field in FIELDS}
+    decisions = mismatches = 0
+    for updates in replay:
+        for candle in updates:
+            for pair in zip(strategies[True], strategies[False]):
+                results = []
+                for strategy in pair:
+                    start = time.perf_counter()
+                    decision = strategy.parse_trade(candle)
+                    elapsed[strategy.streaming] += time.perf_counter() - start
+                    results.append((decision, indicators(strategy)))
+                (decision, streamed), (expected, recalculated) = results
+                decisions += 1
+                mismatches += decision != expected
+                for field in FIELDS:
+                    a, b = streamed[field], recalculated[field]
+                    if np.isnan(a) and np.isnan(b):
+                        continue
+                    # NaN on one side only never compares equal
+                    difference = np.inf if np.isnan(a - b) else abs(a - b)
+                    differences[field] = max(differences[field], difference)
+    print(
+        f"{decisions} decisions over {len(replay)} candles, "
+        f"{len(channel.candles)} candles kept with streaming"
+    )
+    for field, difference in differences.items():
+        print(f"  {field:<12}max difference {difference:.3g}")
+    for streaming, seconds in elapsed.items():
+        name = "streaming" if streaming else "pandas"
+        print(f"  {name:<12}{seconds / decisions * 1e6:>10.1f} µs/msg")
+    assert len(channel.candles) < HISTORY + REPLAYED
+    assert mismatches == 0, f"{mismatches} different decisions"
+    for field, difference in differences.items():
+        assert difference <= TOLERANCE.get(field, 1e-9), field
+    print("streaming and pandas indicators match")
+
+
+if __name__ == "__main__":
+    main()
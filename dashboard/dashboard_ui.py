@@ -1,6 +1,6 @@
 from datetime import datetime
 from functools import partial
-from typing import Dict
+from typing import Dict, List
 
 import dash
 import dash_bootstrap_components as dbc
@@ -8,17 +8,17 @@ import pandas as pd
 from dash import Input, Output, State, dash_table, dcc, html
 
 from Connectors.crypto_base_class import CryptoExchange
-from Moduls.data_modul import Contract
 from strategies import intervals_to_sec
 
 
 # Helpful Functions
-def get_contracts(clients: Dict[str, "CryptoExchange"]) -> Dict[str, Contract]:
-    contracts = {
-        f"{exchange} {symbol}": contract
+def get_contracts(clients: Dict[str, "CryptoExchange"]) -> List[str]:
+    """Dropdown options, from the symbol index (the contracts are not parsed)"""
+    contracts = [
+        f"{exchange} {symbol}"
         for exchange, client in clients.items()
-        for symbol, contract in client.contracts.items()
-    }
+        for symbol in client.contracts.symbols()
+    ]
     return contracts
 
 
@@ -42,9 +42,7 @@ def upper_container(clients: Dict[str, "CryptoExchange"]):
         [
             html.Div(html.Label("Contract"), className="col-auto"),
             html.Div(
-                dcc.Dropdown(
-                    options=list(contracts.keys()), value=None, id="watchlist-select"
-                ),
+                dcc.Dropdown(options=contracts, value=None, id="watchlist-select"),
                 className="col",
             ),
         ],
@@ -73,7 +71,7 @@ def strategy_selector(contracts):
         [
             html.Span("Contract"),
             dcc.Dropdown(
-                options=list(contracts.keys()),
+                options=contracts,
                 value=None,
                 id="strategy-contracts-dropdown",
                 className="small-font",
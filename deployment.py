@@ -0,0 +1,122 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+from strategies import Strategy, TechnicalStrategies
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+STRATEGY_TYPES = {"Technical": TechnicalStrategies}
+
+
+def load_deployment(path: str) -> List[Dict]:
+    """
+    Read a deployment file, a JSON list of strategies:
+
+        {"strategies": [{"exchange": "Binance", "type": "Technical",
+                         "symbols": ["BTCUSDT", "ETHUSDT"], "interval": "1m",
+                         "tp": 0.02, "sl": 0.01, "buy_pct": 0.1, ...}]}
+
+    An entry with "symbols" gives one strategy per symbol. The other fields
+    are the arguments of the strategy class, with the exchange intervals and
+    tp, sl and buy_pct as fractions.
+    """
+    with open(path) as file:
+        entries = json.load(file)["strategies"]
+    specs = []
+    for index, entry in enumerate(entries):
+        entry = dict(entry)
+        if entry.get("type", "Technical") not in STRATEGY_TYPES:
+            raise ValueError(f"Strategy {index}: unknown type {entry['type']}")
+        symbols = entry.pop("symbols", None) or [entry.pop("symbol", None)]
+        if None in symbols or "exchange" not in entry:
+            raise ValueError(f"Strategy {index}: exchange and symbol are required")
+        specs += [{**entry, "symbol": symbol} for symbol in symbols]
+    return specs
+
+
+def deploy(
+    clients: Dict[str, "CryptoExchange"], specs: List[Dict], workers: int = 8
+) -> List[Strategy]:
+    """
+    Start the strategies of a deployment.
+
+    The strategies are configured first, then the histories of their
+    channels (once per channel, with the longest retention) and the prices
+    of their symbols are downloaded concurrently. The client rate limiters
+    keep the downloads within the request budgets. Starting the strategies
+    then reads the histories from the cache, and the websocket manager sends
+    their subscriptions in batches.
+    """
+    unknown = {spec["exchange"] for spec in specs} - clients.keys()
+    if unknown:
+        raise ValueError(f"No client for the exchanges {sorted(unknown)}")
+    strategies = []
+    for spec in specs:
+        strategy = _configure(clients, spec)
+        if strategy is not None:
+            strategies.append(strategy)
+    channels: Dict[Tuple[str, str], Strategy] = dict()
+    symbols: Dict[Tuple[str, str], Strategy] = dict()
+    for strategy in strategies:
+        key = (strategy.client.exchange, strategy.ws_channel_key)
+        if key not in channels or channels[key].retention < strategy.retention:
+            channels[key] = strategy
+        if strategy.symbol not in strategy.client.prices:
+            symbols[(strategy.client.exchange, strategy.symbol)] = strategy
+    with ThreadPoolExecutor(workers) as executor:
+        loads = [executor.submit(_load_history, s) for s in channels.values()]
+        loads += [executor.submit(_load_price, s) for s in symbols.values()]
+        for load in loads:
+            load.result()
+    started = []
+    # The first strategy of a channel sizes its candles, start the longest
+    # retention first
+    for strategy in sorted(strategies, key=lambda s: -s.retention):
+        try:
+            strategy.start()
+            started.append(strategy)
+        except Exception as e:
+            msg = f"Could not start the {strategy.symbol} strategy: {e!r}"
+            strategy.client.add_log(msg, "error")
+    return started
+
+
+def _configure(
+    clients: Dict[str, "CryptoExchange"], spec: Dict
+) -> Union[Strategy, None]:
+    deployment_spec, spec = spec, dict(spec)
+    client = clients[spec.pop("exchange")]
+    strategy_class = STRATEGY_TYPES[spec.pop("type", "Technical")]
+    try:
+        strategy = strategy_class(client=client, start=False, **spec)
+    except Exception as e:
+        client.add_log(f"Invalid {spec.get('symbol')} strategy: {e!r}", "error")
+        return None
+    strategy.deployment_spec = deployment_spec
+    return strategy
+
+
+def _load_history(strategy: Strategy):
+    client = strategy.client
+    try:
+        client.history.load(
+            strategy.contract,
+            strategy._channel_interval,
+            strategy.timeframe,
+            strategy.retention,
+        )
+    except Exception as e:
+        msg = f"Could not load the {strategy.ws_channel_key} history: {e!r}"
+        client.add_log(msg, "warning")
+    return
+
+
+def _load_price(strategy: Strategy):
+    try:
+        strategy.client.get_price(strategy.contract)
+    except Exception as e:
+        msg = f"Could not load the {strategy.symbol} price: {e!r}"
+        strategy.client.add_log(msg, "warning")
+    return
@@ -0,0 +1,121 @@
+"""
+Headless entry point, runs the connectors and the strategies without the
+dashboard:
+
+    python engine.py
+
+The strategies of the last checkpoint are restored, then the ones of the
+deployment file (DEPLOYMENT_FILE, default deployment.json) are started.
+Neither Dash nor pandas is imported, unless a strategy needs it.
+
+The dashboard can be attached to the running engine with SIGUSR1, it is
+then served on DASHBOARD_PORT (default 8050). app.py runs the engine and
+the dashboard together.
+"""
+import json
+import os
+import signal
+import sys
+from collections import Counter
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Dict, Union
+
+if TYPE_CHECKING:
+    from Connectors.crypto_base_class import CryptoExchange
+
+_dashboard: Union[Thread, None] = None
+
+
+def create_clients() -> Dict[str, "CryptoExchange"]:
+    # ASYNC_CONNECTORS=1 runs the connectors on an asyncio event loop
+    if os.getenv("ASYNC_CONNECTORS") == "1":
+        from Connectors.async_binance_connector import (
+            AsyncBinanceClient as BinanceClient,
+        )
+    else:
+        from Connectors.binance_connector import BinanceClient
+    # from Connectors.kucoin_connector import KucoinClient
+    return {
+        "Binance": BinanceClient(is_test=False),
+        #    'Kucoin': KucoinClient(is_spot=True, is_test=False),
+    }
+
+
+def start(
+    clients: Dict[str, "CryptoExchange"], deployment: Union[str, None] = None
+) -> Union[Thread, None]:
+    """
+    Restore the checkpointed strategies and start the websockets. The
+    strategies of the deployment file are started on the returned thread,
+    except the ones restored with the same entry.
+    """
+    from deployment import deploy, load_deployment
+
+    # The strategies of the last checkpoint continue where they stopped
+    for client in clients.values():
+        client.checkpoint.restore()
+    [client.run() for client in clients.values()]
+    deployment = deployment or os.getenv("DEPLOYMENT_FILE", "deployment.json")
+    if not os.path.exists(deployment):
+        return None
+    # An entry deployed twice runs twice, so the restored ones are counted
+    restored = Counter(
+        _spec_key(strategy.deployment_spec)
+        for client in clients.values()
+        for strategy in client.state.snapshot().strategies.values()
+        if strategy.deployment_spec is not None
+    )
+    specs = []
+    for spec in load_deployment(deployment):
+        key = _spec_key(spec)
+        if restored[key] > 0:
+            restored[key] -= 1
+        else:
+            specs.append(spec)
+    thread = Thread(target=deploy, args=(clients, specs), daemon=True)
+    thread.start()
+    return thread
+
+
+def _spec_key(spec: Dict) -> str:
+    return json.dumps(spec, sort_keys=True)
+
+
+def attach_dashboard(
+    clients: Dict[str, "CryptoExchange"], port: Union[int, None] = None
+) -> Thread:
+    """Serve the dashboard of the running clients on a background thread"""
+    global _dashboard
+    if _dashboard is not None and _dashboard.is_alive():
+        return _dashboard
+    import app
+
+    # The dashboard callbacks read the clients of the app module
+    app.clients = clients
+    dashboard = app.main(clients)
+    port = port or int(os.getenv("DASHBOARD_PORT", 8050))
+    _dashboard = Thread(
+        target=dashboard.run,
+        kwargs={"port": port, "debug": False, "use_reloader": False},
+        daemon=True,
+    )
+    _dashboard.start()
+    return _dashboard
+
+
+def main():
+    clients = create_clients()
+    start(clients)
+    # Exit normally on SIGTERM, so the last checkpoint is written
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *args: attach_dashboard(clients))
+    try:
+        Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return
+
+
+if __name__ == "__main__":
+    main()
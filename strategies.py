@@ -1,14 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, Literal, Tuple, Union
 import re
+import time
 
 import numpy as np
-import pandas as pd
 
 from Moduls.data_modul import Order, CandleStick
 
 from Connectors.crypto_base_class import CryptoExchange
 
+if TYPE_CHECKING:
+    # Imported on use, the streaming indicators do not need pandas
+    import pandas as pd
+
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -34,6 +38,9 @@ intervals_to_sec = {
 
 class Strategy(ABC):
     new_strategy_id = 1
+    # By default, keep this many times the longest indicator lookback
+    retention_multiplier = 10
+    min_retention = 100
 
     def __init__(
         self,
@@ -43,6 +50,10 @@ class Strategy(ABC):
         tp: float,
         sl: float,
         buy_pct: float,
+        evaluate: Literal["tick", "close", "throttle"] = "tick",
+        throttle_ms: int = 1000,
+        retention: Union[int, None] = None,
+        start: bool = True,
     ):
         self.client = client
         self.symbol = symbol
@@ -53,62 +64,97 @@ class Strategy(ABC):
         self.sl = sl
         self.buy_pct = buy_pct
         self.interval = interval
+        if evaluate not in ["tick", "close", "throttle"]:
+            raise ValueError(f"Unknown evaluation policy {evaluate}")
+        # When to evaluate the strategy: on every kline message ("tick"), only
+        # when the candle closes ("close"), or when the candle closes and at
+        # most once every throttle_ms milliseconds in between ("throttle")
+        self.evaluate = evaluate
+        self.throttle_ms = throttle_ms
+        self._last_evaluation = 0
+        # Number of candles kept in memory, older candles are dropped. The
+        # streaming indicators keep their state, so they are not affected.
+        self.retention = retention or max(
+            self.retention_multiplier * self.lookback, self.min_retention
+        )
         interval = re.match(r"[0-9]+[a-zA-Z]", interval).group(0)
         self.timeframe = intervals_to_sec[interval] * 1000
-        self.client.new_subscribe("candles", symbol, self.interval)
         self.ws_channel_key = f"{symbol}_{interval}"
-        self.strategy_key = f"{self.ws_channel_key}_{Strategy.new_strategy_id}"
-        self.client.running_startegies[self.strategy_key] = self
-        Strategy.new_strategy_id += 1
-        self.candles = self.client.get_candlestick(self.contract, interval)
-        data = [
-            {
-                "timestamp": candle.timestamp,
-                "open": candle.open,
-                "close": candle.close,
-                "high": candle.high,
-                "low": candle.low,
-                "volume": candle.volume,
-            }
-            for candle in self.candles
-        ]
-        self.df = pd.DataFrame(data)
+        self._channel_interval = interval
+        self._df = None
+        self._df_version = -1
         self.order: Order
+        # Sell order followed by the order tracker, until it is closed
+        self.sell_order: Union[Order, None] = None
+        # Deployment file entry of the strategy, if it was deployed
+        self.deployment_spec: Union[Dict, None] = None
+        # With start=False the strategy is only configured, e.g. to load the
+        # histories of many strategies at once before starting them
+        if start:
+            self.start()
+
+    def start(self):
+        """Subscribe to the candles channel and load its history"""
+        self.client.new_subscribe("candles", self.symbol, self.interval)
+        # A restored strategy keeps its key
+        if not hasattr(self, "strategy_key"):
+            self.strategy_key = f"{self.ws_channel_key}_{Strategy.new_strategy_id}"
+            Strategy.new_strategy_id += 1
+        self.channel = self.client._acquire_channel(self, self._channel_interval)
+        # The candles are shared with the other strategies of the channel
+        self.candles = self.channel.candles
+        self._setup()
+        # Registered last, the feed worker runs the strategy from then on
+        self.client._register_strategy(self)
         self.client.add_log(f"{self.symbol} Strategy added succesfully.", "info")
+        return
+
+    def _setup(self):
+        """Create the strategy state that depends on the channel"""
+        return
+
+    @property
+    def lookback(self) -> int:
+        """Number of candles the strategy indicators depend on"""
+        return 1
+
+    def __getstate__(self):
+        """Checkpointed state, the client and contract are set on restore"""
+        state = self.__dict__.copy()
+        state.pop("client", None)
+        state.pop("contract", None)
+        state["_df"] = None
+        state["_df_version"] = -1
+        return state
+
+    @property
+    def df(self) -> "pd.DataFrame":
+        """DataFrame copy of the candles, rebuilt only when they change."""
+        if self._df_version != self.candles.version:
+            self._df = self.candles.to_frame()
+            self._df_version = self.candles.version
+        return self._df
 
     def _update_candles(self, new_candle: CandleStick):
-        last_candle = self.df.iloc[-1]
-        # Check if the last trade belongs to the last candle
-        if new_candle.timestamp == last_candle["timestamp"]:
-            last_candle = new_candle
-            return "Same candle"
-        # Account for missing candles
-        missing_candles = (
-            new_candle.timestamp - last_candle["timestamp"]
-        ) / self.timeframe - 1
-        # If there are any missing candles, create them
-        for _ in range(int(missing_candles)):
-            open_time = last_candle["timestamp"] + self.timeframe
-            open_price = close_price = high = low = np.nan
-            volume = 0
-            self.df.loc[len(self.df)] = [
-                open_time,
-                open_price,
-                close_price,
-                high,
-                low,
-                volume,
-            ]
-            last_candle = self.df.iloc[-1]
-        self.df.loc[len(self.df), :] = [
-            new_candle.timestamp,
-            new_candle.open,
-            new_candle.close,
-            new_candle.high,
-            new_candle.low,
-            new_candle.volume,
-        ]
-        return "New candle"
+        return self.channel.update(new_candle)
+
+    def _should_evaluate(self, new_candle: CandleStick, candle_status: str) -> bool:
+        if self.evaluate == "tick":
+            return True
+        now = time.monotonic() * 1000
+        if new_candle.is_closed is None:
+            # The exchange does not flag closed candles, the previous candle
+            # is known to be closed once a new one is opened
+            is_closed = candle_status == "New candle"
+        else:
+            is_closed = new_candle.is_closed
+        if is_closed or (
+            self.evaluate == "throttle"
+            and now - self._last_evaluation >= self.throttle_ms
+        ):
+            self._last_evaluation = now
+            return True
+        return False
 
     def _PnLcalciator(self, sell_order: Order) -> float:
         sell_margin = sell_order.quantity * sell_order.price
@@ -135,34 +181,62 @@ class TechnicalStrategies(Strategy):
         af_max=0.2,
         af_step=0.02,
         rsi=12,
+        streaming=True,
+        **kwargs,
     ):
-        super().__init__(client, symbol, interval, tp, sl, buy_pct)
-        # Load technical indicator parameters
+        # Load technical indicator parameters, needed for the retention window
         self.ema = ema
         self.macd = macd
         self.rsi = rsi
-        # for parabolic SAR, keep track of the extreme value
-        self._ep = self.df.loc[0, "high"]
-        self._sar: List[float] = []
-        self._af_step = af_step
-        self._af_init = self._af = af
-        self._af_max = af_max
-        self._SAR()
+        self._sar_params = (af, af_max, af_step)
+        # Streaming mode keeps running indicators state instead of
+        # recalculating them over the whole history on every message
+        self.streaming = streaming
+        super().__init__(client, symbol, interval, tp, sl, buy_pct, **kwargs)
+
+    def _setup(self):
+        # Indicators are shared with the strategies of the same channel.
+        # Parabolic SAR is calculated over the loaded history in one pass,
+        # then continued from its state with every new candle
+        self._sar = self.channel.indicator(self.strategy_key, "sar", *self._sar_params)
+        if self.streaming:
+            self._ema_fast = self.channel.indicator(
+                self.strategy_key, "ema", self.ema["fast"]
+            )
+            self._ema_slow = self.channel.indicator(
+                self.strategy_key, "ema", self.ema["slow"]
+            )
+            self._macd = self.channel.indicator(
+                self.strategy_key,
+                "macd",
+                self.macd["fast"],
+                self.macd["slow"],
+                self.macd["signal"],
+            )
+            self._rsi = self.channel.indicator(self.strategy_key, "rsi", self.rsi)
+        return
 
     def parse_trade(self, new_candle: CandleStick) -> str:
         """
         This function will keep updating the technical indicators values
         and trade if needed
         """
-        candle = self._update_candles(new_candle)
-        ema_fast = self._EMA(self.ema["fast"]).iloc[-1]
-        ema_slow = self._EMA(self.ema["slow"]).iloc[-1]
+        candle_status = self._update_candles(new_candle)
+        # The candle is stored anyway, indicators are only updated when needed
+        if not self._should_evaluate(new_candle, candle_status):
+            return None
+        self.channel.sync(self.strategy_key)
+        if self.streaming:
+            ema_fast = self._ema_fast.value
+            ema_slow = self._ema_slow.value
+            macd, macd_signal = self._macd.value
+            rsi = self._rsi.value
+        else:
+            ema_fast = self._EMA(self.ema["fast"]).iloc[-1]
+            ema_slow = self._EMA(self.ema["slow"]).iloc[-1]
+            macd, macd_signal = self._MACD()
+            rsi = self._RSI()
         ema_check = 3 * int(ema_fast > ema_slow)
-
-        macd, macd_signal = self._MACD()
-        rsi = self._RSI()
-        if candle == "New candle":
-            self._SAR()
         confidence = (
             ema_check
             + self._macd_eval(macd, macd_signal)
@@ -175,8 +249,19 @@ class TechnicalStrategies(Strategy):
         elif confidence < 3:
             return "sell or don't enter"
 
-    def _EMA(self, window: int) -> pd.Series:
-        return self.df["close"].ewm(span=window).mean()
+    @property
+    def lookback(self) -> int:
+        return max(
+            self.ema["fast"],
+            self.ema["slow"],
+            self.macd["slow"] + self.macd["signal"],
+            self.rsi,
+        )
+
+    def _EMA(self, window: int) -> "pd.Series":
+        import pandas as pd
+
+        return pd.Series(self.candles["close"]).ewm(span=window).mean()
 
     def _MACD(self) -> Tuple[float, float]:
         slow_macd = self._EMA(self.macd["slow"])
@@ -187,7 +272,9 @@ class TechnicalStrategies(Strategy):
         return macd.iloc[-1], macd_signal.iloc[-1]
 
     def _RSI(self) -> float:
-        diff = self.df["close"].diff()
+        import pandas as pd
+
+        diff = pd.Series(self.candles["close"]).diff()
         up = diff.where(diff > 0, 0)
         down = diff.where(diff < 0, 0)
         down *= -1
@@ -196,70 +283,6 @@ class TechnicalStrategies(Strategy):
         rsi = 100 if loss == 0 else 100 - (100 / (1 + (gain / loss)))
         return np.round(rsi, 2)
 
-    def _SAR(self):
-        if not self._sar:
-            self._calculate_first_sar()
-
-        low = self.df.loc[:, "low"].iloc[-1]
-        high = self.df.loc[:, "high"].iloc[-1]
-        sar = self._sar[-1]
-
-        if self._upTrend:
-            if sar > low:
-                reversal = True
-                self._downTrend = True
-                sar = max(self._ep, high)
-                self._ep = low
-                self._af = self._af_step
-            else:
-                reversal = False
-        elif self._downTrend:
-            if sar < high:
-                reversal = True
-                self._upTrend = True
-                sar = min(self._ep, low)
-                self._ep = high
-                self._af = self._af_step
-            else:
-                reversal = False
-
-        if not reversal:
-            if self._upTrend and high > self._ep:
-                self._ep = high
-                self._af = min(self._af_max, self._af + self._af_step)
-            elif self._downTrend and low < self._ep:
-                self._ep = low
-                self._af = min(self._af_max, self._af + self._af_step)
-
-        if self._upTrend:
-            sar = min(sar, min(self.df.loc[:, "low"].iloc[-3:-1]))
-        elif self._downTrend:
-            sar = max(sar, max(self.df.loc[:, "high"].iloc[-3:-1]))
-
-        sar += self._af * (self._ep - sar)
-        self._sar.append(sar)
-        return
-
-    def _calculate_first_sar(self):
-        prev_low = self.df.loc[:, "low"].iloc[-2]
-        prev_high = self.df.loc[:, "high"].iloc[-2]
-        prev_close = self.df.loc[:, "close"].iloc[-2]
-        curr_low = self.df.loc[:, "low"].iloc[-1]
-        curr_high = self.df.loc[:, "high"].iloc[-1]
-        curr_close = self.df.loc[:, "close"].iloc[-1]
-        if curr_close > prev_close:
-            self._upTrend = True
-            self._ep = curr_high
-            sar = prev_low
-        else:
-            self._downTrend = True
-            self._ep = curr_low
-            sar = prev_high
-
-        sar = sar + self._af_init * (self._ep - sar)
-        self._sar.append(sar)
-        return
-
     def _RSI_eval(self, rsi: float) -> int:
         if rsi >= 70:
             return 3
@@ -289,9 +312,5 @@ class TechnicalStrategies(Strategy):
                 return -2
 
     @property
-    def _downTrend(self):
-        return not self._upTrend
-
-    @_downTrend.setter
-    def _downTrend(self, value: bool):
-        self._upTrend = not value
+    def _upTrend(self) -> bool:
+        return self._sar.up_trend